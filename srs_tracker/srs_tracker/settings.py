@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -32,11 +33,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'study.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'study.sharding.ShardMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -53,6 +56,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'study.context_processors.due_count',
             ],
         },
     },
@@ -67,7 +71,61 @@ WSGI_APPLICATION = 'srs_tracker.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SRS_DB_NAME', BASE_DIR / 'db.sqlite3'),
+    }
+}
+
+# SQLite tuned for several concurrent writers: WAL lets readers run alongside the writer,
+# synchronous=NORMAL is durable under WAL except on power loss, "timeout" is the busy timeout
+# in seconds and IMMEDIATE transactions take the write lock up front so they wait for it
+# instead of failing with "database is locked" on a read-to-write upgrade.
+SRS_SQLITE_PRODUCTION = {
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            'PRAGMA mmap_size=134217728;'
+            'PRAGMA cache_size=-20000;'
+            'PRAGMA temp_store=MEMORY;'
+        ),
+        'timeout': 20,
+        'transaction_mode': 'IMMEDIATE',
+    },
+}
+
+# "default" keeps SQLite's stock settings, "production" applies SRS_SQLITE_PRODUCTION
+SRS_DB_PROFILE = os.environ.get('SRS_DB_PROFILE', 'default')
+if SRS_DB_PROFILE == 'production':
+    DATABASES['default'].update(SRS_SQLITE_PRODUCTION)
+
+# User sharding: new users' study data is spread over SRS_SHARDS by user id, users created
+# before sharding stay on "default", and auth, sessions and the shard map always live on
+# "default". Shard files are listed comma-separated in SRS_SHARD_DB_NAMES (shard1, shard2, ...);
+# manage.py move_user_shard rebalances.
+for _i, _name in enumerate(filter(None, os.environ.get('SRS_SHARD_DB_NAMES', '').split(',')), start=1):
+    DATABASES[f'shard{_i}'] = {**DATABASES['default'], 'NAME': _name}
+SRS_SHARDS = [alias for alias in DATABASES if alias == 'default' or alias.startswith('shard')]
+
+# Optional read replica (e.g. a Litestream or rsync copy of the primary file) for analytics,
+# forecast and export reads; everything else, including the review flow, uses the primary.
+# Users who wrote within SRS_REPLICA_PIN_SECONDS keep reading from the primary, so set it
+# above the expected replication lag.
+if os.environ.get('SRS_REPLICA_DB_NAME'):
+    DATABASES['replica'] = {**DATABASES['default'], 'NAME': os.environ['SRS_REPLICA_DB_NAME']}
+SRS_REPLICA_DATABASE = 'replica'
+SRS_REPLICA_PIN_SECONDS = 5
+
+DATABASE_ROUTERS = ['study.routers.ShardRouter', 'study.routers.PrimaryReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
@@ -105,6 +163,44 @@ USE_TZ = True
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/accounts/login/"
 
+# SRS
+
+# Cards loaded into the session per review batch
+SRS_REVIEW_BATCH_SIZE = 50
+
+# Upper bound on gradings accepted by one /review/bulk/ request
+SRS_BULK_REVIEW_MAX_ITEMS = 1000
+
+# Cards per page in a deck's card list
+SRS_CARD_LIST_PAGE_SIZE = 50
+
+# Card search: "auto" picks FTS5 on SQLite, trigram on PostgreSQL and LIKE elsewhere
+SRS_SEARCH_BACKEND = "auto"
+
+# Rendered analytics (figures and hard cards) per user; keyed on the latest review id
+SRS_ANALYTICS_CACHE_ALIAS = "default"
+SRS_ANALYTICS_CACHE_TTL = 600
+
+# Grade shares 0..5 assumed by the workload forecast for users without review history
+SRS_FORECAST_DEFAULT_GRADES = (0.02, 0.03, 0.05, 0.2, 0.4, 0.3)
+
+# Reviews older than this move to the ArchivedReview table (manage.py archive_reviews); analytics
+# and hard cards read the rollups and card totals, which keep counting archived reviews
+SRS_REVIEW_ARCHIVE_DAYS = 365
+
+# Reviews a user needs before fit_scheduler_params replaces the default SM-2 constants
+SRS_SCHEDULER_MIN_REVIEWS = 200
+
+# When new users get the demo decks: "signup" (inside registration), "login" (first login),
+# "command" (manage.py seed_demo_decks, e.g. from cron) or "off"
+SRS_DEMO_DECKS_SEEDING = "signup"
+
+# /metrics is open to staff and to "Authorization: Bearer <token>" when a token is set;
+# requests above either budget are logged as warnings by study.metrics
+SRS_METRICS_TOKEN = ""
+SRS_METRICS_QUERY_BUDGET = 30
+SRS_METRICS_LATENCY_BUDGET_MS = 500
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
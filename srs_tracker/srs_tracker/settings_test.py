@@ -0,0 +1,36 @@
+"""
+Settings for running the test suite:
+
+    python manage.py test --settings=srs_tracker.settings_test
+"""
+
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+SECRET_KEY = "test-secret-key"
+
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+# Two local SQLite files: the primary and a stand-in read replica that ReplicaRouterTests
+# fills by copying the primary, so replication lag is whatever the test makes it.
+# The replica stays disabled elsewhere; tests that need it override SRS_REPLICA_DATABASE.
+_TEST_DB_DIR = Path(tempfile.gettempdir())
+DATABASES = {
+    "default": {**DATABASES["default"], "TEST": {"NAME": str(_TEST_DB_DIR / "srs-test-primary.sqlite3")}},
+    "replica": {
+        **DATABASES["default"],
+        "NAME": str(_TEST_DB_DIR / "srs-replica.sqlite3"),
+        "TEST": {"NAME": str(_TEST_DB_DIR / "srs-test-replica.sqlite3")},
+    },
+}
+SRS_REPLICA_DATABASE = None
+
+# Shard files for ShardingTests; the rest of the suite runs unsharded
+for _alias in ("shard1", "shard2"):
+    DATABASES[_alias] = {
+        **DATABASES["default"],
+        "NAME": str(_TEST_DB_DIR / f"srs-{_alias}.sqlite3"),
+        "TEST": {"NAME": str(_TEST_DB_DIR / f"srs-test-{_alias}.sqlite3")},
+    }
+SRS_SHARDS = ["default"]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Deck, Card, Review, Tag
+from .models import ArchivedReview, Deck, Card, Review, Tag, DailyReviewStat, DemoSeedRequest, UserSchedulerParams, UserShard
 
 
 @admin.register(Deck)
@@ -24,6 +24,41 @@ class CardAdmin(admin.ModelAdmin):
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
+    list_select_related = ("user", "card__deck")
     list_display = ("id", "user", "card", "quality", "reviewed_at", "next_review_at", "interval_days", "repetitions", "ease_factor")
     search_fields = ("user__username", "card__deck__title", "card__front_text")
     list_filter = ("quality", "reviewed_at", "next_review_at")
+
+
+@admin.register(ArchivedReview)
+class ArchivedReviewAdmin(admin.ModelAdmin):
+    list_select_related = ("user", "card__deck")
+    list_display = ("id", "user", "card", "quality", "reviewed_at")
+    search_fields = ("user__username", "card__deck__title", "card__front_text")
+    list_filter = ("quality", "reviewed_at")
+
+
+@admin.register(DailyReviewStat)
+class DailyReviewStatAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "day", "review_count", "quality_sum")
+    search_fields = ("user__username",)
+    list_filter = ("day",)
+
+
+@admin.register(DemoSeedRequest)
+class DemoSeedRequestAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "created_at")
+    search_fields = ("user__username",)
+
+
+@admin.register(UserShard)
+class UserShardAdmin(admin.ModelAdmin):
+    list_display = ("user", "alias", "moved_at")
+    search_fields = ("user__username", "alias")
+    list_filter = ("alias",)
+
+
+@admin.register(UserSchedulerParams)
+class UserSchedulerParamsAdmin(admin.ModelAdmin):
+    list_display = ("user", "ef_bonus", "ef_linear", "ef_quadratic", "ef_floor", "first_interval", "second_interval", "observations", "fitted_at")
+    search_fields = ("user__username",)
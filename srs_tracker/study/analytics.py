@@ -0,0 +1,148 @@
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+import plotly.express as px
+
+from .models import HARD_CARD_MIN_REVIEWS, Card, DailyReviewStat, Review
+from .routers import read_alias
+from .stats import aschedule_version, schedule_version
+
+HITS_KEY = "srs:analytics:hits"
+MISSES_KEY = "srs:analytics:misses"
+
+
+def get_cache():
+    return caches[getattr(settings, "SRS_ANALYTICS_CACHE_ALIAS", "default")]
+
+
+def _latest_review_ids(user_id: int, using: str):
+    return Review.objects.using(using).filter(user_id=user_id).order_by("-id").values_list("id", flat=True)
+
+
+def review_watermark(user_id: int, using: str = "default") -> int:
+    """Id of the user's latest review; any new review changes it."""
+    return _latest_review_ids(user_id, using).first() or 0
+
+
+def _daily_rows(user_id: int, since, using: str):
+    return DailyReviewStat.objects.using(using).filter(user_id=user_id, day__gte=since).order_by("day")
+
+
+def _hard_cards(user_id: int, using: str):
+    return (
+        Card.objects.using(using)
+        .filter(user_id=user_id, review_count__gte=HARD_CARD_MIN_REVIEWS)
+        .order_by("avg_quality", "-review_count")
+        .values("id", "front_text", "deck__title", "avg_quality", "review_count")[:10]
+    )
+
+
+def render_analytics(daily: list, hard_cards: list, since, today) -> dict:
+    """Template context with the Plotly figures; CPU-bound, no database access."""
+    if not daily:
+        return {
+            "fig_count_html": None,
+            "fig_avg_html": None,
+            "hard_cards": [],
+            "since": since,
+            "today": today,
+            "no_data": True,
+        }
+
+    daily_days = [row.day for row in daily]
+    daily_counts = [row.review_count for row in daily]
+    daily_avgq = [row.avg_quality for row in daily]
+
+    fig_count = px.bar(x=daily_days, y=daily_counts, labels={"x": "День", "y": "Повторений"}, title="Повторения по дням (30 дней)")
+    fig_avg = px.line(x=daily_days, y=daily_avgq, markers=True, labels={"x": "День", "y": "Средняя оценка"}, title="Средняя оценка по дням (30 дней)")
+
+    return {
+        "fig_count_html": fig_count.to_html(full_html=False, include_plotlyjs="cdn"),
+        "fig_avg_html": fig_avg.to_html(full_html=False, include_plotlyjs=False),
+        "hard_cards": hard_cards,
+        "since": since,
+        "today": today,
+        "no_data": False,
+    }
+
+
+def build_analytics_context(user_id: int, today, using: str = "default") -> dict:
+    since = today - timedelta(days=30)
+    daily = list(_daily_rows(user_id, since, using))
+    hard_cards = list(_hard_cards(user_id, using)) if daily else []
+    return render_analytics(daily, hard_cards, since, today)
+
+
+async def abuild_analytics_context(user_id: int, today, using: str = "default") -> dict:
+    since = today - timedelta(days=30)
+    daily = [row async for row in _daily_rows(user_id, since, using)]
+    hard_cards = [row async for row in _hard_cards(user_id, using)] if daily else []
+    # Figure rendering takes tens of milliseconds of CPU; keep it off the event loop and
+    # out of the thread that serialises the request's database work
+    return await sync_to_async(render_analytics, thread_sensitive=False)(daily, hard_cards, since, today)
+
+
+def _count(cache, key: str) -> None:
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+async def _acount(cache, key: str) -> None:
+    await cache.aadd(key, 0, timeout=None)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        pass
+
+
+def get_analytics_context(user_id: int) -> dict:
+    today = timezone.localdate()
+    cache = get_cache()
+    # Watermark and figures come from the same database, so a lagging replica serves a
+    # consistent older snapshot under an older key until it catches up
+    using = read_alias(user_id)
+    # The schedule version covers card renames and deletes and review deletes, which leave the watermark
+    # alone; the date is part of the key because the 30-day window moves at midnight
+    version = schedule_version(user_id)
+    key = f"srs:analytics:{user_id}:{version}:{review_watermark(user_id, using)}:{today.isoformat()}"
+
+    context = cache.get(key)
+    if context is not None:
+        _count(cache, HITS_KEY)
+        return context
+
+    _count(cache, MISSES_KEY)
+    context = build_analytics_context(user_id, today, using)
+    cache.set(key, context, timeout=getattr(settings, "SRS_ANALYTICS_CACHE_TTL", 600))
+    return context
+
+
+async def aget_analytics_context(user_id: int) -> dict:
+    today = timezone.localdate()
+    cache = get_cache()
+    using = await sync_to_async(read_alias)(user_id)
+    version = await aschedule_version(user_id)
+    watermark = await _latest_review_ids(user_id, using).afirst() or 0
+    key = f"srs:analytics:{user_id}:{version}:{watermark}:{today.isoformat()}"
+
+    context = await cache.aget(key)
+    if context is not None:
+        await _acount(cache, HITS_KEY)
+        return context
+
+    await _acount(cache, MISSES_KEY)
+    context = await abuild_analytics_context(user_id, today, using)
+    await cache.aset(key, context, timeout=getattr(settings, "SRS_ANALYTICS_CACHE_TTL", 600))
+    return context
+
+
+def analytics_cache_stats() -> dict:
+    cache = get_cache()
+    return {"hits": cache.get(HITS_KEY, 0), "misses": cache.get(MISSES_KEY, 0)}
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Value
+from django.utils import timezone
+
+from .models import ArchivedReview, Review
+
+# The columns an archived review keeps
+LOG_FIELDS = ["id", "user_id", "card_id", "reviewed_at", "quality"]
+
+
+def archive_cutoff(days: int | None = None):
+    if days is None:
+        days = getattr(settings, "SRS_REVIEW_ARCHIVE_DAYS", 365)
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_reviews(before, using: str = DEFAULT_DB_ALIAS, batch_size: int = 5000):
+    """Move reviews made before ``before`` into ArchivedReview, one transaction per batch.
+
+    Yields the size of every moved batch. Card totals and daily rollups are left alone,
+    they already count the moved reviews.
+    """
+    while True:
+        with transaction.atomic(using=using):
+            # Oldest first, straight off the reviewed_at index
+            old = Review.objects.using(using).filter(reviewed_at__lt=before).order_by("reviewed_at", "id")
+            rows = list(old.values_list(*LOG_FIELDS)[:batch_size])
+            if not rows:
+                return
+            archive_rows(rows, using)
+        yield len(rows)
+
+
+def archive_rows(rows, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Replace hot reviews, given as ``LOG_FIELDS`` tuples, with their archived copies."""
+    ArchivedReview.objects.using(using).bulk_create(
+        [ArchivedReview(**dict(zip(LOG_FIELDS, row))) for row in rows], batch_size=len(rows)
+    )
+    Review.objects.using(using).filter(pk__in=[row[0] for row in rows]).delete(record_stats=False)
+
+
+def review_log(using: str = DEFAULT_DB_ALIAS, fields=LOG_FIELDS, **filters):
+    """``values_list(*fields)`` over hot and archived reviews matching ``filters``; add order_by() as needed.
+
+    Archived reviews return None for the schedule fields they no longer keep.
+    """
+    hot = Review.objects.using(using).filter(**filters).order_by().values_list(*fields)
+    dropped = {
+        field: Value(None, output_field=Review._meta.get_field(field).__class__())
+        for field in fields
+        if field not in LOG_FIELDS
+    }
+    cold = ArchivedReview.objects.using(using).filter(**filters).order_by().annotate(**dropped).values_list(*fields)
+    return hot.union(cold, all=True)
@@ -0,0 +1,36 @@
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(namespace: str, user_id: int) -> str:
+    return f"srs:{namespace}:v:{user_id}"
+
+
+def get_user_version(namespace: str, user_id: int) -> int:
+    key = _version_key(namespace, user_id)
+    version = cache.get(key)
+    if version is None:
+        # A fresh clock-based value can never collide with one handed out before eviction
+        version = time.time_ns()
+        cache.add(key, version, timeout=None)
+        version = cache.get(key, version)
+    return version
+
+
+async def aget_user_version(namespace: str, user_id: int) -> int:
+    key = _version_key(namespace, user_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        await cache.aadd(key, version, timeout=None)
+        version = await cache.aget(key, version)
+    return version
+
+
+def bump_user_version(namespace: str, user_id: int) -> None:
+    key = _version_key(namespace, user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
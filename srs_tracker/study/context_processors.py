@@ -0,0 +1,9 @@
+from .review_queue import get_due_count
+
+
+def due_count(request):
+    """``due_count`` for the navbar badge; a cache hit costs no database queries."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {"due_count": get_due_count(user.id)}
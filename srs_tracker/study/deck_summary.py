@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .analytics import get_cache
+from .models import Card
+from .stats import schedule_version
+
+EMPTY = {"total": 0, "active": 0, "due": 0}
+
+
+def build_deck_summary(user_id: int, today) -> dict:
+    """{deck id: {"total", "active", "due"}} for the user's decks with cards, in one grouped query."""
+    rows = (
+        Card.objects.filter(user_id=user_id)
+        .values("deck_id")
+        .annotate(
+            total=Count("id"),
+            active=Count("id", filter=Q(is_active=True)),
+            due=Count("id", filter=Q(is_active=True, next_review_at__lte=today)),
+        )
+        .order_by()
+    )
+    return {row.pop("deck_id"): row for row in rows}
+
+
+def get_deck_summary(user_id: int) -> dict:
+    today = timezone.localdate()
+    cache = get_cache()
+    # The date rolls cards over to due at midnight
+    key = f"srs:decks:{user_id}:{schedule_version(user_id)}:{today.isoformat()}"
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_deck_summary(user_id, today)
+        cache.set(key, summary, timeout=getattr(settings, "SRS_ANALYTICS_CACHE_TTL", 600))
+    return summary
@@ -0,0 +1,47 @@
+import json
+from functools import lru_cache
+from pathlib import Path
+
+from django.db import transaction
+
+from .caching import bump_user_version
+from .models import Card, Deck, DemoSeedRequest
+from .review_queue import VERSION_NAMESPACE as REVIEW_QUEUE_NAMESPACE
+from .routers import pin_primary
+from .sharding import user_shard
+
+DEMO_DECKS_PATH = Path(__file__).resolve().parent / "data" / "demo_decks.json"
+
+
+@lru_cache(maxsize=None)
+def load_demo_decks() -> tuple:
+    with open(DEMO_DECKS_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    return tuple((d["title"], d["description"], tuple(map(tuple, d["cards"]))) for d in data)
+
+
+def seed_demo_decks(user) -> None:
+    template = load_demo_decks()
+    with user_shard(user.pk) as using, transaction.atomic(using=using):
+        decks = Deck.objects.bulk_create(
+            [Deck(user=user, title=title, description=description) for title, description, _ in template]
+        )
+        # bulk_create skips Card.save(), so the owner is set explicitly
+        Card.objects.bulk_create(
+            [
+                Card(deck=deck, user=user, front_text=front, back_text=back, is_active=True)
+                for deck, (_, _, cards) in zip(decks, template)
+                for front, back in cards
+            ]
+        )
+    # bulk_create sends no post_save, so cached queues, badges and deck summaries are refreshed here
+    bump_user_version(REVIEW_QUEUE_NAMESPACE, user.pk)
+    pin_primary(user.pk)
+
+
+def seed_pending_demo_decks(user) -> bool:
+    with transaction.atomic():
+        deleted, _ = DemoSeedRequest.objects.filter(user=user).delete()
+        if deleted:
+            seed_demo_decks(user)
+    return bool(deleted)
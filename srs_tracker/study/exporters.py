@@ -0,0 +1,86 @@
+import csv
+import json
+from itertools import chain
+
+from django.db import DEFAULT_DB_ALIAS
+
+from .archive import review_log
+from .models import Card, Deck
+from .routers import read_alias
+from .sharding import shard_aliases
+
+KINDS = ("decks", "cards", "reviews")
+FORMATS = ("csv", "ndjson")
+
+FIELDS = {
+    "decks": ["id", "user_id", "title", "description", "created_at"],
+    "cards": [
+        "id", "deck_id", "user_id", "front_text", "back_text", "tags", "is_active", "created_at",
+        "next_review_at", "interval_days", "repetitions", "ease_factor",
+    ],
+    "reviews": [
+        "id", "user_id", "card_id", "reviewed_at", "quality", "interval_days", "repetitions", "ease_factor",
+        "next_review_at",
+    ],
+}
+
+
+def _scoped(qs, user_id):
+    return qs.filter(user_id=user_id) if user_id is not None else qs
+
+
+def iter_rows(kind: str, user_id: int | None = None, chunk_size: int = 2000, using: str = "default"):
+    """Yield export rows as dicts, reading ``chunk_size`` rows at a time."""
+    if kind == "decks":
+        qs = _scoped(Deck.objects.using(using).order_by("pk"), user_id).values(*FIELDS["decks"])
+        yield from qs.iterator(chunk_size=chunk_size)
+    elif kind == "cards":
+        # Tags are prefetched per chunk of cards, not for the whole table
+        qs = _scoped(Card.objects.using(using).order_by("pk"), user_id).prefetch_related("tags")
+        for card in qs.iterator(chunk_size=chunk_size):
+            row = {field: getattr(card, field) for field in FIELDS["cards"] if field != "tags"}
+            row["tags"] = [tag.name for tag in card.tags.all()]
+            yield row
+    elif kind == "reviews":
+        # Hot and archived reviews in id order; archived rows keep their original ids
+        filters = {"user_id": user_id} if user_id is not None else {}
+        rows = review_log(using, FIELDS["reviews"], **filters).order_by("id")
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield dict(zip(FIELDS["reviews"], row))
+    else:
+        raise ValueError(f"Unknown export kind: {kind}")
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def render_csv(kind: str, rows):
+    writer = csv.writer(_Echo())
+    fields = FIELDS[kind]
+    yield writer.writerow(fields)
+    for row in rows:
+        if "tags" in row:
+            row = {**row, "tags": " ".join(row["tags"])}
+        yield writer.writerow([row[field] for field in fields])
+
+
+def render_ndjson(kind: str, rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, default=str) + "\n"
+
+
+RENDERERS = {"csv": render_csv, "ndjson": render_ndjson}
+CONTENT_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson; charset=utf-8"}
+
+
+def export(kind: str, fmt: str, user_id: int | None = None, chunk_size: int = 2000):
+    """Render one user's rows, or every user's shard by shard; ids are only unique within a shard."""
+    if user_id is not None:
+        aliases = [read_alias(user_id)]
+    else:
+        # The replica mirrors the default database only
+        aliases = [read_alias() if alias == DEFAULT_DB_ALIAS else alias for alias in shard_aliases()]
+    rows = chain.from_iterable(iter_rows(kind, user_id=user_id, chunk_size=chunk_size, using=alias) for alias in aliases)
+    return RENDERERS[fmt](kind, rows)
@@ -0,0 +1,104 @@
+from dataclasses import astuple
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .analytics import get_cache, review_watermark
+from .caching import get_user_version
+from .models import Card, DailyReviewStat
+from .review_queue import VERSION_NAMESPACE as REVIEW_QUEUE_NAMESPACE
+from .routers import read_alias
+from .services import DEFAULT_PARAMS, Sm2Params, get_sm2_params, sm2_calculate_batch
+from .sharding import user_shard
+from .stats import QUALITY_FIELDS
+
+MAX_DAYS = 365
+
+
+def load_card_columns(user_id: int, using: str = "default") -> dict:
+    """Schedule state of the user's active cards as NumPy columns, read in one query."""
+    rows = Card.objects.using(using).filter(user_id=user_id, is_active=True).order_by().values_list(
+        "next_review_at", "repetitions", "interval_days", "ease_factor"
+    )
+    next_review_at, repetitions, interval_days, ease_factor = zip(*rows) if rows else ((), (), (), ())
+    return {
+        "next_review_at": np.array(next_review_at, dtype="datetime64[D]"),
+        "repetitions": np.array(repetitions, dtype=np.int64),
+        "interval_days": np.array(interval_days, dtype=np.int64),
+        "ease_factor": np.array(ease_factor, dtype=np.float64),
+    }
+
+
+def grade_distribution(user_id: int, using: str = "default") -> np.ndarray:
+    """Share of each grade 0..5 in the user's history, or a default for new users."""
+    totals = DailyReviewStat.objects.using(using).filter(user_id=user_id).aggregate(**{f: Sum(f) for f in QUALITY_FIELDS})
+    counts = np.array([totals[f] or 0 for f in QUALITY_FIELDS], dtype=np.float64)
+    if not counts.sum():
+        counts = np.array(settings.SRS_FORECAST_DEFAULT_GRADES, dtype=np.float64)
+    return counts / counts.sum()
+
+
+def simulate_due_counts(
+    columns: dict, days: int, grades: np.ndarray, today, seed: int = 0, params: Sm2Params = DEFAULT_PARAMS
+) -> np.ndarray:
+    """Due cards per day for ``days`` days, reviewing every due card with a grade drawn from ``grades``.
+
+    Overdue cards count as due today; ``params`` should be the owner's fitted SM-2 constants.
+    """
+    rng = np.random.default_rng(seed)
+    start = np.datetime64(today, "D")
+    offset = np.maximum((columns["next_review_at"] - start).astype(np.int64), 0)
+    repetitions = columns["repetitions"].copy()
+    interval_days = columns["interval_days"].copy()
+    ease_factor = columns["ease_factor"].copy()
+
+    counts = np.zeros(days, dtype=np.int64)
+    for day in range(days):
+        due = np.flatnonzero(offset == day)
+        counts[day] = due.size
+        if not due.size:
+            continue
+        res = sm2_calculate_batch(
+            quality=rng.choice(6, size=due.size, p=grades),
+            repetitions=repetitions[due],
+            interval_days=interval_days[due],
+            ease_factor=ease_factor[due],
+            review_date=start + day,
+            params=params,
+        )
+        repetitions[due] = res.repetitions
+        interval_days[due] = res.interval_days
+        ease_factor[due] = res.ease_factor
+        offset[due] = day + res.interval_days
+    return counts
+
+
+def get_forecast(user_id: int, days: int) -> dict:
+    days = max(1, min(days, MAX_DAYS))
+    today = timezone.localdate()
+    cache = get_cache()
+    using = read_alias(user_id)
+    with user_shard(user_id):
+        params = get_sm2_params(user_id)
+    # New reviews move the watermark; added, edited or removed cards bump the card version; a refit changes params
+    key = (
+        f"srs:forecast:{user_id}:{review_watermark(user_id, using)}:"
+        f"{get_user_version(REVIEW_QUEUE_NAMESPACE, user_id)}:{today.isoformat()}:{days}:"
+        + ",".join(map(str, astuple(params)))
+    )
+    forecast = cache.get(key)
+    if forecast is None:
+        grades = grade_distribution(user_id, using)
+        counts = simulate_due_counts(load_card_columns(user_id, using), days, grades, today, params=params)
+        forecast = {
+            "start": today.isoformat(),
+            "days": [
+                {"date": (today + timedelta(days=i)).isoformat(), "due": int(n)} for i, n in enumerate(counts)
+            ],
+            "grade_distribution": [round(float(p), 4) for p in grades],
+        }
+        cache.set(key, forecast, timeout=getattr(settings, "SRS_ANALYTICS_CACHE_TTL", 600))
+    return forecast
@@ -1,6 +1,8 @@
 from django import forms
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
 
+from .importers import FORMATS
 from .models import Deck, Card
 
 
@@ -19,3 +21,25 @@ class CardForm(forms.ModelForm):
 class ReviewQualityForm(forms.Form):
     card_id = forms.IntegerField(min_value=1)
     quality = forms.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(5)])
+    # Card.version shown with the question; a grade for an older version is rejected
+    version = forms.IntegerField(min_value=0, widget=forms.HiddenInput)
+
+
+class BulkReviewItemForm(ReviewQualityForm):
+    version = None
+    reviewed_at = forms.DateTimeField(required=False)
+
+    def clean_reviewed_at(self):
+        reviewed_at = self.cleaned_data["reviewed_at"]
+        if reviewed_at is not None and reviewed_at > timezone.now():
+            raise forms.ValidationError("Время повторения не может быть в будущем.")
+        return reviewed_at
+
+
+class CardImportForm(forms.Form):
+    file = forms.FileField(label="Файл")
+    format = forms.ChoiceField(
+        label="Формат",
+        choices=[("", "По расширению файла")] + [(fmt, fmt.upper()) for fmt in FORMATS],
+        required=False,
+    )
@@ -0,0 +1,180 @@
+import csv
+import hashlib
+import json
+from dataclasses import dataclass
+from itertools import islice
+
+from django.db import transaction
+
+from .caching import bump_user_version
+from .models import Card, Tag
+from .review_queue import VERSION_NAMESPACE as REVIEW_QUEUE_NAMESPACE
+from .routers import pin_primary
+from .sharding import user_shard
+
+FORMATS = ("csv", "tsv", "json")
+EXTENSIONS = {".csv": "csv", ".tsv": "tsv", ".txt": "tsv", ".json": "json", ".jsonl": "json", ".ndjson": "json"}
+
+
+@dataclass(frozen=True)
+class CardRow:
+    front: str
+    back: str
+    tags: tuple[str, ...] = ()
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+
+    @property
+    def processed(self) -> int:
+        return self.created + self.duplicates + self.invalid
+
+
+class ImportAborted(Exception):
+    """The file stopped parsing partway; ``result`` counts the chunks already committed."""
+
+    def __init__(self, result: ImportResult):
+        super().__init__(f"import stopped after {result.created} cards")
+        self.result = result
+
+
+def format_for_filename(name: str) -> str | None:
+    for ext, fmt in EXTENSIONS.items():
+        if name.lower().endswith(ext):
+            return fmt
+    return None
+
+
+def _split_tags(value) -> tuple[str, ...]:
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = value.split()
+    return tuple(str(tag).strip()[:40] for tag in value if str(tag).strip())
+
+
+def _row(front, back="", tags=None) -> CardRow:
+    return CardRow(front=str(front or "").strip(), back=str(back or "").strip(), tags=_split_tags(tags))
+
+
+def parse_csv(stream):
+    """Rows of ``front,back[,tags]``; a leading ``front,back`` header is skipped."""
+    reader = csv.reader(stream)
+    for i, fields in enumerate(reader):
+        if not fields:
+            continue
+        if i == 0 and fields[0].strip().lower() == "front":
+            continue
+        yield _row(*fields[:3])
+
+
+def parse_tsv(stream):
+    """Anki "Notes in Plain Text" export: ``front<TAB>back[<TAB>tags]``, ``#`` lines are headers."""
+    for line in stream:
+        line = line.rstrip("\r\n")
+        if not line or line.startswith("#"):
+            continue
+        yield _row(*line.split("\t")[:3])
+
+
+def parse_json(stream, buffer_size: int = 64 * 1024):
+    """A JSON array or newline-delimited objects with ``front``, ``back`` and ``tags``, decoded incrementally."""
+    decoder = json.JSONDecoder()
+    buf = ""
+    eof = False
+    while True:
+        buf = buf.lstrip(" \t\r\n,[]")
+        if not buf:
+            if eof:
+                return
+            chunk = stream.read(buffer_size)
+            eof = not chunk
+            buf += chunk
+            continue
+        try:
+            obj, end = decoder.raw_decode(buf)
+        except ValueError:
+            if eof:
+                raise
+            chunk = stream.read(buffer_size)
+            eof = not chunk
+            buf += chunk
+            continue
+        buf = buf[end:]
+        if isinstance(obj, dict):
+            yield _row(obj.get("front"), obj.get("back"), obj.get("tags"))
+
+
+PARSERS = {"csv": parse_csv, "tsv": parse_tsv, "json": parse_json}
+
+
+def _fingerprint(front: str) -> bytes:
+    return hashlib.blake2b(front.encode(), digest_size=16).digest()
+
+
+def import_cards(deck, rows, *, chunk_size: int = 1000, progress=None) -> ImportResult:
+    """Insert parsed rows into ``deck`` in ``chunk_size`` batches, skipping fronts the deck already has.
+
+    Only fingerprints of existing fronts and one chunk of rows are held in memory. Each chunk commits
+    on its own, so a parse error raises ImportAborted with the rows imported before it.
+    """
+    result = ImportResult()
+    try:
+        with user_shard(deck.user_id) as using:
+            seen = {
+                _fingerprint(front)
+                for front in Card.objects.filter(deck=deck).values_list("front_text", flat=True).iterator()
+            }
+
+            rows = iter(rows)
+            while chunk := list(islice(rows, chunk_size)):
+                fresh = []
+                for row in chunk:
+                    if not row.front or not row.back:
+                        result.invalid += 1
+                        continue
+                    key = _fingerprint(row.front)
+                    if key in seen:
+                        result.duplicates += 1
+                        continue
+                    seen.add(key)
+                    fresh.append(row)
+
+                if fresh:
+                    _insert_chunk(deck, fresh, using)
+                    result.created += len(fresh)
+                if progress:
+                    progress(result)
+    except (ValueError, csv.Error) as exc:
+        # UnicodeDecodeError and JSON errors are ValueErrors; csv.Error covers e.g. oversized fields
+        raise ImportAborted(result) from exc
+    finally:
+        # Committed chunks must reach the queue, badge and deck summary even when the file breaks later
+        if result.created:
+            bump_user_version(REVIEW_QUEUE_NAMESPACE, deck.user_id)
+            pin_primary(deck.user_id)
+    return result
+
+
+def _insert_chunk(deck, rows: list[CardRow], using: str) -> None:
+    names = {tag for row in rows for tag in row.tags}
+    with transaction.atomic(using=using):
+        tag_ids = {}
+        if names:
+            Tag.objects.bulk_create([Tag(user_id=deck.user_id, name=name) for name in names], ignore_conflicts=True)
+            tag_ids = dict(Tag.objects.filter(user_id=deck.user_id, name__in=names).values_list("name", "id"))
+
+        # bulk_create skips Card.save(), so the owner is set explicitly
+        cards = Card.objects.bulk_create(
+            [Card(deck=deck, user_id=deck.user_id, front_text=row.front, back_text=row.back) for row in rows]
+        )
+
+        Through = Card.tags.through
+        Through.objects.bulk_create(
+            [Through(card_id=card.id, tag_id=tag_ids[name]) for card, row in zip(cards, rows) for name in set(row.tags)],
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from study.archive import archive_cutoff, archive_reviews
+from study.models import ArchivedReview, Review
+from study.sharding import shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Move reviews older than SRS_REVIEW_ARCHIVE_DAYS from the Review table to the archive, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Archive reviews older than this many days")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--dry-run", action="store_true", help="Only count the reviews that would move")
+
+    def handle(self, *args, **options):
+        if options["days"] is not None and options["days"] < 0:
+            raise CommandError("--days must not be negative")
+        before = archive_cutoff(options["days"])
+
+        moved = 0
+        for alias in shard_aliases():
+            if options["dry_run"]:
+                n = Review.objects.using(alias).filter(reviewed_at__lt=before).count()
+            else:
+                n = 0
+                for batch in archive_reviews(before, using=alias, batch_size=options["batch_size"]):
+                    n += batch
+                    if options["verbosity"] > 1:
+                        self.stdout.write(f"{alias}: {n} reviews archived")
+            hot = Review.objects.using(alias).count()
+            cold = ArchivedReview.objects.using(alias).count()
+            self.stdout.write(f"{alias}: {n} reviews before {before:%Y-%m-%d}; {hot} hot, {cold} archived")
+            moved += n
+
+        verb = "would be archived" if options["dry_run"] else "archived"
+        self.stdout.write(self.style.SUCCESS(f"{moved} reviews {verb}"))
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import logging
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from study.models import Card
+
+from .bench_views import percentile
+
+# Each page is served by a WSGI (sync) and an ASGI (async) view
+PAGES = {
+    "review_today": ("review_today", "review_today_async"),
+    "analytics": ("analytics", "analytics_async"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the review and analytics pages concurrently through the WSGI and ASGI handlers "
+        "in-process and report requests/s and p50/p95 (e.g. --settings=srs_tracker.settings_test)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Username to load as; defaults to the user with most cards")
+        parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per page and handler")
+        parser.add_argument("--pages", nargs="+", choices=PAGES, default=list(PAGES))
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        user = self.get_user(options["user"])
+        # AsyncClient runs concurrent requests on one sync thread, so per-request query
+        # counts (and the budget warnings) mix requests together here
+        metrics_logger = logging.getLogger("study.metrics")
+        level = metrics_logger.level
+        metrics_logger.setLevel(logging.ERROR)
+        setup_test_environment()
+        try:
+            results = {}
+            for page in options["pages"]:
+                sync_name, async_name = PAGES[page]
+                results[page] = {
+                    "wsgi": self.run_wsgi(user, reverse(sync_name), options),
+                    "asgi": async_to_sync(self.run_asgi)(user, reverse(async_name), options),
+                }
+        finally:
+            teardown_test_environment()
+            metrics_logger.setLevel(level)
+
+        for page, row in results.items():
+            for handler in ("wsgi", "asgi"):
+                r = row[handler]
+                self.stdout.write(
+                    f"{page:<13} {handler}  {r['requests_per_sec']:8.1f} req/s   "
+                    f"p50 {r['p50_ms']:8.2f} ms   p95 {r['p95_ms']:8.2f} ms"
+                )
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "user": user.username,
+            "concurrency": options["concurrency"],
+            "requests": options["requests"],
+            "pages": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+
+    def get_user(self, username):
+        User = get_user_model()
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"User {username!r} not found")
+        top = Card.objects.values("user_id").annotate(n=Count("id")).order_by("-n").first()
+        if not top:
+            raise CommandError("No cards to load; run generate_synthetic_data first")
+        return User.objects.get(pk=top["user_id"])
+
+    def summarize(self, timings, elapsed):
+        return {
+            "requests_per_sec": len(timings) / elapsed,
+            "p50_ms": statistics.median(timings) * 1000,
+            "p95_ms": percentile(timings, 95) * 1000,
+        }
+
+    def run_wsgi(self, user, url, options):
+        def worker(n):
+            client = Client()
+            client.force_login(user)
+            timings = []
+            try:
+                for _ in range(n):
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        raise CommandError(f"GET {url} returned {response.status_code}")
+            finally:
+                connections.close_all()
+            return timings
+
+        shares = self.split(options["requests"], options["concurrency"])
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(shares)) as pool:
+            timings = [t for chunk in pool.map(worker, shares) for t in chunk]
+        return self.summarize(timings, time.perf_counter() - started)
+
+    async def run_asgi(self, user, url, options):
+        async def worker(n):
+            client = AsyncClient()
+            await client.aforce_login(user)
+            timings = []
+            for _ in range(n):
+                started = time.perf_counter()
+                response = await client.get(url)
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f"GET {url} returned {response.status_code}")
+            return timings
+
+        shares = self.split(options["requests"], options["concurrency"])
+        started = time.perf_counter()
+        chunks = await asyncio.gather(*(worker(n) for n in shares))
+        return self.summarize([t for chunk in chunks for t in chunk], time.perf_counter() - started)
+
+    def split(self, total, workers):
+        workers = max(1, min(workers, total))
+        return [total // workers + (i < total % workers) for i in range(workers)]
@@ -0,0 +1,61 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from study.demo import load_demo_decks, seed_demo_decks
+from study.models import Card, Deck
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+def seed_per_row(user):
+    # The seeding the registration signal used to do: one INSERT per deck and per card
+    for title, description, cards in load_demo_decks():
+        deck = Deck.objects.create(user=user, title=title, description=description)
+        for front, back in cards:
+            Card.objects.create(deck=deck, front_text=front, back_text=back, is_active=True)
+
+
+class Command(BaseCommand):
+    help = "Compare registration latency for per-row, bulk and deferred demo deck seeding (changes are rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+
+    def handle(self, *args, **options):
+        strategies = [
+            ("per-row (before)", "off", seed_per_row),
+            ("bulk", "off", seed_demo_decks),
+            ("deferred", "command", None),
+        ]
+        load_demo_decks()
+
+        for name, mode, seed in strategies:
+            timings = []
+            try:
+                with override_settings(SRS_DEMO_DECKS_SEEDING=mode), transaction.atomic():
+                    for i in range(options["users"]):
+                        started = time.perf_counter()
+                        # Password hashing is identical for every strategy and left out
+                        with transaction.atomic():
+                            user = User.objects.create_user(f"bench-registration-{i}")
+                            if seed:
+                                seed(user)
+                        timings.append(time.perf_counter() - started)
+                    raise Rollback
+            except Rollback:
+                pass
+
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            self.stdout.write(
+                f"{name:<18} mean {statistics.mean(timings) * 1000:7.2f} ms   p95 {p95 * 1000:7.2f} ms"
+            )
@@ -0,0 +1,39 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from study.models import Card
+from study.search import search_cards
+
+
+class Command(BaseCommand):
+    help = "Compare FTS5 card search against the LIKE fallback on the current database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        top = Card.objects.values("user_id").annotate(n=Count("id")).order_by("-n").first()
+        if not top:
+            raise CommandError("No cards to search; import or generate some first")
+        user_id = top["user_id"]
+
+        rng = random.Random(options["seed"])
+        sample = list(Card.objects.filter(user_id=user_id).values_list("front_text", flat=True)[:2000])
+        words = [w for text in sample for w in text.split() if len(w) > 3] or ["a"]
+        queries = [rng.choice(words) for _ in range(options["queries"])]
+
+        self.stdout.write(f"user {user_id}: {top['n']} cards, {len(queries)} queries")
+        for backend in ("fts", "like"):
+            timings = []
+            for q in queries:
+                started = time.perf_counter()
+                search_cards(user_id, q, backend=backend)
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(
+                f"{backend:<5} median {statistics.median(timings) * 1000:8.2f} ms   max {max(timings) * 1000:8.2f} ms"
+            )
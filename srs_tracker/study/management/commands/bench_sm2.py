@@ -0,0 +1,68 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from study.services import sm2_calculate, sm2_calculate_batch
+
+
+class Command(BaseCommand):
+    help = "Benchmark scalar sm2_calculate against the vectorized sm2_calculate_batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=1_000_000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        size = options["size"]
+        rng = np.random.default_rng(options["seed"])
+        today = timezone.localdate()
+
+        quality = rng.integers(0, 6, size)
+        repetitions = rng.integers(0, 10, size)
+        interval_days = rng.integers(0, 400, size)
+        ease_factor = rng.uniform(1.3, 3.0, size)
+        review_date = np.datetime64(today, "D") + rng.integers(-30, 30, size).astype("timedelta64[D]")
+
+        started = time.perf_counter()
+        batch = sm2_calculate_batch(
+            quality=quality,
+            repetitions=repetitions,
+            interval_days=interval_days,
+            ease_factor=ease_factor,
+            review_date=review_date,
+        )
+        batch_elapsed = time.perf_counter() - started
+
+        q_list = quality.tolist()
+        reps_list = repetitions.tolist()
+        interval_list = interval_days.tolist()
+        ef_list = ease_factor.tolist()
+        dates = [today + timedelta(days=int(d)) for d in (review_date - np.datetime64(today, "D")).astype(int)]
+
+        started = time.perf_counter()
+        scalar = [
+            sm2_calculate(quality=q, repetitions=r, interval_days=i, ease_factor=ef, review_date=d)
+            for q, r, i, ef, d in zip(q_list, reps_list, interval_list, ef_list, dates)
+        ]
+        scalar_elapsed = time.perf_counter() - started
+
+        mismatches = sum(
+            1
+            for i, res in enumerate(scalar)
+            if res.repetitions != batch.repetitions[i]
+            or res.interval_days != batch.interval_days[i]
+            or res.ease_factor != batch.ease_factor[i]
+            or res.next_review_at != batch.next_review_at[i].astype(object)
+        )
+
+        self.stdout.write(f"cards:   {size}")
+        self.stdout.write(f"scalar:  {scalar_elapsed:.3f}s ({size / scalar_elapsed:,.0f} cards/s)")
+        self.stdout.write(f"batch:   {batch_elapsed:.3f}s ({size / batch_elapsed:,.0f} cards/s)")
+        self.stdout.write(f"speedup: {scalar_elapsed / batch_elapsed:.1f}x")
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f"{mismatches} results differ from sm2_calculate"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Batch results match sm2_calculate exactly"))
@@ -0,0 +1,135 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from study.models import Card
+
+VIEWS = ("review_today", "analytics", "card_list", "deck_list")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Request the main views through the test client and report queries, p50/p95 latency "
+        "and peak memory as JSON (needs a SECRET_KEY, e.g. --settings=srs_tracker.settings_test)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Username to benchmark as; defaults to the user with most cards")
+        parser.add_argument("--requests", type=int, default=20, help="Requests per view")
+        parser.add_argument("--views", nargs="+", choices=VIEWS, default=list(VIEWS))
+        parser.add_argument("--cold", action="store_true", help="Clear caches before every request")
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        parser.add_argument("--compare", help="Earlier JSON report to print deltas against")
+
+    def handle(self, *args, **options):
+        user = self.get_user(options["user"])
+        deck = user.decks.annotate(n=Count("cards")).order_by("-n").first()
+        urls = {
+            "review_today": reverse("review_today"),
+            "analytics": reverse("analytics"),
+            "card_list": reverse("card_list", args=[deck.pk]) if deck else None,
+            "deck_list": reverse("deck_list"),
+        }
+
+        setup_test_environment()
+        try:
+            client = Client()
+            client.force_login(user)
+            results = {name: self.measure(client, urls[name], options) for name in options["views"] if urls[name]}
+        finally:
+            teardown_test_environment()
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "user": user.username,
+            "cards": Card.objects.filter(user=user).count(),
+            "requests": options["requests"],
+            "cold": options["cold"],
+            "views": results,
+        }
+        baseline = self.load(options["compare"])["views"] if options["compare"] else {}
+        for name, row in results.items():
+            line = (
+                f"{name:<13} {row['queries']:4d} queries   p50 {row['p50_ms']:8.2f} ms   "
+                f"p95 {row['p95_ms']:8.2f} ms   peak {row['peak_kib']:9.1f} KiB"
+            )
+            if name in baseline:
+                line += f"   (p50 {row['p50_ms'] - baseline[name]['p50_ms']:+.2f} ms, "
+                line += f"queries {row['queries'] - baseline[name]['queries']:+d})"
+            self.stdout.write(line)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+
+    def get_user(self, username):
+        User = get_user_model()
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"User {username!r} not found")
+        top = Card.objects.values("user_id").annotate(n=Count("id")).order_by("-n").first()
+        if not top:
+            raise CommandError("No cards to benchmark; run generate_synthetic_data first")
+        return User.objects.get(pk=top["user_id"])
+
+    def load(self, path):
+        try:
+            with open(path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+
+    def measure(self, client, url, options):
+        timings, queries = [], []
+        for _ in range(options["requests"]):
+            if options["cold"]:
+                self.clear_caches()
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError(f"GET {url} returned {response.status_code}")
+            queries.append(len(ctx.captured_queries))
+
+        # tracemalloc slows allocation-heavy code down, so memory gets its own request
+        if options["cold"]:
+            self.clear_caches()
+        tracemalloc.start()
+        try:
+            client.get(url)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {
+            "url": url,
+            "queries": max(queries),
+            "p50_ms": statistics.median(timings) * 1000,
+            "p95_ms": percentile(timings, 95) * 1000,
+            "peak_kib": peak / 1024,
+        }
+
+    def clear_caches(self):
+        for cache in caches.all():
+            cache.clear()
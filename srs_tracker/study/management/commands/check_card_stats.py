@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from study.models import Card
+from study.sharding import shard_aliases
+from study.stats import average_quality, card_stats_mismatches
+
+
+class Command(BaseCommand):
+    help = "Compare per-card review totals with the Review log"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Overwrite mismatching totals with values from the log")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        mismatches = 0
+        for alias in shard_aliases():
+            fixed = []
+            for card, review_count, quality_sum in card_stats_mismatches(batch_size=options["batch_size"], using=alias):
+                mismatches += 1
+                self.stdout.write(
+                    f"Card #{card.pk} ({alias}): stored {card.review_count}/{card.quality_sum} "
+                    f"avg {card.avg_quality:.3f}, log {review_count}/{quality_sum} "
+                    f"avg {average_quality(review_count, quality_sum):.3f}"
+                )
+                if options["fix"]:
+                    card.review_count = review_count
+                    card.quality_sum = quality_sum
+                    card.avg_quality = average_quality(review_count, quality_sum)
+                    fixed.append(card)
+                    if len(fixed) >= options["batch_size"]:
+                        Card.objects.using(alias).bulk_update(fixed, ["review_count", "quality_sum", "avg_quality"])
+                        fixed = []
+
+            if fixed:
+                Card.objects.using(alias).bulk_update(fixed, ["review_count", "quality_sum", "avg_quality"])
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("All card totals match the review log"))
+        elif options["fix"]:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {mismatches} cards"))
+        else:
+            self.stdout.write(self.style.ERROR(f"{mismatches} cards disagree with the review log; rerun with --fix"))
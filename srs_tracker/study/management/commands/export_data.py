@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from study.exporters import FORMATS, KINDS, export
+
+
+class Command(BaseCommand):
+    help = "Stream decks, cards or reviews as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=KINDS)
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument("--user", type=int, help="Only this user id (default: everyone)")
+        parser.add_argument("--output", help="File to write (default: stdout)")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        chunks = export(options["kind"], options["format"], user_id=options["user"], chunk_size=options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as f:
+                f.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,113 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from study.archive import review_log
+from study.models import ArchivedReview, Review, UserSchedulerParams
+from study.sharding import shard_aliases
+from study.tuning import fit_params
+
+
+class Command(BaseCommand):
+    help = (
+        "Fit SM-2 constants to each user's review log in a process pool and store them for the "
+        "review views; only users with reviews since their last fit are refitted"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Fitting processes; 0 fits inline")
+        parser.add_argument(
+            "--min-reviews",
+            type=int,
+            default=getattr(settings, "SRS_SCHEDULER_MIN_REVIEWS", 200),
+            help="Users with fewer reviews keep the default constants",
+        )
+        parser.add_argument("--candidates", type=int, default=256, help="Candidates per search round")
+        parser.add_argument("--full", action="store_true", help="Refit every user, not only those with new reviews")
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        fitted = 0
+        for alias in shard_aliases():
+            jobs = self.stale_users(alias, options)
+            if not jobs:
+                continue
+            if options["workers"] > 0:
+                with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+                    fitted += self.run_pool(pool, alias, jobs, options)
+            else:
+                for user_id, last_id in jobs:
+                    result = fit_params(*self.history(alias, user_id, last_id), **self.fit_kwargs(user_id, options))
+                    self.save(alias, user_id, last_id, result)
+                    fitted += 1
+        self.stdout.write(self.style.SUCCESS(f"Fitted scheduler parameters for {fitted} users"))
+
+    def stale_users(self, alias, options) -> list[tuple[int, int]]:
+        totals = {}
+        # Archived reviews count towards the history; their ids are older than any hot review
+        for model in (ArchivedReview, Review):
+            grouped = model.objects.using(alias).order_by().values("user_id").annotate(n=Count("id"), last_id=Max("id"))
+            for row in grouped:
+                n, _ = totals.get(row["user_id"], (0, 0))
+                totals[row["user_id"]] = (n + row["n"], row["last_id"])
+        fitted = {} if options["full"] else dict(
+            UserSchedulerParams.objects.using(alias).values_list("user_id", "last_review_id")
+        )
+        return [
+            (user_id, last_id)
+            for user_id, (n, last_id) in sorted(totals.items())
+            if n >= options["min_reviews"] and last_id > fitted.get(user_id, 0)
+        ]
+
+    def history(self, alias, user_id, last_id):
+        rows = review_log(alias, ["card_id", "reviewed_at", "quality", "id"], user_id=user_id, id__lte=last_id).order_by(
+            "card_id", "reviewed_at", "id"
+        )
+        card_ids, days, qualities = [], [], []
+        for card_id, reviewed_at, quality, _ in rows.iterator(chunk_size=5000):
+            card_ids.append(card_id)
+            days.append(timezone.localdate(reviewed_at).toordinal())
+            qualities.append(quality)
+        return card_ids, days, qualities
+
+    def fit_kwargs(self, user_id, options):
+        # Seeded per user so repeated fits of unchanged data agree
+        return {"candidates": options["candidates"], "seed": user_id}
+
+    def run_pool(self, pool, alias, jobs, options) -> int:
+        fitted = 0
+        pending = {}
+        # Histories are loaded here, the fits run in the workers; a few are kept queued per worker
+        for user_id, last_id in jobs:
+            future = pool.submit(fit_params, *self.history(alias, user_id, last_id), **self.fit_kwargs(user_id, options))
+            pending[future] = (user_id, last_id)
+            while len(pending) >= 2 * options["workers"]:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.save(alias, *pending.pop(future), future.result())
+                    fitted += 1
+        for future in list(pending):
+            self.save(alias, *pending.pop(future), future.result())
+            fitted += 1
+        return fitted
+
+    def save(self, alias, user_id, last_id, result):
+        UserSchedulerParams.objects.using(alias).update_or_create(
+            user_id=user_id,
+            defaults={
+                **asdict(result.params),
+                "observations": result.observations,
+                "last_review_id": last_id,
+                "log_likelihood": result.log_likelihood,
+                "default_log_likelihood": result.default_log_likelihood,
+                "fitted_at": timezone.now(),
+            },
+        )
+        if self.verbosity > 1:
+            gain = result.log_likelihood - result.default_log_likelihood
+            self.stdout.write(f"user {user_id} on {alias}: {result.observations} answers, log-likelihood {gain:+.1f} over defaults")
@@ -0,0 +1,127 @@
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from study.models import Card, Deck, Review
+from study.services import sm2_calculate_batch
+
+User = get_user_model()
+
+# Grade shares 0..5 of a typical learner
+GRADES = (0.04, 0.05, 0.09, 0.22, 0.35, 0.25)
+
+
+class Command(BaseCommand):
+    help = "Generate users x decks x cards x reviews with SM-2 consistent state using bulk inserts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--decks", type=int, default=5, help="Decks per user")
+        parser.add_argument("--cards", type=int, default=200, help="Cards per deck")
+        parser.add_argument("--reviews", type=int, default=8, help="Maximum reviews per card")
+        parser.add_argument("--days", type=int, default=180, help="Length of the simulated history")
+        parser.add_argument("--prefix", default="synthetic")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        started = time.perf_counter()
+        offset = User.objects.filter(username__startswith=f"{options['prefix']}-").count()
+
+        users = User.objects.bulk_create(
+            [User(username=f"{options['prefix']}-{offset + i}", password="!") for i in range(options["users"])]
+        )
+        totals = {"cards": 0, "reviews": 0}
+        for user in users:
+            with transaction.atomic():
+                cards, reviews = self.generate_user(user, rng, options)
+            totals["cards"] += cards
+            totals["reviews"] += reviews
+            self.stdout.write(f"{user.username}: {cards} cards, {reviews} reviews")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {len(users)} users, {totals['cards']} cards and {totals['reviews']} reviews in {elapsed:.1f}s"
+            )
+        )
+
+    def generate_user(self, user, rng, options):
+        batch_size = options["batch_size"]
+        today = np.datetime64(timezone.localdate(), "D")
+        n = options["decks"] * options["cards"]
+
+        decks = Deck.objects.bulk_create(
+            [Deck(user=user, title=f"Deck {i + 1}", description="Synthetic data") for i in range(options["decks"])]
+        )
+
+        # Replay up to --reviews gradings per card, starting at a random day of the history
+        reps = np.zeros(n, dtype=np.int64)
+        interval = np.zeros(n, dtype=np.int64)
+        ef = np.full(n, 2.5)
+        due = today - rng.integers(0, options["days"] + 1, n).astype("timedelta64[D]")
+        log = []
+        for _ in range(options["reviews"]):
+            idx = np.flatnonzero(due <= today)
+            if not idx.size:
+                break
+            quality = rng.choice(6, size=idx.size, p=GRADES)
+            res = sm2_calculate_batch(
+                quality=quality,
+                repetitions=reps[idx],
+                interval_days=interval[idx],
+                ease_factor=ef[idx],
+                review_date=due[idx],
+            )
+            log.append((idx, due[idx].copy(), quality, res))
+            reps[idx], interval[idx], ef[idx], due[idx] = res.repetitions, res.interval_days, res.ease_factor, res.next_review_at
+
+        cards = Card.objects.bulk_create(
+            [
+                Card(
+                    deck=decks[i // options["cards"]],
+                    user=user,
+                    front_text=f"Question {i + 1} for {user.username}",
+                    back_text=f"Answer {i + 1}",
+                    next_review_at=due[i].astype(object),
+                    interval_days=int(interval[i]),
+                    repetitions=int(reps[i]),
+                    ease_factor=float(ef[i]),
+                )
+                for i in range(n)
+            ],
+            batch_size=batch_size,
+        )
+
+        tz = timezone.get_current_timezone()
+        reviews = []
+        written = 0
+        for idx, days, quality, res in log:
+            seconds = rng.integers(8 * 3600, 22 * 3600, idx.size)
+            for j, i in enumerate(idx):
+                reviews.append(
+                    Review(
+                        user=user,
+                        card=cards[i],
+                        reviewed_at=datetime.combine(days[j].astype(object), dt_time(), tz) + timedelta(seconds=int(seconds[j])),
+                        quality=int(quality[j]),
+                        repetitions=int(res.repetitions[j]),
+                        interval_days=int(res.interval_days[j]),
+                        ease_factor=float(res.ease_factor[j]),
+                        next_review_at=res.next_review_at[j].astype(object),
+                    )
+                )
+                if len(reviews) >= batch_size:
+                    Review.objects.bulk_create(reviews)
+                    written += len(reviews)
+                    reviews = []
+        if reviews:
+            Review.objects.bulk_create(reviews)
+            written += len(reviews)
+        return n, written
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from study.importers import FORMATS, PARSERS, ImportAborted, format_for_filename, import_cards
+from study.models import Deck
+
+
+class Command(BaseCommand):
+    help = "Stream cards from a CSV, Anki-style TSV or JSON file into a deck"
+
+    def add_arguments(self, parser):
+        parser.add_argument("deck_id", type=int)
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--database", default="default", help="Shard holding the deck")
+
+    def handle(self, *args, **options):
+        try:
+            deck = Deck.objects.using(options["database"]).get(pk=options["deck_id"])
+        except Deck.DoesNotExist:
+            raise CommandError(f"Deck {options['deck_id']} does not exist")
+
+        path = Path(options["path"])
+        fmt = options["format"] or format_for_filename(path.name)
+        if fmt is None:
+            raise CommandError("Cannot infer the format from the file name; pass --format")
+
+        def progress(result):
+            self.stdout.write(
+                f"{result.processed} rows: {result.created} created, {result.duplicates} duplicates, {result.invalid} invalid"
+            )
+
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            try:
+                result = import_cards(deck, PARSERS[fmt](f), chunk_size=options["chunk_size"], progress=progress)
+            except ImportAborted as exc:
+                raise CommandError(
+                    f"Cannot parse {path} ({exc.__cause__}); {exc.result.created} cards were imported before the error"
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {result.created} cards into '{deck.title}'"))
@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from study.models import UserShard
+from study.sharding import move_user, shard_aliases, shard_for_user
+
+
+class Command(BaseCommand):
+    help = "Move a user's decks, cards, tags and reviews to another shard, or list users per shard"
+
+    def add_arguments(self, parser):
+        parser.add_argument("user", nargs="?", help="Username or id")
+        parser.add_argument("target", nargs="?", help="Database alias from SRS_SHARDS")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options["user"]:
+            return self.show_status()
+        if not options["target"]:
+            raise CommandError("Pass the target shard")
+        if options["target"] not in shard_aliases():
+            raise CommandError(f"Unknown shard {options['target']!r}; configured: {', '.join(shard_aliases())}")
+
+        User = get_user_model()
+        lookup = {"pk": options["user"]} if options["user"].isdigit() else {"username": options["user"]}
+        try:
+            user = User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']!r} not found")
+
+        source = shard_for_user(user.pk)
+        counts = move_user(user.pk, options["target"], chunk_size=options["chunk_size"])
+        if not counts:
+            self.stdout.write(f"{user} is already on {source}")
+            return
+        summary = ", ".join(f"{n} {name}" for name, n in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Moved {user} from {source} to {options['target']}: {summary}"))
+
+    def show_status(self):
+        User = get_user_model()
+        placed = dict(UserShard.objects.values_list("alias").annotate(n=Count("pk")).order_by())
+        unplaced = User.objects.exclude(pk__in=UserShard.objects.values("user_id")).count()
+        for alias in shard_aliases():
+            users = placed.pop(alias, 0) + (unplaced if alias == "default" else 0)
+            self.stdout.write(f"{alias:<12} {users} users")
+        for alias, n in placed.items():
+            self.stdout.write(self.style.ERROR(f"{alias:<12} {n} users on a database missing from SRS_SHARDS"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from study.search import install_fts, rebuild_fts
+from study.sharding import shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Recreate the card full-text index and its sync triggers (SQLite FTS5)"
+
+    def handle(self, *args, **options):
+        for alias in shard_aliases():
+            connection = connections[alias]
+            if connection.vendor != "sqlite":
+                self.stdout.write(f"Nothing to do on {alias}: {connection.vendor} uses the fallback search")
+                continue
+            if not install_fts(connection):
+                rebuild_fts(connection)
+            self.stdout.write(self.style.SUCCESS(f"Card search index rebuilt on {alias}"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from study.sharding import shard_aliases
+from study.stats import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily review rollups from the Review log"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="users", help="Only rebuild this user id (repeatable)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = sum(
+            rebuild_daily_stats(user_ids=options["users"], batch_size=options["batch_size"], using=alias)
+            for alias in shard_aliases()
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} daily rows"))
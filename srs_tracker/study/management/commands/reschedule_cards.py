@@ -0,0 +1,153 @@
+import json
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from study.archive import review_log
+from study.caching import bump_user_version
+from study.models import ArchivedReview, Card, Review
+from study.review_queue import VERSION_NAMESPACE as REVIEW_QUEUE_NAMESPACE
+from study.routers import pin_primary
+from study.services import SCHEDULE_FIELDS, get_sm2_params, replay_schedule
+from study.sharding import shard_aliases, user_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every reviewed card's schedule by replaying its review log with the owner's "
+        "SM-2 constants, per user in a process pool; resumes from a checkpoint file"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Replay processes; 0 replays in this process")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Cards per bulk_update")
+        parser.add_argument("--checkpoint", default="reschedule_cards.checkpoint.json", help="Progress file for resuming")
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+        parser.add_argument("--dry-run", action="store_true", help="Only report cards whose schedule would change")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.verbosity = options["verbosity"]
+        path = options["checkpoint"]
+        done = {} if options["restart"] else self.load_checkpoint(path)
+        if done:
+            self.stdout.write(f"Resuming from {path}: " + ", ".join(f"{a} after user {u}" for a, u in done.items()))
+
+        self.totals = Counter()
+        started = time.perf_counter()
+        if options["workers"] > 0:
+            executor = ProcessPoolExecutor(max_workers=options["workers"])
+        else:
+            executor = ThreadPoolExecutor(max_workers=1)
+        with executor:
+            for alias in shard_aliases():
+                users = sorted({
+                    user_id
+                    for model in (Review, ArchivedReview)
+                    for user_id in model.objects.using(alias)
+                    .filter(user_id__gt=done.get(alias, 0))
+                    .order_by()
+                    .values_list("user_id", flat=True)
+                    .distinct()
+                })
+                # Results are applied in user order, so the checkpoint only moves past finished users
+                pending = deque()
+                for user_id in users:
+                    versions, history = self.history(alias, user_id)
+                    pending.append((user_id, versions, executor.submit(replay_schedule, *history)))
+                    while len(pending) > 2 * max(options["workers"], 1):
+                        self.finish(alias, *pending.popleft(), done, path)
+                while pending:
+                    self.finish(alias, *pending.popleft(), done, path)
+
+        elapsed = time.perf_counter() - started
+        cards = self.totals["cards"]
+        changed = ", ".join(f"{self.totals[f]} {f}" for f in SCHEDULE_FIELDS)
+        verb = "would change" if options["dry_run"] else "changed"
+        self.stdout.write(
+            f"Replayed {cards} cards of {self.totals['users']} users in {elapsed:.1f} s "
+            f"({cards / elapsed if elapsed else 0:.0f} cards/s); {self.totals['changed']} {verb} ({changed})"
+        )
+        if self.totals["skipped"]:
+            self.stdout.write(
+                self.style.WARNING(f"{self.totals['skipped']} cards were graded during the run and kept their schedule")
+            )
+        if not options["dry_run"] and os.path.exists(path):
+            os.remove(path)
+        self.stdout.write(self.style.SUCCESS("Dry run, nothing written" if options["dry_run"] else "Done"))
+
+    def history(self, alias, user_id):
+        """Card versions and the replay arguments; versions are read first, so a grade logged after
+        them makes the card's write skip rather than drop the grade."""
+        versions = dict(Card.objects.using(alias).filter(user_id=user_id).values_list("id", "version").iterator())
+        rows = review_log(alias, ["card_id", "reviewed_at", "quality", "id"], user_id=user_id).order_by(
+            "card_id", "reviewed_at", "id"
+        )
+        card_ids, days, qualities = [], [], []
+        for card_id, reviewed_at, quality, _ in rows.iterator(chunk_size=5000):
+            card_ids.append(card_id)
+            days.append(timezone.localdate(reviewed_at))
+            qualities.append(quality)
+        with user_shard(user_id):
+            params = get_sm2_params(user_id)
+        return versions, (card_ids, np.array(days, dtype="datetime64[D]"), qualities, params)
+
+    def finish(self, alias, user_id, versions, future, done, path):
+        card_ids, res = future.result()
+        replayed = {int(pk): res[i] for i, pk in enumerate(card_ids)}
+        current = Card.objects.using(alias).filter(user_id=user_id).values_list("id", "version", *SCHEDULE_FIELDS)
+        changed = []
+        skipped = 0
+        for pk, version, *state in current.iterator(chunk_size=5000):
+            new = replayed.get(pk)
+            if new is None:
+                continue
+            if version != versions.get(pk):
+                skipped += 1
+                continue
+            diff = {f: (old, getattr(new, f)) for f, old in zip(SCHEDULE_FIELDS, state) if getattr(new, f) != old}
+            if diff:
+                self.totals.update(diff.keys())
+                changed.append(Card(pk=pk, version=F("version") + 1, **{f: getattr(new, f) for f in SCHEDULE_FIELDS}))
+                if self.verbosity > 1:
+                    self.stdout.write(f"card {pk}: " + ", ".join(f"{f} {a} -> {b}" for f, (a, b) in diff.items()))
+        written = len(changed)
+        if not self.options["dry_run"]:
+            written = 0
+            size = self.options["chunk_size"]
+            for i in range(0, len(changed), size):
+                chunk = changed[i : i + size]
+                # Only cards still at the version the history was read with; a live grade in between wins
+                unchanged = Q(*(Q(pk=card.pk, version=versions[card.pk]) for card in chunk), _connector=Q.OR)
+                with transaction.atomic(using=alias):
+                    cards = Card.objects.using(alias).filter(unchanged)
+                    written += cards.bulk_update(chunk, [*SCHEDULE_FIELDS, "version"])
+        self.totals.update(users=1, cards=len(replayed), changed=written, skipped=skipped + len(changed) - written)
+
+        if self.options["dry_run"]:
+            return
+        if written:
+            bump_user_version(REVIEW_QUEUE_NAMESPACE, user_id)
+            pin_primary(user_id)
+        done[alias] = user_id
+        self.save_checkpoint(path, done)
+
+    def load_checkpoint(self, path) -> dict:
+        try:
+            with open(path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {}
+
+    def save_checkpoint(self, path, done):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(done, fh)
+        os.replace(tmp, path)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from study.demo import seed_pending_demo_decks
+from study.models import DemoSeedRequest
+
+
+class Command(BaseCommand):
+    help = "Seed demo decks for users registered with deferred seeding"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None, help="Process at most this many users")
+
+    def handle(self, *args, **options):
+        pending = DemoSeedRequest.objects.select_related("user")
+        if options["limit"]:
+            pending = pending[: options["limit"]]
+
+        seeded = sum(seed_pending_demo_decks(request.user) for request in list(pending))
+        self.stdout.write(self.style.SUCCESS(f"Seeded demo decks for {seeded} users"))
@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, transaction
+from django.utils import timezone
+
+from study.models import Card, Deck, Review
+from study.services import get_sm2_params, grade_card, sm2_calculate
+
+PROFILES = ("default", "production")
+# "read-then-write" is the grading path before grade_card: the card is read inside the transaction,
+# which is what a deferred (default profile) transaction cannot upgrade under concurrent writers
+GRADINGS = ("read-then-write", "grade_card")
+
+
+class Command(BaseCommand):
+    help = (
+        "Grade cards from several writer processes against a scratch SQLite file per "
+        "database profile and compare write throughput and lock errors"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, nargs="+", default=[1, 4, 8])
+        parser.add_argument("--seconds", type=float, default=5.0)
+        parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=list(PROFILES))
+        parser.add_argument("--grading", choices=GRADINGS, default=GRADINGS[0], help="Transaction shape of one grade")
+        # Internal: run as one writer process
+        parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["worker"] is not None:
+            return self.run_worker(options["worker"], options["seconds"], options["grading"])
+
+        results = []
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+        # SQLite runs one write transaction at a time, so extra writers only help by overlapping the
+        # work outside it (request handling, SM-2, query compilation), which needs a free core each
+        self.stdout.write(
+            f"{cpus} CPUs available, --grading {options['grading']}; "
+            "speedup is against the first --writers value of each profile"
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            for profile in options["profiles"]:
+                baseline = None
+                for writers in options["writers"]:
+                    db = Path(tmp) / f"{profile}-{writers}.sqlite3"
+                    env = {**os.environ, "SRS_DB_PROFILE": profile, "SRS_DB_NAME": str(db)}
+                    subprocess.run(self.manage_argv("migrate", "--noinput", "-v0"), env=env, check=True)
+                    row = self.run_writers(writers, options["seconds"], env, options["grading"])
+                    baseline = baseline or row["reviews_per_sec"]
+                    speedup = row["reviews_per_sec"] / baseline if baseline else 0.0
+                    row.update(profile=profile, writers=writers, speedup=speedup)
+                    results.append(row)
+                    self.stdout.write(
+                        f"{profile:<11} {writers:2d} writers   {row['reviews_per_sec']:8.1f} reviews/s   "
+                        f"x{row['speedup']:4.2f}   {row['locked']:5d} locked   {row['p95_ms']:8.2f} ms p95"
+                        + ("   (more writers than CPUs)" if writers > cpus else "")
+                    )
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def manage_argv(self, *args):
+        return [sys.executable, sys.argv[0], *args]
+
+    def run_writers(self, writers, seconds, env, grading):
+        argv = self.manage_argv("stress_writes", "--seconds", str(seconds), "--grading", grading)
+        procs = [
+            subprocess.Popen(
+                argv + ["--worker", str(i)], env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+            )
+            for i in range(writers)
+        ]
+        # Writers report "ready" after their setup and then all start at the same moment
+        for proc in procs:
+            if proc.stdout.readline().strip() != "ready":
+                raise CommandError("writer failed during setup")
+        start = time.time() + 0.1
+        reports = []
+        for proc in procs:
+            proc.stdin.write(f"{start}\n")
+            proc.stdin.flush()
+        for proc in procs:
+            out, _ = proc.communicate()
+            if proc.returncode:
+                raise CommandError(f"writer exited with {proc.returncode}")
+            reports.append(json.loads(out.strip().splitlines()[-1]))
+        latencies = sorted(ms for r in reports for ms in r["latencies_ms"])
+        done = sum(r["done"] for r in reports)
+        return {
+            "reviews": done,
+            "reviews_per_sec": done / seconds,
+            "locked": sum(r["locked"] for r in reports),
+            "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+        }
+
+    def run_worker(self, index, seconds, grading):
+        for attempt in range(5):
+            try:
+                with transaction.atomic():
+                    user = get_user_model().objects.create(username=f"writer-{index}", is_superuser=True)
+                    deck = Deck.objects.create(user=user, title="Stress")
+                    Card.objects.bulk_create(
+                        [Card(deck=deck, user=user, front_text=f"q{i}", back_text=f"a{i}") for i in range(50)]
+                    )
+                break
+            except OperationalError:
+                time.sleep(0.1 * (attempt + 1))
+        else:
+            raise CommandError("could not set up the writer")
+        card_ids = list(deck.cards.values_list("id", flat=True))
+
+        self.stdout.write("ready")
+        self.stdout.flush()
+        start = float(sys.stdin.readline())
+
+        rng = random.Random(index)
+        done = locked = 0
+        latencies = []
+        time.sleep(max(0.0, start - time.time()))
+        deadline = start + seconds
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                self.grade(user, rng.choice(card_ids), rng.randint(0, 5), grading)
+            except OperationalError:
+                locked += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            done += 1
+        self.stdout.write(json.dumps({"done": done, "locked": locked, "latencies_ms": latencies}))
+
+    def grade(self, user, card_id, quality, grading):
+        if grading == "grade_card":
+            # Same writes as a graded answer on /review/today/
+            grade_card(user, card_id, quality)
+            return
+        with transaction.atomic():
+            card = Card.objects.get(pk=card_id, user=user)
+            res = sm2_calculate(
+                quality=quality,
+                repetitions=card.repetitions,
+                interval_days=card.interval_days,
+                ease_factor=card.ease_factor,
+                review_date=timezone.localdate(),
+                params=get_sm2_params(user.id),
+            )
+            Card.objects.filter(pk=card.pk).update(
+                repetitions=res.repetitions,
+                interval_days=res.interval_days,
+                ease_factor=res.ease_factor,
+                next_review_at=res.next_review_at,
+            )
+            Review.objects.create(
+                user=user,
+                card=card,
+                quality=quality,
+                repetitions=res.repetitions,
+                interval_days=res.interval_days,
+                ease_factor=res.ease_factor,
+                next_review_at=res.next_review_at,
+            )
@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the latency histogram
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNRESOLVED = "unresolved"
+
+
+class ViewStats:
+    __slots__ = ("requests", "latency_sum", "queries", "db_seconds", "buckets")
+
+    def __init__(self):
+        self.requests = 0
+        self.latency_sum = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+
+class Registry:
+    """Per-process totals by URL name; every worker exposes its own numbers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, latency, queries, db_seconds):
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = ViewStats()
+            stats.requests += 1
+            stats.latency_sum += latency
+            stats.queries += queries
+            stats.db_seconds += db_seconds
+            stats.buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                view: {
+                    "requests": s.requests,
+                    "latency_sum": s.latency_sum,
+                    "queries": s.queries,
+                    "db_seconds": s.db_seconds,
+                    "buckets": list(s.buckets),
+                }
+                for view, s in self._views.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+registry = Registry()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _wrap_connections(self, stack, counter):
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(counter))
+
+    def _record(self, request, started, counter):
+        latency = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match and match.view_name else UNRESOLVED
+        registry.observe(view, latency, counter.count, counter.seconds)
+        check_budgets(view, request.path, latency, counter.count)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            self._wrap_connections(stack, counter)
+            response = self.get_response(request)
+        self._record(request, started, counter)
+        return response
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        # Connections belong to the request's sync thread, where async ORM calls run
+        stack = ExitStack()
+        await sync_to_async(self._wrap_connections)(stack, counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self._record(request, started, counter)
+        return response
+
+
+def check_budgets(view, path, latency, queries):
+    query_budget = getattr(settings, "SRS_METRICS_QUERY_BUDGET", None)
+    latency_budget = getattr(settings, "SRS_METRICS_LATENCY_BUDGET_MS", None)
+    if query_budget is not None and queries > query_budget:
+        logger.warning("%s (%s) ran %d queries, budget is %d", view, path, queries, query_budget)
+    if latency_budget is not None and latency * 1000 > latency_budget:
+        logger.warning("%s (%s) took %.0f ms, budget is %d ms", view, path, latency * 1000, latency_budget)
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(snapshot: dict, extra: dict | None = None) -> str:
+    lines = [
+        "# HELP srs_http_requests_total Requests handled by URL name.",
+        "# TYPE srs_http_requests_total counter",
+    ]
+    views = sorted(snapshot.items())
+    for view, s in views:
+        lines.append(f'srs_http_requests_total{{view="{_label(view)}"}} {s["requests"]}')
+
+    lines += [
+        "# HELP srs_http_request_duration_seconds Request latency by URL name.",
+        "# TYPE srs_http_request_duration_seconds histogram",
+    ]
+    for view, s in views:
+        label = _label(view)
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS, s["buckets"]):
+            cumulative += n
+            lines.append(f'srs_http_request_duration_seconds_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'srs_http_request_duration_seconds_bucket{{view="{label}",le="+Inf"}} {s["requests"]}')
+        lines.append(f'srs_http_request_duration_seconds_sum{{view="{label}"}} {s["latency_sum"]:.6f}')
+        lines.append(f'srs_http_request_duration_seconds_count{{view="{label}"}} {s["requests"]}')
+
+    lines += [
+        "# HELP srs_db_queries_total Database queries issued by URL name.",
+        "# TYPE srs_db_queries_total counter",
+    ]
+    for view, s in views:
+        lines.append(f'srs_db_queries_total{{view="{_label(view)}"}} {s["queries"]}')
+
+    lines += [
+        "# HELP srs_db_query_seconds_total Time spent in database queries by URL name.",
+        "# TYPE srs_db_query_seconds_total counter",
+    ]
+    for view, s in views:
+        lines.append(f'srs_db_query_seconds_total{{view="{_label(view)}"}} {s["db_seconds"]:.6f}')
+
+    for name, (help_text, value) in sorted((extra or {}).items()):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_card_user(apps, schema_editor):
+    Card = apps.get_model("study", "Card")
+    Deck = apps.get_model("study", "Deck")
+    Card.objects.using(schema_editor.connection.alias).update(
+        user_id=models.Subquery(Deck.objects.filter(pk=models.OuterRef("deck_id")).values("user_id")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='user',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cards', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_card_user, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='card',
+            name='user',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='cards', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', 'next_review_at', 'id', 'is_active'], name='card_due_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0002_card_user'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='review',
+            name='reviewed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0003_alter_review_reviewed_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyReviewStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('quality_sum', models.PositiveIntegerField(default=0)),
+                ('q0', models.PositiveIntegerField(default=0)),
+                ('q1', models.PositiveIntegerField(default=0)),
+                ('q2', models.PositiveIntegerField(default=0)),
+                ('q3', models.PositiveIntegerField(default=0)),
+                ('q4', models.PositiveIntegerField(default=0)),
+                ('q5', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_review_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['day'],
+                'unique_together': {('user', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_review_totals(apps, schema_editor):
+    Card = apps.get_model("study", "Card")
+    Review = apps.get_model("study", "Review")
+    reviews = Review.objects.filter(card_id=models.OuterRef("pk")).order_by().values("card_id")
+    Card.objects.using(schema_editor.connection.alias).update(
+        review_count=models.functions.Coalesce(models.Subquery(reviews.annotate(n=models.Count("id")).values("n")), 0),
+        quality_sum=models.functions.Coalesce(models.Subquery(reviews.annotate(s=models.Sum("quality")).values("s")), 0),
+    )
+    Card.objects.using(schema_editor.connection.alias).filter(review_count__gt=0).update(
+        avg_quality=models.F("quality_sum") * 1.0 / models.F("review_count")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0004_dailyreviewstat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='avg_quality',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='quality_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_review_totals, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(condition=models.Q(('review_count__gte', 3)), fields=['user', 'avg_quality', '-review_count'], name='card_hardest_idx'),
+        ),
+    ]
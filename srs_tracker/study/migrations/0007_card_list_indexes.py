@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0006_demoseedrequest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='card',
+            options={'ordering': ['next_review_at', 'id']},
+        ),
+        migrations.AlterField(
+            model_name='card',
+            name='deck',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='cards', to='study.deck'),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['deck', 'next_review_at', 'id'], name='card_deck_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['deck', 'next_review_at', 'id', 'is_active'], name='card_deck_active_list_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:40
+
+from django.db import migrations
+
+
+def create_card_search(apps, schema_editor):
+    from study.search import install_fts
+
+    install_fts(schema_editor.connection)
+
+
+def drop_card_search(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for trigger in ("study_card_fts_ai", "study_card_fts_ad", "study_card_fts_au"):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    schema_editor.execute("DROP TABLE IF EXISTS study_card_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0007_card_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_card_search, drop_card_search),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('study', '0009_user_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSchedulerParams',
+            fields=[
+                ('user', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='scheduler_params', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('ef_bonus', models.FloatField(default=0.1)),
+                ('ef_linear', models.FloatField(default=0.08)),
+                ('ef_quadratic', models.FloatField(default=0.02)),
+                ('ef_floor', models.FloatField(default=1.3)),
+                ('first_interval', models.PositiveIntegerField(default=1)),
+                ('second_interval', models.PositiveIntegerField(default=6)),
+                ('observations', models.PositiveIntegerField(default=0)),
+                ('last_review_id', models.PositiveBigIntegerField(default=0)),
+                ('log_likelihood', models.FloatField(default=0.0)),
+                ('default_log_likelihood', models.FloatField(default=0.0)),
+                ('fitted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
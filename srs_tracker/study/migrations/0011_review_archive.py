@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0010_scheduler_params'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedReview',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('reviewed_at', models.DateTimeField()),
+                ('quality', models.PositiveSmallIntegerField()),
+                ('interval_days', models.PositiveIntegerField()),
+                ('repetitions', models.PositiveSmallIntegerField()),
+                ('ease_factor', models.FloatField()),
+                ('next_review_at', models.DateField()),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_reviews', to='study.card')),
+                ('user', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='archive_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0011_review_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0012_card_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='archivedreview',
+            name='ease_factor',
+        ),
+        migrations.RemoveField(
+            model_name='archivedreview',
+            name='interval_days',
+        ),
+        migrations.RemoveField(
+            model_name='archivedreview',
+            name='next_review_at',
+        ),
+        migrations.RemoveField(
+            model_name='archivedreview',
+            name='repetitions',
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['reviewed_at'], name='review_reviewed_at_idx'),
+        ),
+    ]
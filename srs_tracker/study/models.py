@@ -4,8 +4,10 @@ from django.db import models
 from django.utils import timezone
 
 
+# Per-user tables may live on a shard without auth_user (see study.sharding), so their
+# user foreign keys are not enforced by the database
 class Deck(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="decks")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="decks", db_constraint=False)
     title = models.CharField(max_length=120)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -16,9 +18,16 @@ class Deck(models.Model):
     def __str__(self) -> str:
         return self.title
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "user" in update_fields:
+            # Cards carry a denormalized copy of the owner
+            self.cards.exclude(user_id=self.user_id).update(user_id=self.user_id)
+
 
 class Tag(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="tags")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="tags", db_constraint=False)
     name = models.CharField(max_length=40)
 
     class Meta:
@@ -29,8 +38,17 @@ class Tag(models.Model):
         return self.name
 
 
+# Cards need this many reviews before they are ranked among the hardest
+HARD_CARD_MIN_REVIEWS = 3
+
+
 class Card(models.Model):
-    deck = models.ForeignKey(Deck, on_delete=models.CASCADE, related_name="cards")
+    # Indexed through card_deck_list_idx
+    deck = models.ForeignKey(Deck, on_delete=models.CASCADE, related_name="cards", db_index=False)
+    # Denormalized deck.user, kept in sync by save(); leads card_due_queue_idx
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="cards", db_index=False, editable=False, db_constraint=False
+    )
     front_text = models.TextField()
     back_text = models.TextField()
     tags = models.ManyToManyField(Tag, blank=True, related_name="cards")
@@ -42,18 +60,78 @@ class Card(models.Model):
     interval_days = models.PositiveIntegerField(default=0)
     repetitions = models.PositiveIntegerField(default=0)
     ease_factor = models.FloatField(default=2.5)
+    # Bumped by every schedule write; grading updates the card only if it still has the version it read
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    # Running totals over the card's reviews, maintained by study.stats.record_reviews/forget_reviews
+    review_count = models.PositiveIntegerField(default=0)
+    quality_sum = models.PositiveIntegerField(default=0)
+    avg_quality = models.FloatField(default=0.0)
 
     class Meta:
-        ordering = ["next_review_at", "-created_at"]
+        # Keyset pagination in CardListView relies on this order being total
+        ordering = ["next_review_at", "id"]
+        indexes = [
+            models.Index(fields=["deck", "next_review_at", "id"], name="card_deck_list_idx"),
+            models.Index(
+                fields=["deck", "next_review_at", "id", "is_active"],
+                condition=models.Q(is_active=True),
+                name="card_deck_active_list_idx",
+            ),
+            models.Index(
+                # Trailing is_active lets SQLite answer the due count from the index alone
+                fields=["user", "next_review_at", "id", "is_active"],
+                condition=models.Q(is_active=True),
+                name="card_due_queue_idx",
+            ),
+            models.Index(
+                fields=["user", "avg_quality", "-review_count"],
+                condition=models.Q(review_count__gte=HARD_CARD_MIN_REVIEWS),
+                name="card_hardest_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"Card #{self.pk} ({self.deck.title})"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "deck" in update_fields:
+            self.user_id = self.deck.user_id
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "user"}
+        super().save(*args, **kwargs)
+
+
+class ReviewQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, record_stats=True, **kwargs):
+        from .stats import record_reviews
+
+        objs = super().bulk_create(objs, *args, **kwargs)
+        # Copies of already counted reviews (e.g. a shard move) pass record_stats=False
+        if record_stats:
+            record_reviews(objs)
+        return objs
+
+    def delete(self, record_stats=True):
+        from .stats import deletes_unrecorded, forget_reviews, recording_deletes
+
+        # Collected up front so the rollups are corrected in one pass, not per deleted row
+        reviews = []
+        if record_stats and recording_deletes():
+            reviews = list(self.only("user_id", "card_id", "reviewed_at", "quality"))
+        with deletes_unrecorded():
+            result = super().delete()
+        if reviews:
+            forget_reviews(reviews)
+        return result
+
 
 class Review(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="reviews")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="reviews", db_constraint=False)
     card = models.ForeignKey(Card, on_delete=models.CASCADE, related_name="reviews")
-    reviewed_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: bulk/offline submissions carry their own timestamp
+    reviewed_at = models.DateTimeField(default=timezone.now)
 
     quality = models.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(5)])
 
@@ -62,8 +140,104 @@ class Review(models.Model):
     ease_factor = models.FloatField()
     next_review_at = models.DateField()
 
+    objects = ReviewQuerySet.as_manager()
+
     class Meta:
         ordering = ["-reviewed_at"]
+        # archive_reviews walks the oldest reviews first
+        indexes = [models.Index(fields=["reviewed_at"], name="review_reviewed_at_idx")]
 
     def __str__(self) -> str:
         return f"Review #{self.pk}: card={self.card_id}, q={self.quality}"
+
+
+class ArchivedReview(models.Model):
+    """Review older than SRS_REVIEW_ARCHIVE_DAYS, moved out of the hot Review table by archive_reviews.
+
+    Keeps the review's original id, time and grade; the schedule it produced is not kept, reschedule_cards
+    replays it from the grades. Card totals and daily rollups already include these rows.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+", db_constraint=False, db_index=False
+    )
+    card = models.ForeignKey(Card, on_delete=models.CASCADE, related_name="archived_reviews")
+    reviewed_at = models.DateTimeField()
+    quality = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "id"], name="archive_user_idx")]
+
+    def __str__(self) -> str:
+        return f"Archived review #{self.pk}: card={self.card_id}, q={self.quality}"
+
+
+class DailyReviewStat(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="daily_review_stats", db_constraint=False)
+    day = models.DateField()
+
+    review_count = models.PositiveIntegerField(default=0)
+    quality_sum = models.PositiveIntegerField(default=0)
+    q0 = models.PositiveIntegerField(default=0)
+    q1 = models.PositiveIntegerField(default=0)
+    q2 = models.PositiveIntegerField(default=0)
+    q3 = models.PositiveIntegerField(default=0)
+    q4 = models.PositiveIntegerField(default=0)
+    q5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("user", "day")
+        ordering = ["day"]
+
+    def __str__(self) -> str:
+        return f"{self.user_id} {self.day}: {self.review_count}"
+
+    @property
+    def avg_quality(self) -> float:
+        return self.quality_sum / self.review_count if self.review_count else 0.0
+
+
+class DemoSeedRequest(models.Model):
+    # Users whose demo decks are seeded on first login or by the seed_demo_decks command
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="demo_seed_request")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["created_at"]
+
+    def __str__(self) -> str:
+        return f"Demo seed for user {self.user_id}"
+
+
+class UserShard(models.Model):
+    # Database alias holding the user's study data; users without a row live on "default"
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="shard")
+    alias = models.CharField(max_length=64)
+    moved_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"User {self.user_id} on {self.alias}"
+
+
+class UserSchedulerParams(models.Model):
+    # SM-2 constants fitted to the user's review log by fit_scheduler_params; lives on the user's shard
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="scheduler_params", db_constraint=False
+    )
+    ef_bonus = models.FloatField(default=0.1)
+    ef_linear = models.FloatField(default=0.08)
+    ef_quadratic = models.FloatField(default=0.02)
+    ef_floor = models.FloatField(default=1.3)
+    first_interval = models.PositiveIntegerField(default=1)
+    second_interval = models.PositiveIntegerField(default=6)
+
+    # Fit bookkeeping: the user is refitted once reviews past last_review_id exist
+    observations = models.PositiveIntegerField(default=0)
+    last_review_id = models.PositiveBigIntegerField(default=0)
+    log_likelihood = models.FloatField(default=0.0)
+    default_log_likelihood = models.FloatField(default=0.0)
+    fitted_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        return f"Scheduler params for user {self.user_id}"
@@ -0,0 +1,41 @@
+from datetime import date
+
+
+def encode_cursor(card) -> str:
+    return f"{card.next_review_at.isoformat()}.{card.pk}"
+
+
+def decode_cursor(value: str | None):
+    if not value:
+        return None
+    try:
+        day, pk = value.split(".")
+        return date.fromisoformat(day), int(pk)
+    except ValueError:
+        return None
+
+
+def keyset_page(qs, cursor: str | None, page_size: int, until: date | None = None):
+    """One page of ``qs`` in ``(next_review_at, id)`` order starting after ``cursor``.
+
+    ``until`` caps ``next_review_at`` (inclusive). Returns ``(rows, next_cursor)``;
+    ``next_cursor`` is ``None`` on the last page.
+    """
+    limit = page_size + 1
+    later = qs if until is None else qs.filter(next_review_at__lte=until)
+    position = decode_cursor(cursor)
+    if position is None:
+        rows = list(later.order_by("next_review_at", "id")[:limit])
+    else:
+        # SQLite seeks an index on one range column only, so "after (day, pk)" is split into
+        # the rest of the cursor's day and the days after it; both are index range scans
+        day, pk = position
+        rows = []
+        if until is None or day <= until:
+            rows = list(qs.filter(next_review_at=day, pk__gt=pk).order_by("id")[:limit])
+        if len(rows) < limit:
+            rows += later.filter(next_review_at__gt=day).order_by("next_review_at", "id")[: limit - len(rows)]
+
+    if len(rows) > page_size:
+        return rows[:page_size], encode_cursor(rows[page_size - 1])
+    return rows, None
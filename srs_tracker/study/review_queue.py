@@ -0,0 +1,150 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .caching import aget_user_version, get_user_version
+from .models import Card
+
+SESSION_KEY = "review_queue"
+VERSION_NAMESPACE = "review_queue"
+
+
+class ReviewQueue:
+    """Batch of due cards kept in the session so a review run does not query the queue on every page.
+
+    The batch is dropped when the day changes or when the user's cards are edited or deleted
+    (see ``study.signals``); grading itself only removes the card from the batch.
+    """
+
+    def __init__(self, request, user_id=None, state=None):
+        self.request = request
+        self.user_id = request.user.id if user_id is None else user_id
+        self.batch_size = getattr(settings, "SRS_REVIEW_BATCH_SIZE", 50)
+        self.state = request.session.get(SESSION_KEY) if user_id is None else state
+
+    @classmethod
+    async def aload(cls, request):
+        """Async-safe constructor: reads the user and the session without blocking the event loop."""
+        user = await request.auser()
+        return cls(request, user_id=user.id, state=await request.session.aget(SESSION_KEY))
+
+    def _is_fresh(self, version) -> bool:
+        return (
+            self.state is not None
+            and self.state["date"] == timezone.localdate().isoformat()
+            and self.state["version"] == version
+            # Batches saved before cards carried their version cannot be graded
+            and all("version" in c for c in self.state["cards"])
+        )
+
+    def _needs_refill(self, version) -> bool:
+        return not self._is_fresh(version) or (not self.state["cards"] and self.state["remaining"])
+
+    def _due(self, today):
+        return Card.objects.filter(user_id=self.user_id, is_active=True, next_review_at__lte=today)
+
+    def _batch(self, due):
+        return due.order_by("next_review_at", "id").values("id", "version", "front_text", "back_text", "deck__title")[
+            : self.batch_size
+        ]
+
+    def _set_state(self, today, version, cards, remaining) -> None:
+        self.state = {
+            "date": today.isoformat(),
+            "version": version,
+            "cards": [
+                {
+                    "id": c["id"],
+                    "version": c["version"],
+                    "front_text": c["front_text"],
+                    "back_text": c["back_text"],
+                    "deck_title": c["deck__title"],
+                }
+                for c in cards
+            ],
+            "remaining": remaining,
+        }
+
+    def _refill(self) -> None:
+        today = timezone.localdate()
+        due = self._due(today)
+        cards = list(self._batch(due))
+        remaining = len(cards) if len(cards) < self.batch_size else due.count()
+        self._set_state(today, get_user_version(VERSION_NAMESPACE, self.user_id), cards, remaining)
+        self._save()
+
+    async def _arefill(self, version) -> None:
+        today = timezone.localdate()
+        due = self._due(today)
+        cards = [c async for c in self._batch(due)]
+        remaining = len(cards) if len(cards) < self.batch_size else await due.acount()
+        self._set_state(today, version, cards, remaining)
+        await self.request.session.aset(SESSION_KEY, self.state)
+
+    def _save(self) -> None:
+        self.request.session[SESSION_KEY] = self.state
+        self.request.session.modified = True
+
+    def current(self):
+        if self._needs_refill(get_user_version(VERSION_NAMESPACE, self.user_id)):
+            self._refill()
+        return self.state["cards"][0] if self.state["cards"] else None
+
+    async def acurrent(self):
+        version = await aget_user_version(VERSION_NAMESPACE, self.user_id)
+        if self._needs_refill(version):
+            await self._arefill(version)
+        return self.state["cards"][0] if self.state["cards"] else None
+
+    @property
+    def remaining(self) -> int:
+        return self.state["remaining"] if self.state else 0
+
+    def _drop(self, card_id: int) -> bool:
+        cards = [c for c in self.state["cards"] if c["id"] != card_id]
+        if len(cards) == len(self.state["cards"]):
+            return False
+        self.state["cards"] = cards
+        self.state["remaining"] = max(self.state["remaining"] - 1, len(cards))
+        return True
+
+    def discard(self, card_id: int) -> None:
+        if self._is_fresh(get_user_version(VERSION_NAMESPACE, self.user_id)) and self._drop(card_id):
+            self._save()
+
+    async def adiscard(self, card_id: int) -> None:
+        if self._is_fresh(await aget_user_version(VERSION_NAMESPACE, self.user_id)) and self._drop(card_id):
+            await self.request.session.aset(SESSION_KEY, self.state)
+
+
+def _due_count_key(user_id: int, version, today) -> str:
+    return f"srs:due:{user_id}:{version}:{today.isoformat()}"
+
+
+def _seconds_to_midnight(now) -> int:
+    midnight = datetime.combine(now.date() + timedelta(days=1), time.min, tzinfo=now.tzinfo)
+    return max(1, int((midnight - now).total_seconds()) + 1)
+
+
+def get_due_count(user_id: int) -> int:
+    """Active cards due today, cached until local midnight or the next card edit."""
+    now = timezone.localtime()
+    key = _due_count_key(user_id, get_user_version(VERSION_NAMESPACE, user_id), now.date())
+    count = cache.get(key)
+    if count is None:
+        count = Card.objects.filter(user_id=user_id, is_active=True, next_review_at__lte=now.date()).count()
+        # Cards become due at local midnight, so the entry expires then
+        cache.set(key, count, timeout=_seconds_to_midnight(now))
+    return count
+
+
+def adjust_due_count(user_id: int, delta: int) -> None:
+    """Apply a grading's effect to the cached count; grading does not bump the version."""
+    if delta:
+        key = _due_count_key(user_id, get_user_version(VERSION_NAMESPACE, user_id), timezone.localdate())
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass
@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .sharding import CENTRAL_MODELS, current_shard, shard_for_user
+
+
+def replica_alias() -> str | None:
+    alias = getattr(settings, "SRS_REPLICA_DATABASE", None)
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def _pin_key(user_id: int) -> str:
+    return f"srs:replica:pin:{user_id}"
+
+
+def pin_primary(*user_ids: int) -> None:
+    """Keep these users' replica reads on the primary until their writes have replicated."""
+    seconds = getattr(settings, "SRS_REPLICA_PIN_SECONDS", 0)
+    if seconds and replica_alias():
+        cache.set_many({_pin_key(user_id): 1 for user_id in user_ids}, timeout=seconds)
+
+
+def read_alias(user_id: int | None = None) -> str:
+    """Database for lag-tolerant reads (analytics, forecast, exports) on behalf of ``user_id``.
+
+    The replica mirrors the default database only, so users on other shards read their shard.
+    """
+    primary = shard_for_user(user_id) if user_id is not None else DEFAULT_DB_ALIAS
+    replica = replica_alias()
+    if replica is None or primary != DEFAULT_DB_ALIAS or (user_id is not None and cache.get(_pin_key(user_id))):
+        return primary
+    return replica
+
+
+def _is_sharded(model) -> bool:
+    return model._meta.app_label == "study" and model._meta.model_name not in CENTRAL_MODELS
+
+
+class ShardRouter:
+    """Per-user study tables live on the owner's shard (SRS_SHARDS); auth, sessions and
+    the user-to-shard map stay on the default database.
+
+    Instance hints pick the shard where Django provides them (related managers, saves);
+    other queries use the user of the current request or user_shard() block.
+    """
+
+    def _shard(self, model, hints, write):
+        if not _is_sharded(model):
+            return DEFAULT_DB_ALIAS
+        instance = hints.get("instance")
+        if isinstance(instance, get_user_model()):
+            return shard_for_user(instance.pk)
+        if instance is not None:
+            # Reads may follow an instance loaded from the replica; writes never go there
+            if not write and instance._state.db:
+                return instance._state.db
+            user_id = getattr(instance, "user_id", None)
+            if user_id is not None:
+                return shard_for_user(user_id)
+            if instance._state.db:
+                return instance._state.db
+        return current_shard()
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints, write=False)
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints, write=True)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # User foreign keys cross databases and are not enforced (db_constraint=False)
+        User = get_user_model()
+        if isinstance(obj1, User) or isinstance(obj2, User):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica_alias():
+            return None
+        if app_label == "study" and model_name not in CENTRAL_MODELS:
+            # Every database may hold users' study data; the default one keeps pre-sharding users
+            return True
+        return db == DEFAULT_DB_ALIAS
+
+
+class PrimaryReplicaRouter:
+    """All writes go to the primary; reads use the replica only when code asks for read_alias().
+
+    Objects loaded from the replica are saved to the primary and may be related to primary
+    objects. The replica is a copy of the primary file, so it is never migrated on its own.
+    """
+
+    def db_for_read(self, model, **hints):
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica_alias():
+            return False
+        return None
@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Card
+from .sharding import shard_for_user
+
+FTS_TABLE = "study_card_fts"
+
+# External-content FTS5 index over study_card kept in sync by triggers, so bulk_create,
+# queryset updates and cascading deletes are covered as well
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        front_text, back_text, content='study_card', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON study_card BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, front_text, back_text) VALUES (new.id, new.front_text, new.back_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON study_card BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, front_text, back_text) VALUES ('delete', old.id, old.front_text, old.back_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF front_text, back_text ON study_card BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, front_text, back_text) VALUES ('delete', old.id, old.front_text, old.back_text);
+        INSERT INTO {FTS_TABLE}(rowid, front_text, back_text) VALUES (new.id, new.front_text, new.back_text);
+    END""",
+]
+FTS_TRIGGERS = {f"{FTS_TABLE}_ai", f"{FTS_TABLE}_ad", f"{FTS_TABLE}_au"}
+
+
+def install_fts(conn) -> bool:
+    """Create the FTS table and triggers where missing; returns True if the index had to be rebuilt.
+
+    SQLite drops a table's triggers when Django remakes the table in a migration, so this also
+    runs after every migrate.
+    """
+    if conn.vendor != "sqlite":
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s", [f"{FTS_TABLE}%"]
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if FTS_TABLE in existing and FTS_TRIGGERS <= existing:
+            return False
+        for statement in FTS_SCHEMA:
+            cursor.execute(statement)
+    rebuild_fts(conn)
+    return True
+
+
+def rebuild_fts(conn=None) -> None:
+    conn = conn or connection
+    if conn.vendor != "sqlite":
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix."""
+    terms = ['"' + word.replace('"', '""') + '"' for word in text.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_backend(using: str = "default") -> str:
+    backend = getattr(settings, "SRS_SEARCH_BACKEND", "auto")
+    if backend != "auto":
+        return backend
+    vendor = connections[using].vendor
+    return {"sqlite": "fts", "postgresql": "trigram"}.get(vendor, "like")
+
+
+def search_cards(user_id: int, text: str, limit: int = 50, backend: str | None = None) -> list[Card]:
+    """The user's cards matching ``text``, best match first."""
+    text = text.strip()
+    if not text:
+        return []
+    using = shard_for_user(user_id)
+    backend = backend or search_backend(using)
+    cards = Card.objects.using(using).filter(user_id=user_id).select_related("deck")
+
+    if backend == "fts":
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"""SELECT c.id FROM {FTS_TABLE} JOIN study_card c ON c.id = {FTS_TABLE}.rowid
+                WHERE {FTS_TABLE} MATCH %s AND c.user_id = %s
+                ORDER BY bm25({FTS_TABLE}, 2.0, 1.0) LIMIT %s""",
+                [fts_query(text), user_id, limit],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        by_id = cards.in_bulk(ids)
+        return [by_id[pk] for pk in ids if pk in by_id]
+
+    if backend == "trigram":
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        return list(
+            cards.annotate(rank=Greatest(TrigramSimilarity("front_text", text), TrigramSimilarity("back_text", text)))
+            .filter(rank__gt=0.1)
+            .order_by("-rank", "id")[:limit]
+        )
+
+    # Front-text hits rank above back-text hits
+    return list(
+        cards.filter(Q(front_text__icontains=text) | Q(back_text__icontains=text))
+        .annotate(rank=Case(When(front_text__icontains=text, then=Value(0)), default=Value(1)))
+        .order_by("rank", "next_review_at", "id")[:limit]
+    )
@@ -1,7 +1,38 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .caching import bump_user_version
+from .models import ArchivedReview, Card, Review, UserSchedulerParams
+from .review_queue import VERSION_NAMESPACE as REVIEW_QUEUE_NAMESPACE, adjust_due_count
+from .sharding import user_shard
+
+
+@dataclass(frozen=True)
+class Sm2Params:
+    """SM-2 constants; ``fit_scheduler_params`` fits them per user from the review log."""
+
+    ef_bonus: float = 0.1
+    ef_linear: float = 0.08
+    ef_quadratic: float = 0.02
+    ef_floor: float = 1.3
+    first_interval: int = 1
+    second_interval: int = 6
+
+
+DEFAULT_PARAMS = Sm2Params()
+PARAM_FIELDS = tuple(Sm2Params.__dataclass_fields__)
+
+
+def get_sm2_params(user_id: int) -> Sm2Params:
+    row = UserSchedulerParams.objects.filter(user_id=user_id).values(*PARAM_FIELDS).first()
+    return Sm2Params(**row) if row else DEFAULT_PARAMS
 
 
 @dataclass(frozen=True)
@@ -12,6 +43,25 @@ class Sm2Result:
     next_review_at: date
 
 
+@dataclass(frozen=True)
+class Sm2BatchResult:
+    repetitions: np.ndarray
+    interval_days: np.ndarray
+    ease_factor: np.ndarray
+    next_review_at: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.repetitions)
+
+    def __getitem__(self, i: int) -> Sm2Result:
+        return Sm2Result(
+            repetitions=int(self.repetitions[i]),
+            interval_days=int(self.interval_days[i]),
+            ease_factor=float(self.ease_factor[i]),
+            next_review_at=self.next_review_at[i].astype(date),
+        )
+
+
 def sm2_calculate(
     *,
     quality: int,
@@ -19,27 +69,252 @@ def sm2_calculate(
     interval_days: int,
     ease_factor: float,
     review_date: date,
+    params: Sm2Params = DEFAULT_PARAMS,
 ) -> Sm2Result:
     if quality < 0 or quality > 5:
         raise ValueError("quality must be in range 0..5")
 
     # Update ease factor
     q = quality
-    ef = ease_factor + (0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))
-    if ef < 1.3:
-        ef = 1.3
+    p = params
+    ef = ease_factor + (p.ef_bonus - (5 - q) * (p.ef_linear + (5 - q) * p.ef_quadratic))
+    if ef < p.ef_floor:
+        ef = p.ef_floor
 
     if quality < 3:
         reps = 0
-        interval = 1
+        interval = p.first_interval
     else:
         reps = repetitions + 1
         if reps == 1:
-            interval = 1
+            interval = p.first_interval
         elif reps == 2:
-            interval = 6
+            interval = p.second_interval
         else:
-            interval = int(round(interval_days * ef)) if interval_days > 0 else 6
+            interval = int(round(interval_days * ef)) if interval_days > 0 else p.second_interval
 
     next_date = review_date + timedelta(days=interval)
     return Sm2Result(repetitions=reps, interval_days=interval, ease_factor=ef, next_review_at=next_date)
+
+
+def sm2_calculate_batch(
+    *,
+    quality,
+    repetitions,
+    interval_days,
+    ease_factor,
+    review_date,
+    params: Sm2Params = DEFAULT_PARAMS,
+) -> Sm2BatchResult:
+    """Vectorized ``sm2_calculate`` over column arrays; scalars are broadcast to the batch."""
+    q = np.asarray(quality, dtype=np.int64)
+    if q.size and (q.min() < 0 or q.max() > 5):
+        raise ValueError("quality must be in range 0..5")
+
+    reps_in = np.asarray(repetitions, dtype=np.int64)
+    interval_in = np.asarray(interval_days, dtype=np.int64)
+    ef_in = np.asarray(ease_factor, dtype=np.float64)
+    q, reps_in, interval_in, ef_in = np.broadcast_arrays(q, reps_in, interval_in, ef_in)
+
+    # Same operation order as the scalar path so float results are bit-identical
+    p = params
+    d = 5 - q
+    ef = ef_in + (p.ef_bonus - d * (p.ef_linear + d * p.ef_quadratic))
+    ef = np.maximum(ef, p.ef_floor)
+
+    passed = q >= 3
+    reps = np.where(passed, reps_in + 1, 0)
+
+    # np.rint rounds half to even, matching Python's round()
+    grown = np.where(interval_in > 0, np.rint(interval_in * ef).astype(np.int64), p.second_interval)
+    interval = np.select([~passed | (reps == 1), reps == 2], [p.first_interval, p.second_interval], grown)
+
+    dates = np.asarray(review_date, dtype="datetime64[D]")
+    next_dates = dates + interval.astype("timedelta64[D]")
+
+    return Sm2BatchResult(
+        repetitions=reps,
+        interval_days=interval,
+        ease_factor=ef,
+        next_review_at=next_dates,
+    )
+
+
+def review_matrix(card_ids, days, qualities):
+    """Pad per-card histories into (cards, longest history) arrays plus a validity mask.
+
+    Input rows must be sorted by card, then by review time.
+    """
+    card_ids = np.asarray(card_ids, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    qualities = np.asarray(qualities, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, card_ids[1:] != card_ids[:-1]]) if len(card_ids) else np.array([], dtype=np.int64)
+    lengths = np.diff(np.r_[starts, len(card_ids)])
+    width = int(lengths.max()) if len(lengths) else 0
+
+    row = np.repeat(np.arange(len(starts)), lengths)
+    col = np.arange(len(card_ids)) - np.repeat(starts, lengths)
+    q = np.zeros((len(starts), width), dtype=np.int64)
+    d = np.zeros((len(starts), width), dtype=np.int64)
+    mask = np.zeros((len(starts), width), dtype=bool)
+    q[row, col] = qualities
+    d[row, col] = days
+    mask[row, col] = True
+    return q, d, mask
+
+
+def replay_schedule(card_ids, days, qualities, params: Sm2Params = DEFAULT_PARAMS):
+    """Schedule state after replaying each card's review log from a new card.
+
+    Rows are sorted by card id, then by review time, with ``days`` as local dates (datetime64[D]).
+    Returns the sorted card ids and an Sm2BatchResult aligned with them.
+    """
+    dates = np.asarray(days, dtype="datetime64[D]")
+    q, d, mask = review_matrix(card_ids, dates.astype(np.int64), qualities)
+    cards = np.unique(np.asarray(card_ids, dtype=np.int64))
+
+    reps = np.zeros(len(cards), dtype=np.int64)
+    interval = np.zeros(len(cards), dtype=np.int64)
+    ef = np.full(len(cards), Card._meta.get_field("ease_factor").default)
+    next_dates = np.zeros(len(cards), dtype="datetime64[D]")
+    for k in range(q.shape[1]):
+        valid = mask[:, k]
+        res = sm2_calculate_batch(
+            quality=q[:, k],
+            repetitions=reps,
+            interval_days=interval,
+            ease_factor=ef,
+            review_date=d[:, k].astype("datetime64[D]"),
+            params=params,
+        )
+        reps = np.where(valid, res.repetitions, reps)
+        interval = np.where(valid, res.interval_days, interval)
+        ef = np.where(valid, res.ease_factor, ef)
+        next_dates = np.where(valid, res.next_review_at, next_dates)
+    return cards, Sm2BatchResult(repetitions=reps, interval_days=interval, ease_factor=ef, next_review_at=next_dates)
+
+
+class StaleGrade(Exception):
+    """The card was graded or rescheduled after the grade's version was read."""
+
+
+def grade_card(user, card_id: int, quality: int, expected_version: int | None = None) -> Sm2Result:
+    """Grade one card: a compare-and-swap UPDATE on Card.version and the Review insert in one transaction.
+
+    Raises Card.DoesNotExist for cards the user does not own and StaleGrade when the card no longer
+    has ``expected_version``, so a double submit is applied once. Views always pass the version the
+    user was shown; ``None`` is for internal callers and only guards against writes racing this one.
+    """
+    today = timezone.localdate()
+    with user_shard(user.id) as using:
+        # Read outside the transaction: on SQLite a read lock held into the UPDATE could not be upgraded
+        card = Card.objects.only("id", "is_active", "version", *SCHEDULE_FIELDS).get(pk=card_id, user=user)
+        if expected_version is not None and card.version != expected_version:
+            raise StaleGrade(card_id)
+        res = sm2_calculate(
+            quality=quality,
+            repetitions=card.repetitions,
+            interval_days=card.interval_days,
+            ease_factor=card.ease_factor,
+            review_date=today,
+            params=get_sm2_params(user.id),
+        )
+        with transaction.atomic(using=using):
+            swapped = Card.objects.filter(pk=card.pk, version=card.version).update(
+                repetitions=res.repetitions,
+                interval_days=res.interval_days,
+                ease_factor=res.ease_factor,
+                next_review_at=res.next_review_at,
+                version=F("version") + 1,
+            )
+            if not swapped:
+                raise StaleGrade(card_id)
+            Review.objects.create(
+                user=user,
+                card=card,
+                quality=quality,
+                repetitions=res.repetitions,
+                interval_days=res.interval_days,
+                ease_factor=res.ease_factor,
+                next_review_at=res.next_review_at,
+            )
+
+    was_due = card.is_active and card.next_review_at <= today
+    adjust_due_count(user.id, (card.is_active and res.next_review_at <= today) - was_due)
+    return res
+
+
+@dataclass(frozen=True)
+class ReviewSubmission:
+    card_id: int
+    quality: int
+    reviewed_at: datetime
+
+
+SCHEDULE_FIELDS = ["repetitions", "interval_days", "ease_factor", "next_review_at"]
+
+
+def apply_reviews(user, submissions: list[ReviewSubmission]) -> list[Sm2Result | StaleGrade | None]:
+    """Grade many cards in one transaction; returns ``None`` for cards the user does not own.
+
+    Submissions older than the card's latest logged review would rewrite a schedule that later
+    reviews were based on; they get a StaleGrade instead of a result and are not written.
+    """
+    card_ids = {s.card_id for s in submissions}
+    results: list[Sm2Result | None] = [None] * len(submissions)
+    reviews = []
+
+    with user_shard(user.id) as using, transaction.atomic(using=using):
+        params = get_sm2_params(user.id)
+        cards = Card.objects.select_for_update().filter(user=user, pk__in=card_ids).only("id", *SCHEDULE_FIELDS).order_by().in_bulk()
+        latest = {}
+        for model in (ArchivedReview, Review):
+            rows = model.objects.filter(card_id__in=list(cards)).order_by().values("card_id")
+            for row in rows.annotate(last=Max("reviewed_at")):
+                latest[row["card_id"]] = max(row["last"], latest.get(row["card_id"], row["last"]))
+
+        order = sorted(range(len(submissions)), key=lambda i: submissions[i].reviewed_at)
+        for i in order:
+            sub = submissions[i]
+            card = cards.get(sub.card_id)
+            if card is None:
+                continue
+            if sub.card_id in latest and sub.reviewed_at < latest[sub.card_id]:
+                results[i] = StaleGrade(sub.card_id)
+                continue
+
+            res = sm2_calculate(
+                quality=sub.quality,
+                repetitions=card.repetitions,
+                interval_days=card.interval_days,
+                ease_factor=card.ease_factor,
+                review_date=timezone.localdate(sub.reviewed_at),
+                params=params,
+            )
+            card.repetitions = res.repetitions
+            card.interval_days = res.interval_days
+            card.ease_factor = res.ease_factor
+            card.next_review_at = res.next_review_at
+            card.version = F("version") + 1
+            results[i] = res
+
+            reviews.append(
+                Review(
+                    user=user,
+                    card=card,
+                    reviewed_at=sub.reviewed_at,
+                    quality=sub.quality,
+                    repetitions=res.repetitions,
+                    interval_days=res.interval_days,
+                    ease_factor=res.ease_factor,
+                    next_review_at=res.next_review_at,
+                )
+            )
+
+        graded = {r.card_id for r in reviews}
+        Card.objects.bulk_update([cards[pk] for pk in graded], [*SCHEDULE_FIELDS, "version"])
+        Review.objects.bulk_create(reviews)
+
+    # Graded cards may still sit in a session review batch
+    bump_user_version(REVIEW_QUEUE_NAMESPACE, user.id)
+    return results
@@ -0,0 +1,209 @@
+import contextvars
+from contextlib import contextmanager
+from itertools import islice
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+# Tables of the study app that stay on the default database next to auth_user
+CENTRAL_MODELS = {"usershard", "demoseedrequest"}
+
+# Scope of the user whose shard serves queries that carry no instance hint
+_scope = contextvars.ContextVar("srs_shard_scope", default=None)
+
+
+def shard_aliases() -> list[str]:
+    return list(getattr(settings, "SRS_SHARDS", None) or [DEFAULT_DB_ALIAS])
+
+
+def place_user(user_id: int) -> str:
+    """Shard for a newly created user."""
+    aliases = shard_aliases()
+    return aliases[user_id % len(aliases)]
+
+
+def shard_for_user(user_id: int) -> str:
+    """The user's shard, read from UserShard on every call.
+
+    Not cached across requests: move_user runs in its own process and every web worker must
+    see the switch at once. Requests resolve it once through their _Scope.
+    """
+    aliases = shard_aliases()
+    if len(aliases) == 1:
+        return aliases[0]
+    from .models import UserShard
+
+    # Users created before sharding was enabled have no row and stay on the default database
+    return UserShard.objects.filter(user_id=user_id).values_list("alias", flat=True).first() or DEFAULT_DB_ALIAS
+
+
+class _Scope:
+    def __init__(self, get_user_id):
+        self.get_user_id = get_user_id
+        self.alias = None
+
+    def resolve(self) -> str:
+        if self.alias is None:
+            user_id = self.get_user_id()
+            if user_id is None:
+                return DEFAULT_DB_ALIAS
+            self.alias = shard_for_user(user_id)
+        return self.alias
+
+
+def current_shard() -> str:
+    aliases = shard_aliases()
+    if len(aliases) == 1:
+        return aliases[0]
+    scope = _scope.get()
+    return scope.resolve() if scope is not None else DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def user_shard(user_id: int):
+    """Route unhinted study queries to ``user_id``'s shard; yields the alias for atomic()."""
+    token = _scope.set(_Scope(lambda: user_id))
+    try:
+        yield current_shard()
+    finally:
+        _scope.reset(token)
+
+
+class ShardMiddleware:
+    """Route a request's study queries to the signed-in user's shard."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Resolved lazily so requests that never touch study tables skip the lookup
+        token = _scope.set(_Scope(lambda: request.user.pk))
+        try:
+            return self.get_response(request)
+        finally:
+            _scope.reset(token)
+
+    async def __acall__(self, request):
+        # The router runs inside sync_to_async, where loading request.user is allowed
+        token = _scope.set(_Scope(lambda: request.user.pk))
+        try:
+            return await self.get_response(request)
+        finally:
+            _scope.reset(token)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _copy_rows(qs, target, remap=None, chunk_size=1000, **bulk_kwargs) -> dict:
+    """Insert copies of ``qs`` on ``target`` under fresh ids; returns {old id: new id}."""
+    manager = qs.model._default_manager.db_manager(target)
+    ids = {}
+    for chunk in _chunks(qs.order_by("pk").iterator(chunk_size=chunk_size), chunk_size):
+        old_ids = [obj.pk for obj in chunk]
+        for obj in chunk:
+            obj.pk = None
+            obj._state.adding = True
+            for field, mapping in (remap or {}).items():
+                setattr(obj, field, mapping[getattr(obj, field)])
+        manager.bulk_create(chunk, **bulk_kwargs)
+        ids.update(zip(old_ids, (obj.pk for obj in chunk)))
+    return ids
+
+
+def delete_user_data(user_id: int, alias: str) -> None:
+    from .models import ArchivedReview, DailyReviewStat, Deck, Review, Tag, UserSchedulerParams
+    from .stats import deletes_unrecorded
+
+    # The user's rollups are deleted with everything else
+    with transaction.atomic(using=alias), deletes_unrecorded():
+        # Cards, their reviews and tag links go with the decks
+        Deck.objects.using(alias).filter(user_id=user_id).delete()
+        Review.objects.using(alias).filter(user_id=user_id).delete()
+        ArchivedReview.objects.using(alias).filter(user_id=user_id).delete()
+        Tag.objects.using(alias).filter(user_id=user_id).delete()
+        DailyReviewStat.objects.using(alias).filter(user_id=user_id).delete()
+        UserSchedulerParams.objects.using(alias).filter(user_id=user_id).delete()
+
+
+def move_user(user_id: int, target: str, chunk_size: int = 1000) -> dict:
+    """Copy a user's study data to ``target``, switch the user over and delete the old rows.
+
+    Rows get new ids on the target because every shard numbers its rows independently.
+    The user should not be writing during the move; a move interrupted before the switch
+    leaves the user on the source and is simply run again.
+    """
+    from .archive import LOG_FIELDS, archive_rows
+    from .caching import bump_user_version
+    from .models import ArchivedReview, Card, DailyReviewStat, Deck, Review, Tag, UserSchedulerParams, UserShard
+    from .review_queue import VERSION_NAMESPACE as REVIEW_QUEUE_NAMESPACE
+
+    if target not in shard_aliases():
+        raise ValueError(f"{target!r} is not in SRS_SHARDS")
+    source = shard_for_user(user_id)
+    if source == target:
+        return {}
+
+    delete_user_data(user_id, target)
+    counts = {}
+    with transaction.atomic(using=target):
+        decks = _copy_rows(Deck.objects.using(source).filter(user_id=user_id), target, chunk_size=chunk_size)
+        tags = _copy_rows(Tag.objects.using(source).filter(user_id=user_id), target, chunk_size=chunk_size)
+        cards = _copy_rows(
+            Card.objects.using(source).filter(user_id=user_id), target, {"deck_id": decks}, chunk_size=chunk_size
+        )
+        links = _copy_rows(
+            Card.tags.through.objects.using(source).filter(card__user_id=user_id),
+            target,
+            {"card_id": cards, "tag_id": tags},
+            chunk_size=chunk_size,
+        )
+        # Card totals and daily rollups are copied as they are, so the reviews are not recounted
+        reviews = _copy_rows(
+            Review.objects.using(source).filter(user_id=user_id),
+            target,
+            {"card_id": cards},
+            chunk_size=chunk_size,
+            record_stats=False,
+        )
+        # Archived reviews take their new ids from the target's Review table, which never hands an id out twice,
+        # and go straight on to its archive; the placeholder schedule is dropped with the hot rows
+        fields = [f for f in LOG_FIELDS if f != "id"]
+        archived = ArchivedReview.objects.using(source).filter(user_id=user_id).order_by("pk").values_list(*fields)
+        rearchived = 0
+        for chunk in _chunks(archived.iterator(chunk_size=chunk_size), chunk_size):
+            rows = [Review(**dict(zip(fields, row))) for row in chunk]
+            for review in rows:
+                review.card_id = cards[review.card_id]
+                review.interval_days = review.repetitions = review.ease_factor = 0
+                review.next_review_at = review.reviewed_at.date()
+            rows = Review.objects.using(target).bulk_create(rows, record_stats=False)
+            archive_rows([[getattr(review, f) for f in LOG_FIELDS] for review in rows], target)
+            rearchived += len(rows)
+        days = _copy_rows(DailyReviewStat.objects.using(source).filter(user_id=user_id), target, chunk_size=chunk_size)
+        # Fitted constants stay in use; review ids changed, so the next fit_scheduler_params run refits
+        params = UserSchedulerParams.objects.using(source).filter(user_id=user_id).first()
+        if params is not None:
+            params.last_review_id = 0
+            params.save(using=target, force_insert=True)
+        counts = {
+            "decks": len(decks), "tags": len(tags), "cards": len(cards),
+            "card_tags": len(links), "reviews": len(reviews) + rearchived, "daily_stats": len(days),
+        }
+
+    UserShard.objects.update_or_create(user_id=user_id, defaults={"alias": target, "moved_at": timezone.now()})
+    delete_user_data(user_id, source)
+    bump_user_version(REVIEW_QUEUE_NAMESPACE, user_id)
+    return counts
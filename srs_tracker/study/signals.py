@@ -1,91 +1,105 @@
-from django.db.models.signals import post_save
+import contextvars
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import Deck, Card
+from django.contrib.auth.signals import user_logged_in
+from .caching import bump_user_version
+from .demo import seed_demo_decks, seed_pending_demo_decks
+from .models import ArchivedReview, Deck, Card, Review, DemoSeedRequest, UserShard
+from .review_queue import VERSION_NAMESPACE as REVIEW_QUEUE_NAMESPACE
+from .routers import pin_primary
+from .search import install_fts
+from .sharding import delete_user_data, place_user, shard_aliases, shard_for_user
+from .stats import forget_reviews, record_reviews, recording_deletes
 
 User = get_user_model()
 
+# Reviews removed by the delete in progress, as (origin, reviews); the collector sends every pre_delete
+# before it deletes anything, so the first review post_delete of that delete sees the whole cascade
+_cascaded_reviews = contextvars.ContextVar("srs_cascaded_reviews", default=None)
+
+
+@receiver(post_save, sender=Card)
+@receiver(post_delete, sender=Card)
+def invalidate_review_queue(sender, instance, **kwargs):
+    # Every save can move the card in or out of today's queue, schedule-only saves included;
+    # grading writes with .update() and adjusts the due count itself
+    pin_primary(instance.user_id)
+    bump_user_version(REVIEW_QUEUE_NAMESPACE, instance.user_id)
+
+
+@receiver(post_save, sender=Review)
+def record_review_stats(sender, instance, created, raw=False, **kwargs):
+    # Review.objects.bulk_create records its own batch
+    if created and not raw:
+        record_reviews([instance])
+
+
+@receiver(pre_delete, sender=Review)
+@receiver(pre_delete, sender=ArchivedReview)
+def collect_deleted_reviews(sender, instance, origin=None, **kwargs):
+    # Cascades from card, deck and user deletes; Review.objects...delete() handles its own batch
+    if not recording_deletes():
+        return
+    pending = _cascaded_reviews.get()
+    if pending is None or pending[0] is not origin:
+        pending = (origin, [])
+        _cascaded_reviews.set(pending)
+    pending[1].append(instance)
+
+
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=ArchivedReview)
+def forget_review_stats(sender, instance, origin=None, **kwargs):
+    pending = _cascaded_reviews.get()
+    if pending is not None and pending[0] is origin:
+        _cascaded_reviews.set(None)
+        forget_reviews(pending[1])
+
+
+@receiver(post_save, sender=Deck)
+def invalidate_review_queue_on_deck(sender, instance, **kwargs):
+    pin_primary(instance.user_id)
+    bump_user_version(REVIEW_QUEUE_NAMESPACE, instance.user_id)
+
+
 @receiver(post_save, sender=User)
-def create_demo_decks(sender, instance, created, **kwargs):
-    if created and not instance.is_superuser:
-        # 3 демо-колоды
-        decks_data = [
-            {
-                "title": "Английский язык",
-                "description": "Базовая лексика и фразы",
-                "cards": [
-                    ("What is the capital of France?", "Paris"),
-                    ("What is 2 + 2?", "4"),
-                    ("What is the largest planet?", "Jupiter"),
-                    ("What is H2O?", "Water"),
-                    ("Who wrote Romeo and Juliet?", "Shakespeare"),
-                    ("What is the capital of Japan?", "Tokyo"),
-                    ("How many continents?", "7"),
-                    ("What is the largest ocean?", "Pacific"),
-                    ("How many bones in human body?", "206"),
-                    ("What is the freezing point of water?", "0°C"),
-                    ("Who painted Mona Lisa?", "Leonardo da Vinci"),
-                    ("What is the currency of Japan?", "Yen"),
-                    ("What year did WW2 end?", "1945"),
-                    ("What is the smallest country?", "Vatican City"),
-                    ("What is the speed of light?", "299,792,458 m/s"),
-                ]
-            },
-            {
-                "title": "История",
-                "description": "Исторические события и даты",
-                "cards": [
-                    ("Когда началась Вторая мировая война?", "1939"),
-                    ("Кто был первым президентом США?", "Джордж Вашингтон"),
-                    ("В каком году была Французская революция?", "1789"),
-                    ("Кто написал Декларацию независимости?", "Томас Джефферсон"),
-                    ("Когда произошла Октябрьская революция?", "1917"),
-                    ("Кто был Наполеон?", "Французский полководец и император"),
-                    ("Когда пал Берлинский стена?", "1989"),
-                    ("Когда был основан Рим?", "753 год до н.э."),
-                    ("Кто был Юлий Цезарь?", "Римский полководец и политик"),
-                    ("Когда началась Холодная война?", "1947"),
-                    ("Кто был Авраам Линкольн?", "16-й президент США"),
-                    ("Когда произошел взрыв на Чернобыле?", "1986"),
-                    ("Кто открыл Америку?", "Христофор Колумб"),
-                    ("Когда была Великая депрессия?", "1929"),
-                    ("Кто был Владимир Ленин?", "Лидер Октябрьской революции"),
-                ]
-            },
-            {
-                "title": "Математика",
-                "description": "Базовые математические понятия",
-                "cards": [
-                    ("Чему равно π?", "≈ 3.14159"),
-                    ("Что такое квадратный корень из 16?", "4"),
-                    ("Чему равно 2^8?", "256"),
-                    ("Что такое производная?", "Скорость изменения функции"),
-                    ("Чему равна сумма углов треугольника?", "180°"),
-                    ("Что такое логарифм?", "Обратная функция к экспоненте"),
-                    ("Чему равно 0.5 + 0.3?", "0.8"),
-                    ("Что такое факториал 5?", "120"),
-                    ("Чему равен косинус 0?", "1"),
-                    ("Что такое пифагорейская тройка?", "3, 4, 5"),
-                    ("Чему равна площадь круга?", "π * r²"),
-                    ("Что такое бесконечность?", "Понятие без предела"),
-                    ("Чему равно 10%?", "0.1 или 1/10"),
-                    ("Что такое медиана?", "Средний элемент в упорядоченном списке"),
-                    ("Чему равна вероятность?", "Число от 0 до 1"),
-                ]
-            },
-        ]
-
-        for deck_data in decks_data:
-            deck = Deck.objects.create(
-                user=instance,
-                title=deck_data["title"],
-                description=deck_data["description"]
-            )
-            
-            for front, back in deck_data["cards"]:
-                Card.objects.create(
-                    deck=deck,
-                    front_text=front,
-                    back_text=back,
-                    is_active=True
-                )
+def assign_user_shard(sender, instance, created, raw=False, **kwargs):
+    # Connected before create_demo_decks, which already writes to the shard
+    if created and not raw and len(shard_aliases()) > 1:
+        UserShard.objects.create(user=instance, alias=place_user(instance.pk))
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_user_data(sender, instance, **kwargs):
+    # The delete cascade only reaches rows on the user's own database
+    alias = shard_for_user(instance.pk)
+    if alias != instance._state.db:
+        delete_user_data(instance.pk, alias)
+
+
+
+@receiver(post_save, sender=User)
+def create_demo_decks(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and not instance.is_superuser:
+        mode = getattr(settings, "SRS_DEMO_DECKS_SEEDING", "signup")
+        if mode == "signup":
+            seed_demo_decks(instance)
+        elif mode in ("login", "command"):
+            DemoSeedRequest.objects.create(user=instance)
+
+
+@receiver(user_logged_in)
+def seed_demo_decks_on_first_login(sender, request, user, **kwargs):
+    if getattr(settings, "SRS_DEMO_DECKS_SEEDING", "signup") == "login":
+        seed_pending_demo_decks(user)
+
+
+@receiver(post_migrate)
+def ensure_card_search(sender, using, **kwargs):
+    # Remaking study_card in a later migration drops the FTS triggers
+    if sender.label == "study":
+        install_fts(connections[using])
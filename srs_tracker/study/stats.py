@@ -0,0 +1,211 @@
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from math import isclose
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from .caching import aget_user_version, bump_user_version, get_user_version
+from .models import ArchivedReview, Card, DailyReviewStat, Review
+from .review_queue import VERSION_NAMESPACE as REVIEW_QUEUE_NAMESPACE
+from .routers import pin_primary
+
+QUALITY_FIELDS = ["q0", "q1", "q2", "q3", "q4", "q5"]
+# Bumped for every user with new reviews, for caches of values that grading changes
+REVIEWS_NAMESPACE = "reviews"
+
+# Off while deleting reviews whose rollups go too (wiping a user) or stay valid (archiving)
+_record_deletes = contextvars.ContextVar("srs_record_review_deletes", default=True)
+
+
+def schedule_version(user_id: int) -> str:
+    """Changes whenever a user's due cards can: card and deck edits bump the review queue
+    version, grading bumps the reviews version. Read from the cache only."""
+    return f"{get_user_version(REVIEW_QUEUE_NAMESPACE, user_id)}.{get_user_version(REVIEWS_NAMESPACE, user_id)}"
+
+
+async def aschedule_version(user_id: int) -> str:
+    queue = await aget_user_version(REVIEW_QUEUE_NAMESPACE, user_id)
+    return f"{queue}.{await aget_user_version(REVIEWS_NAMESPACE, user_id)}"
+
+
+def _empty_counts() -> list[int]:
+    return [0] * 6
+
+
+def _tally(reviews):
+    per_day = defaultdict(_empty_counts)
+    per_card = defaultdict(lambda: [0, 0])
+    using = DEFAULT_DB_ALIAS
+    for review in reviews:
+        # Rollups and card totals live on the same shard as the reviews
+        using = review._state.db or using
+        per_day[review.user_id, timezone.localdate(review.reviewed_at)][review.quality] += 1
+        totals = per_card[review.card_id]
+        totals[0] += 1
+        totals[1] += review.quality
+
+    user_ids = {user_id for user_id, _ in per_day}
+    pin_primary(*user_ids)
+    for user_id in user_ids:
+        bump_user_version(REVIEWS_NAMESPACE, user_id)
+    return per_day, per_card, using
+
+
+def _by_increment(per_card) -> dict:
+    # Cards that received the same increment share one UPDATE
+    by_increment = defaultdict(list)
+    for card_id, (n, quality_sum) in per_card.items():
+        by_increment[n, quality_sum].append(card_id)
+    return by_increment
+
+
+def record_reviews(reviews) -> None:
+    """Fold freshly written reviews into the daily rollups and the per-card totals."""
+    per_day, per_card, using = _tally(reviews)
+    for (user_id, day), counts in per_day.items():
+        _add_to_day(user_id, day, counts, using)
+    for (n, quality_sum), card_ids in _by_increment(per_card).items():
+        Card.objects.using(using).filter(pk__in=card_ids).update(
+            review_count=F("review_count") + n,
+            quality_sum=F("quality_sum") + quality_sum,
+            avg_quality=(F("quality_sum") + quality_sum) * 1.0 / (F("review_count") + n),
+        )
+
+
+def recording_deletes() -> bool:
+    return _record_deletes.get()
+
+
+@contextmanager
+def deletes_unrecorded():
+    """Reviews deleted inside the block are left in the rollups and card totals."""
+    token = _record_deletes.set(False)
+    try:
+        yield
+    finally:
+        _record_deletes.reset(token)
+
+
+def forget_reviews(reviews) -> None:
+    """Take deleted reviews (hot or archived) back out of the daily rollups and the per-card totals."""
+    per_day, per_card, using = _tally(reviews)
+    for (user_id, day), counts in per_day.items():
+        decrements = {field: Greatest(F(field) - n, 0) for field, n in zip(QUALITY_FIELDS, counts) if n}
+        rows = DailyReviewStat.objects.using(using).filter(user_id=user_id, day=day)
+        rows.update(
+            review_count=Greatest(F("review_count") - sum(counts), 0),
+            quality_sum=Greatest(F("quality_sum") - sum(q * n for q, n in enumerate(counts)), 0),
+            **decrements,
+        )
+        # rebuild_daily_stats keeps no rows for days without reviews
+        rows.filter(review_count=0).delete()
+    # Totals that already drifted are clamped at zero rather than failing the delete
+    for (n, quality_sum), card_ids in _by_increment(per_card).items():
+        Card.objects.using(using).filter(pk__in=card_ids).update(
+            review_count=Greatest(F("review_count") - n, 0),
+            quality_sum=Greatest(F("quality_sum") - quality_sum, 0),
+            avg_quality=Case(
+                When(review_count__lte=n, then=Value(0.0)),
+                default=(F("quality_sum") - quality_sum) * 1.0 / (F("review_count") - n),
+            ),
+        )
+
+
+def _add_to_day(user_id: int, day, counts: list[int], using: str) -> None:
+    total = sum(counts)
+    quality_sum = sum(q * n for q, n in enumerate(counts))
+    increments = {field: F(field) + n for field, n in zip(QUALITY_FIELDS, counts) if n}
+    rows = DailyReviewStat.objects.using(using).filter(user_id=user_id, day=day)
+
+    if rows.update(review_count=F("review_count") + total, quality_sum=F("quality_sum") + quality_sum, **increments):
+        return
+    try:
+        with transaction.atomic(using=using):
+            DailyReviewStat.objects.using(using).create(
+                user_id=user_id,
+                day=day,
+                review_count=total,
+                quality_sum=quality_sum,
+                **dict(zip(QUALITY_FIELDS, counts)),
+            )
+    except IntegrityError:
+        # Another writer created the row first
+        rows.update(review_count=F("review_count") + total, quality_sum=F("quality_sum") + quality_sum, **increments)
+
+
+def rebuild_daily_stats(user_ids=None, batch_size: int = 1000, using: str = DEFAULT_DB_ALIAS) -> int:
+    stats = DailyReviewStat.objects.using(using)
+    if user_ids is not None:
+        stats = stats.filter(user_id__in=user_ids)
+
+    per_day = defaultdict(_empty_counts)
+    # Rollups cover archived reviews too
+    for model in (Review, ArchivedReview):
+        reviews = model.objects.using(using)
+        if user_ids is not None:
+            reviews = reviews.filter(user_id__in=user_ids)
+        grouped = (
+            reviews.annotate(day=TruncDate("reviewed_at"))
+            .values("user_id", "day", "quality")
+            .annotate(n=Count("id"))
+            .order_by()
+        )
+        for row in grouped.iterator(chunk_size=batch_size):
+            per_day[row["user_id"], row["day"]][row["quality"]] += row["n"]
+
+    rows = [
+        DailyReviewStat(
+            user_id=user_id,
+            day=day,
+            review_count=sum(counts),
+            quality_sum=sum(q * n for q, n in enumerate(counts)),
+            **dict(zip(QUALITY_FIELDS, counts)),
+        )
+        for (user_id, day), counts in per_day.items()
+    ]
+    with transaction.atomic(using=using):
+        stats.delete()
+        DailyReviewStat.objects.using(using).bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def average_quality(review_count: int, quality_sum: int) -> float:
+    return quality_sum / review_count if review_count else 0.0
+
+
+def card_stats_mismatches(batch_size: int = 2000, using: str = DEFAULT_DB_ALIAS):
+    """Yield ``(card, review_count, quality_sum)`` for cards whose totals or average disagree with the log."""
+    last_id = 0
+    while True:
+        cards = list(
+            Card.objects.using(using)
+            .filter(pk__gt=last_id)
+            .order_by("pk")
+            .only("id", "review_count", "quality_sum", "avg_quality")[:batch_size]
+        )
+        if not cards:
+            return
+        last_id = cards[-1].pk
+
+        logged = defaultdict(lambda: [0, 0])
+        for model in (Review, ArchivedReview):
+            grouped = (
+                model.objects.using(using)
+                .filter(card_id__in=[c.pk for c in cards])
+                .values("card_id")
+                .annotate(n=Count("id"), s=Sum("quality"))
+                .order_by()
+            )
+            for row in grouped:
+                logged[row["card_id"]][0] += row["n"]
+                logged[row["card_id"]][1] += row["s"]
+        for card in cards:
+            n, quality_sum = logged.get(card.pk, (0, 0))
+            if (card.review_count, card.quality_sum) != (n, quality_sum) or not isclose(
+                card.avg_quality, average_quality(n, quality_sum), abs_tol=1e-9
+            ):
+                yield card, n, quality_sum
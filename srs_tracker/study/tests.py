@@ -1,3 +1,1295 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+import threading
+from datetime import date, timedelta
+from io import StringIO
+from itertools import product
+from unittest.mock import patch
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import F
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .analytics import aget_analytics_context, analytics_cache_stats, get_analytics_context, get_cache as get_analytics_cache
+from .archive import LOG_FIELDS, archive_cutoff
+from .exporters import export, iter_rows
+from .forecast import load_card_columns, simulate_due_counts
+from .importers import CardRow, import_cards, parse_csv, parse_json, parse_tsv
+from .management.commands.reschedule_cards import Command as RescheduleCommand
+from .metrics import registry as metrics_registry
+from .models import ArchivedReview, Card, DailyReviewStat, Deck, DemoSeedRequest, Review, Tag, UserSchedulerParams, UserShard
+from .routers import read_alias
+from .search import search_cards
+from .sharding import move_user, shard_for_user, user_shard
+from .services import ReviewSubmission, Sm2Params, StaleGrade, apply_reviews, grade_card, sm2_calculate, sm2_calculate_batch
+from .stats import QUALITY_FIELDS, card_stats_mismatches, rebuild_daily_stats
+from .tuning import TARGET_RECALL, fit_params
+
+User = get_user_model()
+
+
+class Sm2BatchTests(SimpleTestCase):
+    def test_matches_scalar(self):
+        start = date(2024, 1, 1)
+        grid = list(product(range(6), range(5), [0, 1, 6, 15, 37], [1.3, 1.36, 2.0, 2.5, 2.9]))
+        dates = [start + timedelta(days=i % 7) for i in range(len(grid))]
+        q, reps, interval, ef = (list(col) for col in zip(*grid))
+
+        batch = sm2_calculate_batch(
+            quality=q,
+            repetitions=reps,
+            interval_days=interval,
+            ease_factor=ef,
+            review_date=np.array(dates, dtype="datetime64[D]"),
+        )
+
+        for i, (args, d) in enumerate(zip(grid, dates)):
+            expected = sm2_calculate(
+                quality=args[0], repetitions=args[1], interval_days=args[2], ease_factor=args[3], review_date=d
+            )
+            self.assertEqual(batch[i], expected)
+
+    def test_custom_params_match_scalar(self):
+        params = Sm2Params(ef_bonus=0.15, ef_linear=0.05, ef_quadratic=0.01, ef_floor=1.5, first_interval=2, second_interval=4)
+        grid = list(product(range(6), range(4), [0, 2, 9], [1.5, 2.5]))
+        q, reps, interval, ef = (list(col) for col in zip(*grid))
+        batch = sm2_calculate_batch(
+            quality=q, repetitions=reps, interval_days=interval, ease_factor=ef, review_date=date(2024, 1, 1), params=params
+        )
+        for i, args in enumerate(grid):
+            expected = sm2_calculate(
+                quality=args[0], repetitions=args[1], interval_days=args[2], ease_factor=args[3],
+                review_date=date(2024, 1, 1), params=params,
+            )
+            self.assertEqual(batch[i], expected)
+
+    def test_rejects_invalid_quality(self):
+        with self.assertRaises(ValueError):
+            sm2_calculate_batch(quality=[3, 6], repetitions=0, interval_days=0, ease_factor=2.5, review_date=date.today())
+
+
+class CardOwnerTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user("alice", is_superuser=True)
+        self.bob = User.objects.create_user("bob", is_superuser=True)
+        self.deck = Deck.objects.create(user=self.alice, title="A")
+
+    def test_owner_follows_deck(self):
+        card = Card.objects.create(deck=self.deck, front_text="q", back_text="a")
+        self.assertEqual(card.user_id, self.alice.id)
+
+        other = Deck.objects.create(user=self.bob, title="B")
+        card.deck = other
+        card.save(update_fields=["deck"])
+        card.refresh_from_db()
+        self.assertEqual(card.user_id, self.bob.id)
+
+        other.user = self.alice
+        other.save()
+        card.refresh_from_db()
+        self.assertEqual(card.user_id, self.alice.id)
+
+    def test_due_queue_uses_composite_index(self):
+        today = timezone.localdate()
+        due = Card.objects.filter(user=self.alice, is_active=True, next_review_at__lte=today)
+
+        queue_plan = due.select_related("deck").order_by("next_review_at", "id").explain()
+        self.assertIn("USING INDEX card_due_queue_idx", queue_plan)
+        self.assertNotIn("TEMP B-TREE", queue_plan)
+
+        # COUNT(*) only needs the index itself
+        count_plan = due.order_by().values("id").explain()
+        self.assertIn("USING COVERING INDEX card_due_queue_idx", count_plan)
+
+
+class ReviewQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", is_superuser=True)
+        self.deck = Deck.objects.create(user=self.user, title="A")
+        self.cards = [Card.objects.create(deck=self.deck, front_text=f"q{i}", back_text=f"a{i}") for i in range(3)]
+        self.client.force_login(self.user)
+
+    def grade(self, card, quality=4):
+        return self.client.post(reverse("review_today"), {"card_id": card.id, "quality": quality, "version": card.version})
+
+    def test_session_serves_batch_without_queue_queries(self):
+        response = self.client.get(reverse("review_today"))
+        self.assertEqual(response.context["card"]["id"], self.cards[0].id)
+        self.assertEqual(response.context["due_count"], 3)
+
+        self.grade(self.cards[0])
+        # session + user lookups only: the queue is served from the session
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("review_today"))
+        self.assertEqual(response.context["card"]["id"], self.cards[1].id)
+        self.assertEqual(response.context["due_count"], 2)
+
+    def test_edits_and_deletes_refresh_the_batch(self):
+        self.client.get(reverse("review_today"))
+
+        card = self.cards[0]
+        card.front_text = "edited"
+        card.save()
+        response = self.client.get(reverse("review_today"))
+        self.assertEqual(response.context["card"]["front_text"], "edited")
+
+        card.delete()
+        response = self.client.get(reverse("review_today"))
+        self.assertEqual(response.context["card"]["id"], self.cards[1].id)
+        self.assertEqual(response.context["due_count"], 2)
+
+    def test_double_submit_records_one_review(self):
+        card = self.client.get(reverse("review_today")).context["card"]
+        data = {"card_id": card["id"], "quality": 4, "version": card["version"]}
+        self.client.post(reverse("review_today"), data)
+        response = self.client.post(reverse("review_today"), data, follow=True)
+
+        self.assertEqual(Review.objects.filter(card_id=card["id"]).count(), 1)
+        self.assertEqual(Card.objects.get(pk=card["id"]).version, card["version"] + 1)
+        self.assertEqual(len(response.context["messages"]), 1)
+
+    def test_grade_without_version_is_rejected(self):
+        response = self.client.post(reverse("review_today"), {"card_id": self.cards[0].id, "quality": 4})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Review.objects.exists())
+
+    def test_refills_when_batch_runs_out(self):
+        with self.settings(SRS_REVIEW_BATCH_SIZE=2):
+            self.assertEqual(self.client.get(reverse("review_today")).context["due_count"], 3)
+            self.grade(self.cards[0])
+            self.grade(self.cards[1])
+            response = self.client.get(reverse("review_today"))
+            self.assertEqual(response.context["card"]["id"], self.cards[2].id)
+            self.grade(self.cards[2])
+            self.assertIsNone(self.client.get(reverse("review_today")).context["card"])
+
+
+class ReviewBulkTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", is_superuser=True)
+        deck = Deck.objects.create(user=self.user, title="A")
+        self.card = Card.objects.create(deck=deck, front_text="q", back_text="a")
+        self.client.force_login(self.user)
+
+    def post(self, reviews):
+        return self.client.post(reverse("review_bulk"), {"reviews": reviews}, content_type="application/json")
+
+    def test_applies_gradings_in_order_per_card(self):
+        other = User.objects.create_user("bob", is_superuser=True)
+        foreign = Card.objects.create(deck=Deck.objects.create(user=other, title="B"), front_text="q", back_text="a")
+
+        response = self.post(
+            [
+                {"card_id": self.card.id, "quality": 5, "reviewed_at": "2024-01-07T10:00:00Z"},
+                {"card_id": self.card.id, "quality": 4, "reviewed_at": "2024-01-01T10:00:00Z"},
+                {"card_id": foreign.id, "quality": 4},
+                {"card_id": self.card.id, "quality": 9},
+            ]
+        )
+        results = response.json()["results"]
+        self.assertEqual([r["status"] for r in results], ["ok", "ok", "not_found", "invalid"])
+        self.assertEqual(results[1]["interval_days"], 1)
+        self.assertEqual(results[0]["interval_days"], 6)
+        self.assertEqual(results[0]["next_review_at"], "2024-01-13")
+
+        self.card.refresh_from_db()
+        self.assertEqual((self.card.repetitions, self.card.interval_days), (2, 6))
+        self.assertEqual(self.card.reviews.count(), 2)
+        self.assertFalse(foreign.reviews.exists())
+
+    def test_rejects_future_and_out_of_order_reviews(self):
+        self.post([{"card_id": self.card.id, "quality": 4, "reviewed_at": "2024-01-07T10:00:00Z"}])
+        future = (timezone.now() + timedelta(days=1)).isoformat()
+        response = self.post(
+            [
+                {"card_id": self.card.id, "quality": 5, "reviewed_at": future},
+                {"card_id": self.card.id, "quality": 5, "reviewed_at": "2024-01-01T10:00:00Z"},
+                {"card_id": self.card.id, "quality": 5, "reviewed_at": "2024-01-08T10:00:00Z"},
+            ]
+        )
+        self.assertEqual([r["status"] for r in response.json()["results"]], ["invalid", "out_of_order", "ok"])
+        self.assertEqual(self.card.reviews.count(), 2)
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.repetitions, 2)
+
+    def test_writes_are_batched(self):
+        deck = self.card.deck
+        cards = [Card.objects.create(deck=deck, front_text=f"q{i}", back_text="a") for i in range(20)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post([{"card_id": c.id, "quality": 3} for c in cards])
+        self.assertTrue(all(r["status"] == "ok" for r in response.json()["results"]))
+
+        sql = [q["sql"] for q in ctx.captured_queries]
+        self.assertEqual(sum(s.startswith('UPDATE "study_card" SET "repetitions"') for s in sql), 1)
+        self.assertEqual(sum(s.startswith('INSERT INTO "study_review"') for s in sql), 1)
+
+    def test_rejects_malformed_payload(self):
+        self.assertEqual(self.client.post(reverse("review_bulk"), "nope", content_type="application/json").status_code, 400)
+
+
+class DailyReviewStatTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", is_superuser=True)
+        self.card = Card.objects.create(deck=Deck.objects.create(user=self.user, title="A"), front_text="q", back_text="a")
+
+    def review(self, quality, when):
+        return Review(
+            user=self.user, card=self.card, quality=quality, reviewed_at=when,
+            repetitions=0, interval_days=1, ease_factor=2.5, next_review_at=when.date(),
+        )
+
+    def snapshot(self):
+        return list(DailyReviewStat.objects.values_list("day", "review_count", "quality_sum", *QUALITY_FIELDS))
+
+    def test_single_and_bulk_writes_match_rebuild(self):
+        now = timezone.now()
+        self.review(5, now).save()
+        Review.objects.bulk_create([self.review(q, now - timedelta(days=d)) for d in range(3) for q in (1, 4)])
+
+        today = DailyReviewStat.objects.get(day=timezone.localdate(now))
+        self.assertEqual((today.review_count, today.quality_sum, today.q1, today.q4, today.q5), (3, 10, 1, 1, 1))
+
+        incremental = self.snapshot()
+        rebuild_daily_stats()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_deletes_match_rebuild(self):
+        now = timezone.now()
+        single = self.review(5, now)
+        single.save()
+        Review.objects.bulk_create([self.review(q, now - timedelta(days=d)) for d in range(3) for q in (1, 4)])
+        other = Card.objects.create(deck=self.card.deck, front_text="q2", back_text="a")
+        extra = self.review(3, now)
+        extra.card = other
+        extra.save()
+
+        single.delete()
+        Review.objects.filter(reviewed_at__lt=now - timedelta(days=1, hours=12)).delete()
+        self.card.refresh_from_db()
+        self.assertEqual((self.card.review_count, self.card.quality_sum, self.card.avg_quality), (4, 10, 2.5))
+        self.assertEqual(list(card_stats_mismatches()), [])
+
+        # Deleting the card cascades to its reviews
+        other.delete()
+        incremental = self.snapshot()
+        rebuild_daily_stats()
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertEqual(sum(row[1] for row in incremental), 4)
+
+    def test_cascade_forgets_reviews_in_one_batch(self):
+        now = timezone.now()
+        counts = []
+        for n in (2, 12):
+            card = Card.objects.create(deck=self.card.deck, front_text=f"q{n}", back_text="a")
+            reviews = [self.review(q % 6, now) for q in range(n)]
+            for review in reviews:
+                review.card = card
+            Review.objects.bulk_create(reviews)
+            with CaptureQueriesContext(connection) as ctx:
+                card.delete()
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(DailyReviewStat.objects.count(), 0)
+        self.assertEqual(list(card_stats_mismatches()), [])
+
+    def test_card_totals_follow_reviews(self):
+        now = timezone.now()
+        self.review(2, now).save()
+        Review.objects.bulk_create([self.review(q, now) for q in (3, 4)])
+
+        self.card.refresh_from_db()
+        self.assertEqual((self.card.review_count, self.card.quality_sum, self.card.avg_quality), (3, 9, 3.0))
+        self.assertEqual(list(card_stats_mismatches()), [])
+
+        plan = Card.objects.filter(user=self.user, review_count__gte=3).order_by("avg_quality", "-review_count").explain()
+        self.assertIn("card_hardest_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+        Card.objects.filter(pk=self.card.pk).update(review_count=7)
+        out = StringIO()
+        call_command("check_card_stats", "--fix", stdout=out)
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.review_count, 3)
+        self.assertEqual(list(card_stats_mismatches()), [])
+
+        # A drifted average alone is reported and fixed too
+        Card.objects.filter(pk=self.card.pk).update(avg_quality=1.5)
+        self.assertEqual([c.pk for c, _, _ in card_stats_mismatches()], [self.card.pk])
+        call_command("check_card_stats", "--fix", stdout=StringIO())
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.avg_quality, 3.0)
+
+
+class AnalyticsCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", is_superuser=True)
+        self.card = Card.objects.create(deck=Deck.objects.create(user=self.user, title="A"), front_text="q", back_text="a")
+        self.client.force_login(self.user)
+        get_analytics_cache().clear()
+
+    def add_review(self, quality=4):
+        Review.objects.create(
+            user=self.user, card=self.card, quality=quality,
+            repetitions=1, interval_days=1, ease_factor=2.5, next_review_at=timezone.localdate(),
+        )
+
+    def test_new_review_invalidates_rendered_figures(self):
+        self.add_review()
+        first = self.client.get(reverse("analytics")).context["fig_count_html"]
+        with patch("study.analytics.px.bar") as bar:
+            self.assertEqual(self.client.get(reverse("analytics")).context["fig_count_html"], first)
+        bar.assert_not_called()
+        self.assertEqual(analytics_cache_stats(), {"hits": 1, "misses": 1})
+
+        self.add_review(quality=1)
+        self.assertNotEqual(self.client.get(reverse("analytics")).context["fig_count_html"], first)
+        self.assertEqual(analytics_cache_stats(), {"hits": 1, "misses": 2})
+
+    def test_card_rename_and_delete_refresh_hard_cards(self):
+        for quality in (1, 2, 1):
+            self.add_review(quality)
+        hard_cards = self.client.get(reverse("analytics")).context["hard_cards"]
+        self.assertEqual([c["front_text"] for c in hard_cards], ["q"])
+
+        # Neither changes the latest review id
+        self.card.front_text = "renamed"
+        self.card.save(update_fields=["front_text"])
+        hard_cards = self.client.get(reverse("analytics")).context["hard_cards"]
+        self.assertEqual([c["front_text"] for c in hard_cards], ["renamed"])
+
+        other = Card.objects.create(deck=self.card.deck, front_text="other", back_text="a")
+        Review.objects.bulk_create([
+            Review(
+                user=self.user, card=other, quality=5,
+                repetitions=1, interval_days=1, ease_factor=2.5, next_review_at=timezone.localdate(),
+            )
+            for _ in range(3)
+        ])
+        self.add_review()
+        self.assertEqual(len(self.client.get(reverse("analytics")).context["hard_cards"]), 2)
+        other.delete()
+        self.assertEqual(len(self.client.get(reverse("analytics")).context["hard_cards"]), 1)
+
+
+class DemoDeckSeedingTests(TestCase):
+    def test_signup_seeds_in_bulk(self):
+        with self.assertNumQueries(5):  # user, savepoint, decks, cards, release
+            user = User.objects.create_user("alice")
+        self.assertEqual(user.decks.count(), 3)
+        self.assertEqual(Card.objects.filter(user=user, deck__user=user).count(), 45)
+
+    @override_settings(SRS_DEMO_DECKS_SEEDING="login")
+    def test_login_mode_seeds_once_on_first_login(self):
+        user = User.objects.create_user("alice")
+        self.assertFalse(user.decks.exists())
+
+        self.client.force_login(user)
+        self.client.force_login(user)
+        self.assertEqual(user.decks.count(), 3)
+
+    @override_settings(SRS_DEMO_DECKS_SEEDING="command")
+    def test_command_mode_seeds_pending_users(self):
+        user = User.objects.create_user("alice")
+        call_command("seed_demo_decks", stdout=StringIO())
+        self.assertEqual(user.decks.count(), 3)
+        self.assertFalse(DemoSeedRequest.objects.exists())
+
+    @override_settings(SRS_DEMO_DECKS_SEEDING="command")
+    def test_deferred_seeding_refreshes_cached_badge(self):
+        cache.clear()
+        user = User.objects.create_user("alice")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse("home")).context["due_count"], 0)
+
+        call_command("seed_demo_decks", stdout=StringIO())
+        self.assertEqual(self.client.get(reverse("home")).context["due_count"], 45)
+
+
+class CardImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", is_superuser=True)
+        self.deck = Deck.objects.create(user=self.user, title="A")
+        Card.objects.create(deck=self.deck, front_text="existing", back_text="a")
+        Tag.objects.create(user=self.user, name="old")
+
+    def test_parsers(self):
+        tsv = "#separator:tab\n#html:false\nq1\ta1\tnew old\n"
+        self.assertEqual(list(parse_tsv(StringIO(tsv))), [CardRow("q1", "a1", ("new", "old"))])
+        csv_text = 'front,back,tags\n"q, 1",a1,x\n'
+        self.assertEqual(list(parse_csv(StringIO(csv_text))), [CardRow("q, 1", "a1", ("x",))])
+        json_text = '[{"front": "q1", "back": "a1", "tags": ["x"]},\n {"front": "q2", "back": "a2"}]'
+        self.assertEqual(
+            list(parse_json(StringIO(json_text), buffer_size=7)),
+            [CardRow("q1", "a1", ("x",)), CardRow("q2", "a2")],
+        )
+
+    def test_import_dedupes_and_resolves_tags_in_chunks(self):
+        rows = [CardRow(f"q{i}", f"a{i}", ("old", f"t{i % 2}")) for i in range(5)]
+        rows += [CardRow("existing", "a"), CardRow("q0", "again"), CardRow("", "a")]
+        seen = []
+
+        result = import_cards(self.deck, rows, chunk_size=2, progress=lambda r: seen.append(r.processed))
+
+        self.assertEqual((result.created, result.duplicates, result.invalid), (5, 2, 1))
+        self.assertEqual(seen, [2, 4, 6, 8])
+        self.assertEqual(set(Tag.objects.filter(user=self.user).values_list("name", flat=True)), {"old", "t0", "t1"})
+        card = Card.objects.get(front_text="q3")
+        self.assertEqual((card.user_id, sorted(card.tags.values_list("name", flat=True))), (self.user.id, ["old", "t1"]))
+
+    def test_upload_view(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile("deck.csv", "front,back\nq1,a1\nexisting,a\n".encode())
+        response = self.client.post(reverse("card_import", kwargs={"deck_id": self.deck.id}), {"file": upload})
+        self.assertRedirects(response, reverse("card_list", kwargs={"deck_id": self.deck.id}))
+        self.assertEqual(self.deck.cards.count(), 2)
+
+    def test_broken_file_reports_committed_chunks(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("home")).context["due_count"], 1)
+        oversized = "x" * (csv.field_size_limit() + 1)
+        body = "front,back\n" + "".join(f"q{i},a\n" for i in range(3)) + f"q9,{oversized}\n"
+        with patch("study.views.import_cards", wraps=lambda deck, rows: import_cards(deck, rows, chunk_size=2)):
+            response = self.client.post(
+                reverse("card_import", kwargs={"deck_id": self.deck.id}),
+                {"file": SimpleUploadedFile("deck.csv", body.encode())},
+            )
+        self.assertFormError(response.context["form"], "file", "Файл не удалось разобрать; до ошибки добавлено карточек: 2")
+        self.assertEqual(self.deck.cards.count(), 3)
+        self.assertEqual(self.client.get(reverse("home")).context["due_count"], 3)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", is_superuser=True)
+        deck = Deck.objects.create(user=self.user, title="A")
+        self.cards = [Card.objects.create(deck=deck, front_text=f"q{i}", back_text="a") for i in range(5)]
+        self.cards[0].tags.add(Tag.objects.create(user=self.user, name="x"), Tag.objects.create(user=self.user, name="y"))
+        other = User.objects.create_user("bob", is_superuser=True)
+        Card.objects.create(deck=Deck.objects.create(user=other, title="B"), front_text="secret", back_text="a")
+        self.client.force_login(self.user)
+
+    def test_streams_only_own_rows(self):
+        response = self.client.get(reverse("export", kwargs={"kind": "cards", "fmt": "ndjson"}))
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([r["front_text"] for r in rows], [f"q{i}" for i in range(5)])
+        self.assertEqual(sorted(rows[0]["tags"]), ["x", "y"])
+
+        response = self.client.get(reverse("export", kwargs={"kind": "cards", "fmt": "csv"}))
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:2], ["id", "deck_id"])
+        self.assertEqual(len(lines), 6)
+
+    def test_tags_are_prefetched_per_chunk(self):
+        # one streamed card query plus a tag query per chunk of two cards
+        with self.assertNumQueries(4):
+            list(iter_rows("cards", user_id=self.user.id, chunk_size=2))
+
+
+@override_settings(SRS_CARD_LIST_PAGE_SIZE=3)
+class CardListPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", is_superuser=True)
+        self.deck = Deck.objects.create(user=self.user, title="A")
+        today = timezone.localdate()
+        self.tag = Tag.objects.create(user=self.user, name="x")
+        for i in range(8):
+            card = Card.objects.create(
+                deck=self.deck, front_text="q" * 300, back_text="a",
+                next_review_at=today + timedelta(days=i % 3), is_active=i != 4,
+            )
+            if i % 2:
+                card.tags.add(self.tag)
+        self.client.force_login(self.user)
+
+    def walk(self, **params):
+        url = reverse("card_list", kwargs={"deck_id": self.deck.id})
+        seen, query = [], QueryDict(mutable=True)
+        query.update(params)
+        while True:
+            response = self.client.get(f"{url}?{query.urlencode()}")
+            seen += [c.id for c in response.context["cards"]]
+            if "next_page_query" not in response.context:
+                return seen
+            query = QueryDict(response.context["next_page_query"])
+
+    def expected(self, qs):
+        return list(qs.order_by("next_review_at", "id").values_list("id", flat=True))
+
+    def test_pages_follow_default_ordering(self):
+        cards = Card.objects.filter(deck=self.deck)
+        self.assertEqual(self.walk(), self.expected(cards))
+        self.assertEqual(self.walk(active="1"), self.expected(cards.filter(is_active=True)))
+        self.assertEqual(self.walk(due="1"), self.expected(cards.filter(next_review_at__lte=timezone.localdate())))
+        self.assertEqual(self.walk(tag=str(self.tag.id)), self.expected(cards.filter(tags=self.tag)))
+
+    def test_rows_skip_full_text(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("card_list", kwargs={"deck_id": self.deck.id}), {"after": "2000-01-01.1"})
+        card_sql = [q["sql"] for q in ctx.captured_queries if 'FROM "study_card"' in q["sql"]]
+        self.assertTrue(card_sql)
+        for sql in card_sql:
+            self.assertNotIn("OFFSET", sql)
+            self.assertNotIn('"study_card"."back_text"', sql)
+        self.assertEqual(len(response.context["cards"][0].front_preview), 121)
+
+
+class CardSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", is_superuser=True)
+        self.deck = Deck.objects.create(user=self.user, title="A")
+        other = User.objects.create_user("bob", is_superuser=True)
+        Card.objects.create(deck=Deck.objects.create(user=other, title="B"), front_text="Paris secret", back_text="x")
+
+    def ids(self, text, **kwargs):
+        return [c.id for c in search_cards(self.user.id, text, **kwargs)]
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        card = Card.objects.create(deck=self.deck, front_text="Capital of France", back_text="Paris")
+        [bulk] = Card.objects.bulk_create([Card(deck=self.deck, user=self.user, front_text="Paris metro", back_text="x")])
+
+        # Front matches outrank back matches; other users' cards never show up
+        self.assertEqual(self.ids("paris"), [bulk.id, card.id])
+        self.assertEqual(self.ids("capit"), [card.id])
+
+        Card.objects.filter(pk=card.pk).update(front_text="Capital of Italy", back_text="Rome")
+        self.assertEqual(self.ids("paris"), [bulk.id])
+        self.assertEqual(self.ids("rome"), [card.id])
+
+        self.deck.delete()
+        self.assertEqual(self.ids("rome"), [])
+
+    def test_like_fallback(self):
+        back = Card.objects.create(deck=self.deck, front_text="Capital of France", back_text="Paris")
+        front = Card.objects.create(deck=self.deck, front_text="Paris metro", back_text="x")
+        self.assertEqual(self.ids("paris", backend="like"), [front.id, back.id])
+        self.assertEqual(self.ids('"unbalanced'), [])
+
+    def test_view(self):
+        card = Card.objects.create(deck=self.deck, front_text="Capital of France", back_text="Paris")
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("card_search"), {"q": "france"})
+        self.assertEqual(response.context["cards"], [card])
+
+
+class ForecastTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", is_superuser=True)
+        self.card = Card.objects.create(deck=Deck.objects.create(user=self.user, title="A"), front_text="q", back_text="a")
+        self.client.force_login(self.user)
+        get_analytics_cache().clear()
+
+    def test_simulation_follows_sm2(self):
+        today = timezone.localdate()
+        columns = load_card_columns(self.user.id)
+        counts = simulate_due_counts(columns, 10, np.array([0, 0, 0, 0, 0, 1.0]), today)
+        # Perfect recall: intervals 1, 6, then 6 * EF
+        self.assertEqual(list(np.flatnonzero(counts)), [0, 1, 7])
+
+    def test_api_is_cached_until_next_review(self):
+        url = reverse("forecast_api")
+        with patch("study.forecast.simulate_due_counts", wraps=simulate_due_counts) as simulate:
+            first = self.client.get(url, {"days": "14"}).json()
+            self.client.get(url, {"days": "14"})
+            self.assertEqual(simulate.call_count, 1)
+
+            Review.objects.create(
+                user=self.user, card=self.card, quality=5,
+                repetitions=1, interval_days=1, ease_factor=2.6, next_review_at=timezone.localdate(),
+            )
+            self.client.get(url, {"days": "14"})
+            self.assertEqual(simulate.call_count, 2)
+
+        self.assertEqual(len(first["days"]), 14)
+        self.assertEqual(first["days"][0]["due"], 1)
+
+    def test_uses_fitted_params(self):
+        Card.objects.filter(pk=self.card.pk).update(repetitions=1, interval_days=1)
+        UserSchedulerParams.objects.create(user=self.user, second_interval=3)
+        with patch("study.forecast.grade_distribution", return_value=np.array([0, 0, 0, 0, 0, 1.0])):
+            days = self.client.get(reverse("forecast_api"), {"days": "5"}).json()["days"]
+        self.assertEqual([d["due"] for d in days], [1, 0, 0, 1, 0])
+
+
+class SyntheticDataTests(TestCase):
+    def test_card_state_matches_last_review(self):
+        call_command("generate_synthetic_data", users=1, decks=2, cards=20, reviews=4, stdout=StringIO())
+        user = User.objects.get(username="synthetic-0")
+        self.assertEqual(Card.objects.filter(user=user).count(), 40)
+        self.assertTrue(Review.objects.filter(user=user).exists())
+        self.assertEqual(list(card_stats_mismatches(100)), [])
+
+        for card in Card.objects.filter(user=user, review_count__gt=0):
+            last = card.reviews.order_by("-reviewed_at").first()
+            self.assertEqual(
+                (card.repetitions, card.interval_days, card.ease_factor, card.next_review_at),
+                (last.repetitions, last.interval_days, last.ease_factor, last.next_review_at),
+            )
+
+
+@override_settings(SRS_METRICS_TOKEN="scrape-token")
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics_registry.reset()
+        self.user = User.objects.create_user("metrics", password="pw", is_superuser=True)
+        deck = Deck.objects.create(user=self.user, title="D")
+        Card.objects.create(deck=deck, front_text="f", back_text="b")
+
+    def test_records_queries_per_view(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("review_today"))
+        stats = metrics_registry.snapshot()["review_today"]
+        self.assertEqual(stats["requests"], 1)
+        self.assertEqual(stats["queries"], len(ctx.captured_queries))
+        self.assertGreater(stats["db_seconds"], 0)
+
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-token")
+        body = response.content.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('srs_http_requests_total{view="review_today"} 1', body)
+        self.assertIn('srs_http_request_duration_seconds_bucket{view="review_today",le="+Inf"} 1', body)
+        self.assertIn("srs_analytics_cache_hits_total", body)
+
+    def test_requires_staff_or_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+
+    @override_settings(SRS_METRICS_QUERY_BUDGET=1)
+    def test_warns_over_budget(self):
+        self.client.force_login(self.user)
+        with self.assertLogs("study.metrics", "WARNING") as logs:
+            self.client.get(reverse("deck_list"))
+        self.assertIn("deck_list", logs.output[0])
+
+
+class SqliteProductionProfileTests(SimpleTestCase):
+    def open(self, path):
+        config = {"ENGINE": "django.db.backends.sqlite3", "NAME": path, **settings.SRS_SQLITE_PRODUCTION}
+        return DatabaseWrapper(connections.configure_settings({"default": config})["default"], alias="stress")
+
+    def test_pragmas_applied_on_connect(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = self.open(f"{tmp}/db.sqlite3")
+            with conn.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                self.assertEqual(cursor.fetchone()[0], "wal")
+                cursor.execute("PRAGMA synchronous")
+                self.assertEqual(cursor.fetchone()[0], 1)
+                cursor.execute("PRAGMA busy_timeout")
+                self.assertEqual(cursor.fetchone()[0], 20000)
+            conn.close()
+
+    def test_concurrent_read_then_write_transactions(self):
+        # Deferred transactions that read before writing fail with "database is locked"
+        # when two upgrade at once; IMMEDIATE ones wait on the busy timeout instead.
+        errors = []
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/db.sqlite3"
+            setup = self.open(path)
+            with setup.cursor() as cursor:
+                cursor.execute("CREATE TABLE counter (n INTEGER)")
+                cursor.execute("INSERT INTO counter VALUES (0)")
+            setup.close()
+
+            def writer():
+                connections["stress"] = conn = self.open(path)
+                try:
+                    for _ in range(50):
+                        with transaction.atomic(using="stress"), conn.cursor() as cursor:
+                            cursor.execute("SELECT n FROM counter")
+                            n = cursor.fetchone()[0]
+                            cursor.execute("UPDATE counter SET n = %s", [n + 1])
+                except Exception as exc:
+                    errors.append(exc)
+                finally:
+                    conn.close()
+                    del connections["stress"]
+
+            threads = [threading.Thread(target=writer) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            check = self.open(path)
+            with check.cursor() as cursor:
+                cursor.execute("SELECT n FROM counter")
+                total = cursor.fetchone()[0]
+            check.close()
+        self.assertEqual(errors, [])
+        self.assertEqual(total, 200)
+
+
+class GradeCardConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", is_superuser=True)
+        self.card = Card.objects.create(deck=Deck.objects.create(user=self.user, title="A"), front_text="q", back_text="a")
+
+    def test_simultaneous_grades_apply_once(self):
+        threads = 8
+        barrier = threading.Barrier(threads)
+        outcomes = []
+
+        def grader(quality):
+            try:
+                barrier.wait()
+                grade_card(self.user, self.card.pk, quality, expected_version=0)
+                outcomes.append("ok")
+            except StaleGrade:
+                outcomes.append("stale")
+            except Exception as exc:
+                outcomes.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=grader, args=(q % 6,)) for q in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(sorted(outcomes, key=str), ["ok"] + ["stale"] * (threads - 1))
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.version, 1)
+        review = Review.objects.get(card=self.card)
+        self.assertEqual((review.repetitions, review.interval_days), (self.card.repetitions, self.card.interval_days))
+        self.assertEqual(self.card.review_count, 1)
+
+    def test_lost_race_after_read_is_stale(self):
+        # Another writer commits between grade_card's read and its update
+        real_sm2 = sm2_calculate
+
+        def racing_sm2(**kwargs):
+            Card.objects.filter(pk=self.card.pk).update(version=F("version") + 1)
+            return real_sm2(**kwargs)
+
+        with patch("study.services.sm2_calculate", racing_sm2), self.assertRaises(StaleGrade):
+            grade_card(self.user, self.card.pk, 4)
+        self.assertFalse(Review.objects.exists())
+
+
+@override_settings(SRS_REPLICA_DATABASE="replica", SRS_REPLICA_PIN_SECONDS=0)
+class ReplicaRouterTests(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        get_analytics_cache().clear()
+        self.user = User.objects.create_user("replica", password="pw", is_superuser=True)
+        self.deck = Deck.objects.create(user=self.user, title="D")
+        self.card = Card.objects.create(deck=self.deck, front_text="f", back_text="b")
+
+    def replicate(self):
+        primary, replica = connections["default"], connections["replica"]
+        primary.ensure_connection()
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
+
+    def review(self, quality=4):
+        return Review.objects.create(
+            user=self.user, card=self.card, quality=quality,
+            repetitions=1, interval_days=1, ease_factor=2.5, next_review_at=timezone.localdate(),
+        )
+
+    def test_reads_lag_until_replicated(self):
+        self.review()
+        self.assertEqual(read_alias(self.user.id), "replica")
+        self.assertEqual(list(export("cards", "ndjson", user_id=self.user.id)), [])
+        self.assertTrue(get_analytics_context(self.user.id)["no_data"])
+
+        self.replicate()
+        self.assertEqual(len(list(export("cards", "ndjson", user_id=self.user.id))), 1)
+        self.assertFalse(get_analytics_context(self.user.id)["no_data"])
+
+        # A later review is invisible on the replica until the next copy
+        self.review(quality=0)
+        self.assertEqual(len(list(export("reviews", "ndjson", user_id=self.user.id))), 1)
+
+    def test_writes_go_to_primary(self):
+        self.replicate()
+        card = Card.objects.using("replica").get(pk=self.card.pk)
+        card.front_text = "edited"
+        card.save()
+        self.assertEqual(Card.objects.get(pk=self.card.pk).front_text, "edited")
+        self.assertEqual(Card.objects.using("replica").get(pk=self.card.pk).front_text, "f")
+
+    @override_settings(SRS_REPLICA_PIN_SECONDS=60)
+    def test_recent_writer_reads_primary(self):
+        other = User.objects.create_user("other", password="pw", is_superuser=True)
+        self.review()
+        self.assertEqual(read_alias(self.user.id), "default")
+        self.assertEqual(read_alias(other.id), "replica")
+        self.assertFalse(get_analytics_context(self.user.id)["no_data"])
+
+
+@override_settings(SRS_SHARDS=["default", "shard1", "shard2"])
+class ShardingTests(TestCase):
+    databases = {"default", "shard1", "shard2"}
+
+    def make_user(self, name):
+        user = User.objects.create_user(name, password="pw", is_superuser=True)
+        return user, shard_for_user(user.pk)
+
+    def user_on(self, alias):
+        for i in range(3):
+            user, shard = self.make_user(f"{alias}-{i}")
+            if shard == alias:
+                return user
+        self.fail(f"no user placed on {alias}")
+
+    def rows_by_shard(self, model, user):
+        return {alias: model.objects.using(alias).filter(user=user).count() for alias in self.databases}
+
+    def test_auth_tables_stay_central(self):
+        self.assertIn("auth_user", connections["default"].introspection.table_names())
+        for alias in ("shard1", "shard2"):
+            tables = connections[alias].introspection.table_names()
+            self.assertIn("study_card", tables)
+            self.assertNotIn("auth_user", tables)
+            self.assertNotIn("django_session", tables)
+
+    def test_views_write_to_the_users_shard(self):
+        user = self.user_on("shard2")
+        self.client.force_login(user)
+        self.client.post(reverse("deck_create"), {"title": "Sharded", "description": ""})
+        deck = Deck.objects.using("shard2").get(user=user)
+        self.client.post(
+            reverse("card_create", args=[deck.pk]), {"front_text": "question", "back_text": "answer", "is_active": "on"}
+        )
+        card = Card.objects.using("shard2").get(user=user)
+        self.assertEqual(self.client.get(reverse("review_today")).context["card"]["id"], card.pk)
+        self.client.post(reverse("review_today"), {"card_id": card.pk, "quality": 4, "version": 0})
+
+        self.assertEqual(self.rows_by_shard(Deck, user), {"default": 0, "shard1": 0, "shard2": 1})
+        self.assertEqual(self.rows_by_shard(Review, user), {"default": 0, "shard1": 0, "shard2": 1})
+        self.assertEqual(DailyReviewStat.objects.using("shard2").get(user=user).review_count, 1)
+        self.assertEqual(self.client.get(reverse("analytics")).status_code, 200)
+        self.assertEqual([c.pk for c in search_cards(user.id, "quest")], [card.pk])
+
+    def test_move_user_between_shards(self):
+        user = self.user_on("shard1")
+        with user_shard(user.pk):
+            deck = Deck.objects.create(user=user, title="D")
+            tag = Tag.objects.create(user=user, name="verbs")
+            cards = [Card.objects.create(deck=deck, front_text=f"f{i}", back_text="b") for i in range(3)]
+            cards[0].tags.add(tag)
+        apply_reviews(user, [ReviewSubmission(c.pk, 4, timezone.now()) for c in cards[:2]])
+        UserSchedulerParams.objects.using("shard1").create(user=user, second_interval=4, last_review_id=99)
+        call_command("archive_reviews", "--days", "0", stdout=StringIO())
+        self.assertEqual(ArchivedReview.objects.using("shard1").count(), 2)
+
+        out = StringIO()
+        call_command("move_user_shard", user.username, "shard2", stdout=out)
+        self.assertIn("3 cards", out.getvalue())
+
+        self.assertEqual(UserShard.objects.get(user=user).alias, "shard2")
+        self.assertEqual(shard_for_user(user.pk), "shard2")
+        self.assertEqual(self.rows_by_shard(Card, user), {"default": 0, "shard1": 0, "shard2": 3})
+        self.assertEqual(self.rows_by_shard(Review, user), {"default": 0, "shard1": 0, "shard2": 0})
+        self.assertEqual(self.rows_by_shard(ArchivedReview, user), {"default": 0, "shard1": 0, "shard2": 2})
+        moved = Card.objects.using("shard2").get(user=user, front_text="f0")
+        self.assertEqual([t.name for t in moved.tags.all()], ["verbs"])
+        self.assertEqual((moved.review_count, moved.repetitions), (1, 1))
+        self.assertEqual(moved.archived_reviews.get().quality, 4)
+        self.assertEqual(list(card_stats_mismatches(using="shard2")), [])
+        params = UserSchedulerParams.objects.using("shard2").get(user=user)
+        self.assertEqual((params.second_interval, params.last_review_id), (4, 0))
+        self.assertFalse(UserSchedulerParams.objects.using("shard1").exists())
+        self.assertFalse(ArchivedReview.objects.using("shard1").exists())
+
+        self.client.force_login(user)
+        response = self.client.get(reverse("card_list", args=[moved.deck_id]))
+        self.assertContains(response, "f0")
+
+    def test_demo_decks_seeded_on_new_users_shard(self):
+        for i in range(3):
+            user = User.objects.create_user(f"learner-{i}", password="pw")
+            alias = shard_for_user(user.pk)
+            self.assertTrue(Deck.objects.using(alias).filter(user=user).exists())
+            self.assertEqual(sum(self.rows_by_shard(Deck, user).values()), Deck.objects.using(alias).filter(user=user).count())
+
+    def test_move_is_seen_without_local_state(self):
+        # move_user runs in another process; a web worker must route by UserShard alone
+        user = self.user_on("shard1")
+        self.assertEqual(shard_for_user(user.pk), "shard1")
+        with user_shard(user.pk):
+            Deck.objects.create(user=user, title="D")
+        move_user(user.pk, "shard2")
+        self.client.force_login(user)
+        self.assertEqual([d.title for d in self.client.get(reverse("deck_list")).context["decks"]], ["D"])
+
+        # A switch written by another process is seen on the next lookup
+        UserShard.objects.filter(user=user).update(alias="shard1")
+        self.assertEqual(shard_for_user(user.pk), "shard1")
+
+    def test_export_without_user_covers_every_shard(self):
+        users = [self.user_on(alias) for alias in ("shard1", "shard2")]
+        for user in users:
+            with user_shard(user.pk):
+                Deck.objects.create(user=user, title=f"deck of {user.username}")
+        rows = [json.loads(line) for line in export("decks", "ndjson")]
+        self.assertEqual(sorted(r["user_id"] for r in rows), sorted(u.pk for u in users))
+
+    def test_deleting_user_removes_shard_rows(self):
+        user = self.user_on("shard1")
+        with user_shard(user.pk):
+            deck = Deck.objects.create(user=user, title="D")
+            Card.objects.create(deck=deck, front_text="f", back_text="b")
+        user.delete()
+        self.assertFalse(Card.objects.using("shard1").exists())
+        self.assertFalse(UserShard.objects.filter(user_id=user.pk).exists())
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        metrics_registry.reset()
+        get_analytics_cache().clear()
+        self.user = User.objects.create_user("async", password="pw", is_superuser=True)
+        deck = Deck.objects.create(user=self.user, title="D")
+        self.cards = [Card.objects.create(deck=deck, front_text=f"q{i}", back_text="a") for i in range(2)]
+
+    async def test_review_queue_and_grading(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("review_today_async"))
+        first = response.context["card"]
+        self.assertEqual((first["id"], response.context["due_count"]), (self.cards[0].pk, 2))
+
+        response = await self.async_client.post(reverse("review_today_async"), {"card_id": first["id"], "quality": 5, "version": first["version"]})
+        self.assertRedirects(response, reverse("review_today_async"), fetch_redirect_response=False)
+        card = await Card.objects.aget(pk=first["id"])
+        self.assertEqual((card.repetitions, card.interval_days, card.review_count), (1, 1, 1))
+        self.assertEqual(await DailyReviewStat.objects.filter(user=self.user).acount(), 1)
+
+        response = await self.async_client.get(reverse("review_today_async"))
+        self.assertEqual((response.context["card"]["id"], response.context["due_count"]), (self.cards[1].pk, 1))
+        self.assertGreater(metrics_registry.snapshot()["review_today_async"]["queries"], 0)
+
+    async def test_other_users_card_is_not_found(self):
+        other = await User.objects.acreate(username="intruder", is_superuser=True)
+        await self.async_client.aforce_login(other)
+        response = await self.async_client.post(reverse("review_today_async"), {"card_id": self.cards[0].pk, "quality": 5, "version": 0})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_analytics_matches_sync_context(self):
+        await Review.objects.acreate(
+            user=self.user, card=self.cards[0], quality=2,
+            repetitions=0, interval_days=1, ease_factor=2.3, next_review_at=timezone.localdate(),
+        )
+        context = await aget_analytics_context(self.user.id)
+        self.assertFalse(context["no_data"])
+        self.assertIn("plotly", context["fig_count_html"])
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("analytics_async"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(analytics_cache_stats(), {"hits": 1, "misses": 1})
+
+
+class SchedulerParamsTests(TestCase):
+    true_params = Sm2Params(ef_bonus=0.15, ef_linear=0.05, ef_quadratic=0.01, first_interval=1, second_interval=3)
+
+    def simulate(self, cards, answers, seed=1):
+        """Reviews of a learner whose recall follows true_params: rows of (card, day, quality)."""
+        rng = np.random.default_rng(seed)
+        rows = []
+        for card in range(cards):
+            day, reps, interval, ef = 0, 0, 0, 2.5
+            for k in range(answers):
+                quality = int(rng.integers(3, 6))
+                if k:
+                    elapsed = int(rng.integers(1, 2 * interval + 1))
+                    day += elapsed
+                    if rng.random() >= TARGET_RECALL ** (elapsed / interval):
+                        quality = int(rng.integers(0, 3))
+                rows.append((card, day, quality))
+                res = sm2_calculate(
+                    quality=quality, repetitions=reps, interval_days=interval, ease_factor=ef,
+                    review_date=date(2024, 1, 1), params=self.true_params,
+                )
+                reps, interval, ef = res.repetitions, res.interval_days, res.ease_factor
+        return rows
+
+    def test_fit_beats_defaults_and_moves_toward_true_params(self):
+        result = fit_params(*zip(*self.simulate(cards=200, answers=10)))
+        self.assertEqual(result.observations, 200 * 9)
+        self.assertGreater(result.log_likelihood, result.default_log_likelihood)
+        # The default second step is 6 days; the learner's is 3
+        self.assertLessEqual(abs(result.params.second_interval - 3), 1)
+
+    def test_command_fits_incrementally_and_review_view_uses_params(self):
+        user = User.objects.create_user("tuned", password="pw", is_superuser=True)
+        deck = Deck.objects.create(user=user, title="D")
+        rows = self.simulate(cards=30, answers=6)
+        cards = {i: Card.objects.create(deck=deck, front_text=f"q{i}", back_text="a") for i in range(30)}
+        start = timezone.now() - timedelta(days=max(day for _, day, _ in rows) + 1)
+        Review.objects.bulk_create([
+            Review(user=user, card=cards[i], reviewed_at=start + timedelta(days=day), quality=quality,
+                   repetitions=0, interval_days=1, ease_factor=2.5, next_review_at=timezone.localdate())
+            for i, day, quality in rows
+        ])
+
+        call_command("fit_scheduler_params", "--workers", "1", "--min-reviews", "100", stdout=StringIO())
+        fitted = UserSchedulerParams.objects.get(user=user)
+        self.assertEqual(fitted.observations, 30 * 5)
+        self.assertEqual(fitted.last_review_id, Review.objects.latest("id").id)
+
+        out = StringIO()
+        call_command("fit_scheduler_params", "--workers", "0", "--min-reviews", "100", stdout=out)
+        self.assertIn("for 0 users", out.getvalue())
+
+        card = cards[0]
+        Card.objects.filter(pk=card.pk).update(repetitions=1, interval_days=1, next_review_at=timezone.localdate())
+        UserSchedulerParams.objects.filter(user=user).update(second_interval=9)
+        self.client.force_login(user)
+        self.client.post(reverse("review_today"), {"card_id": card.pk, "quality": 5, "version": 0})
+        card.refresh_from_db()
+        self.assertEqual((card.repetitions, card.interval_days), (2, 9))
+
+        out = StringIO()
+        call_command("fit_scheduler_params", "--workers", "0", "--min-reviews", "100", stdout=out)
+        self.assertIn("for 1 users", out.getvalue())
+
+
+class RescheduleCardsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("replay", password="pw", is_superuser=True)
+        deck = Deck.objects.create(user=self.user, title="D")
+        self.cards = [Card.objects.create(deck=deck, front_text=f"q{i}", back_text="a") for i in range(3)]
+        self.unreviewed = Card.objects.create(deck=deck, front_text="new", back_text="a")
+        start = timezone.now() - timedelta(days=30)
+        for day, quality in [(0, 4), (1, 5), (7, 2), (8, 5), (9, 4)]:
+            apply_reviews(self.user, [ReviewSubmission(c.pk, quality, start + timedelta(days=day)) for c in self.cards])
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.checkpoint = os.path.join(tmp.name, "checkpoint.json")
+
+    def reschedule(self, *args):
+        out = StringIO()
+        call_command("reschedule_cards", "--workers", "0", "--checkpoint", self.checkpoint, *args, stdout=out)
+        return out.getvalue()
+
+    def test_replay_matches_graded_schedule(self):
+        self.assertIn("Replayed 3 cards of 1 users", self.reschedule("--dry-run"))
+        self.assertIn("0 would change", self.reschedule("--dry-run"))
+
+    def test_new_constants_are_written_back(self):
+        UserSchedulerParams.objects.create(user=self.user, second_interval=3)
+        before = Card.objects.get(pk=self.cards[0].pk)
+        self.assertIn("3 would change", self.reschedule("--dry-run"))
+        self.assertEqual(Card.objects.get(pk=self.cards[0].pk).interval_days, before.interval_days)
+
+        self.assertIn("3 changed", self.reschedule("--chunk-size", "2"))
+        card = Card.objects.get(pk=self.cards[0].pk)
+        # Reviews on days 8 and 9 after a lapse: first step, then the fitted second step
+        self.assertEqual((card.repetitions, card.interval_days), (2, 3))
+        self.assertEqual(card.next_review_at, timezone.localdate(timezone.now() - timedelta(days=21)) + timedelta(days=3))
+        self.assertEqual(Card.objects.get(pk=self.unreviewed.pk).repetitions, 0)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resumes_after_checkpointed_users(self):
+        UserSchedulerParams.objects.create(user=self.user, second_interval=3)
+        with open(self.checkpoint, "w") as fh:
+            json.dump({"default": self.user.pk}, fh)
+        out = self.reschedule()
+        self.assertIn(f"default after user {self.user.pk}", out)
+        self.assertIn("Replayed 0 cards", out)
+        self.assertIn("3 changed", self.reschedule())
+
+    def test_grade_during_the_run_is_kept(self):
+        UserSchedulerParams.objects.create(user=self.user, second_interval=3)
+        card = self.cards[0]
+        history = RescheduleCommand.history
+
+        def graded_meanwhile(command, alias, user_id):
+            result = history(command, alias, user_id)
+            # A live grade lands after the history was read, before the schedule is written
+            grade_card(self.user, card.pk, 5)
+            return result
+
+        with patch.object(RescheduleCommand, "history", graded_meanwhile):
+            out = self.reschedule()
+        self.assertIn("2 changed", out)
+        self.assertIn("1 cards were graded during the run", out)
+        live = Card.objects.get(pk=card.pk)
+        self.assertEqual(live.reviews.order_by("-id").first().next_review_at, live.next_review_at)
+
+
+class ReviewArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("archivist", password="pw", is_superuser=True)
+        deck = Deck.objects.create(user=self.user, title="D")
+        self.cards = [Card.objects.create(deck=deck, front_text=f"q{i}", back_text="a") for i in range(2)]
+        now = timezone.now()
+        for days_ago, quality in [(400, 4), (395, 1), (380, 5), (10, 2), (2, 4)]:
+            apply_reviews(self.user, [ReviewSubmission(c.pk, quality, now - timedelta(days=days_ago)) for c in self.cards])
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command("archive_reviews", *args, stdout=out)
+        return out.getvalue()
+
+    def test_moves_old_reviews_in_batches(self):
+        ids = list(Review.objects.order_by("id").values_list("id", flat=True))
+        self.assertIn("6 reviews would be archived", self.archive("--dry-run"))
+        self.assertEqual(Review.objects.count(), 10)
+
+        self.assertIn("6 reviews archived", self.archive("--batch-size", "4"))
+        self.assertEqual(list(ArchivedReview.objects.order_by("id").values_list("id", flat=True)), ids[:6])
+        self.assertEqual(list(Review.objects.order_by("id").values_list("id", flat=True)), ids[6:])
+        self.assertIn("0 reviews archived", self.archive())
+
+    def test_archive_query_uses_reviewed_at_index(self):
+        old = Review.objects.filter(reviewed_at__lt=archive_cutoff()).order_by("reviewed_at", "id")
+        plan = old.values_list("id")[:10].explain()
+        self.assertIn("review_reviewed_at_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_archived_reviews_stay_in_exports_and_totals(self):
+        before = list(iter_rows("reviews", user_id=self.user.id))
+        stats_before = list(DailyReviewStat.objects.values_list("day", "review_count", "quality_sum"))
+        self.archive()
+
+        # Archived rows keep id, time and grade; the schedule they produced is left empty
+        after = list(iter_rows("reviews", user_id=self.user.id))
+        kept = [{f: row[f] for f in LOG_FIELDS} for row in after]
+        self.assertEqual(kept, [{f: row[f] for f in LOG_FIELDS} for row in before])
+        self.assertEqual([row["interval_days"] for row in after], [None] * 6 + [row["interval_days"] for row in before[6:]])
+        self.assertEqual(list(card_stats_mismatches()), [])
+        rebuild_daily_stats()
+        self.assertEqual(list(DailyReviewStat.objects.values_list("day", "review_count", "quality_sum")), stats_before)
+
+        out = StringIO()
+        call_command("reschedule_cards", "--dry-run", "--workers", "0", stdout=out)
+        self.assertIn("Replayed 2 cards of 1 users", out.getvalue())
+        self.assertIn("0 would change", out.getvalue())
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("analytics"))
+        self.assertEqual([c["review_count"] for c in response.context["hard_cards"]], [5, 5])
+
+    def test_card_delete_removes_archived_reviews(self):
+        self.archive()
+        self.cards[0].delete()
+        self.assertEqual(ArchivedReview.objects.count(), 3)
+
+
+class DeckSummaryTests(TestCase):
+    def setUp(self):
+        get_analytics_cache().clear()
+        self.user = User.objects.create_user("decks", password="pw", is_superuser=True)
+        self.deck = Deck.objects.create(user=self.user, title="A")
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.cards = [
+            Card.objects.create(deck=self.deck, front_text="due", back_text="a"),
+            Card.objects.create(deck=self.deck, front_text="later", back_text="a", next_review_at=tomorrow),
+            Card.objects.create(deck=self.deck, front_text="off", back_text="a", is_active=False),
+        ]
+        self.client.force_login(self.user)
+
+    def summaries(self):
+        response = self.client.get(reverse("deck_list"))
+        return {deck.title: deck.summary for deck in response.context["decks"]}
+
+    def test_counts_per_deck(self):
+        Deck.objects.create(user=self.user, title="Empty")
+        self.assertEqual(self.summaries(), {
+            "A": {"total": 3, "active": 2, "due": 1},
+            "Empty": {"total": 0, "active": 0, "due": 0},
+        })
+
+    def test_query_count_does_not_grow_with_decks(self):
+        self.client.get(reverse("deck_list"))
+        get_analytics_cache().clear()
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse("deck_list"))
+
+        for i in range(10):
+            deck = Deck.objects.create(user=self.user, title=f"D{i}")
+            Card.objects.create(deck=deck, front_text="q", back_text="a")
+        get_analytics_cache().clear()
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(reverse("deck_list"))
+        self.assertEqual(len(many), len(few))
+
+        # Cached summary and due badge: only the session, user and deck list queries remain
+        with self.assertNumQueries(3):
+            self.client.get(reverse("deck_list"))
+
+    def test_card_and_review_writes_refresh_counts(self):
+        self.assertEqual(self.summaries()["A"]["due"], 1)
+
+        self.client.post(reverse("review_today"), {"card_id": self.cards[0].pk, "quality": 5, "version": 0})
+        self.assertEqual(self.summaries()["A"]["due"], 0)
+
+        Card.objects.create(deck=self.deck, front_text="new", back_text="a")
+        self.assertEqual(self.summaries()["A"], {"total": 4, "active": 3, "due": 1})
+
+    def test_due_counts_roll_over_at_midnight(self):
+        self.summaries()
+        with patch("study.deck_summary.timezone.localdate", return_value=timezone.localdate() + timedelta(days=1)):
+            self.assertEqual(self.summaries()["A"]["due"], 2)
+
+
+class DueCountBadgeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("badge", password="pw", is_superuser=True)
+        self.deck = Deck.objects.create(user=self.user, title="A")
+        self.cards = [Card.objects.create(deck=self.deck, front_text=f"q{i}", back_text="a") for i in range(3)]
+        Card.objects.create(deck=self.deck, front_text="later", back_text="a", next_review_at=timezone.localdate() + timedelta(days=1))
+        self.client.force_login(self.user)
+
+    def badge(self):
+        return self.client.get(reverse("home")).context["due_count"]
+
+    def test_cache_hit_runs_no_count_query(self):
+        self.assertEqual(self.badge(), 3)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.badge(), 3)
+        self.assertFalse([q for q in ctx.captured_queries if "study_card" in q["sql"]])
+        self.assertContains(self.client.get(reverse("home")), '<span class="badge rounded-pill text-bg-warning">3</span>')
+
+    def test_grading_updates_cached_count(self):
+        self.badge()
+        self.client.post(reverse("review_today"), {"card_id": self.cards[0].pk, "quality": 5, "version": 0})
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.badge(), 2)
+        self.assertFalse([q for q in ctx.captured_queries if "study_card" in q["sql"]])
+
+    def test_card_edits_bump_the_version(self):
+        self.badge()
+        self.cards[0].is_active = False
+        self.cards[0].save()
+        self.assertEqual(self.badge(), 2)
+        self.cards[1].next_review_at = timezone.localdate() + timedelta(days=3)
+        self.cards[1].save(update_fields=["next_review_at"])
+        self.assertEqual(self.badge(), 1)
+        Card.objects.create(deck=self.deck, front_text="new", back_text="a")
+        self.assertEqual(self.badge(), 2)
+        self.deck.delete()
+        self.assertEqual(self.badge(), 0)
+
+    def test_rolls_over_at_midnight(self):
+        self.badge()
+        tomorrow = timezone.localtime() + timedelta(days=1)
+        with patch("study.review_queue.timezone.localtime", return_value=tomorrow):
+            self.assertEqual(self.badge(), 4)
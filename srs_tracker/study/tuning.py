@@ -0,0 +1,118 @@
+"""Fit per-user SM-2 constants to the review log.
+
+Each graded answer after a card's first review is an observation: the answer passed
+(quality >= 3) or not after ``elapsed`` days. A candidate set of constants is replayed over
+the card's earlier answers, and the interval it would have scheduled is read as the time at
+which recall drops to ``TARGET_RECALL``, so ``p(pass) = TARGET_RECALL ** (elapsed / interval)``.
+Candidates are scored by the Bernoulli log-likelihood of all observations, with every card
+and candidate replayed at once as numpy arrays.
+"""
+
+from __future__ import annotations
+
+from dataclasses import astuple, dataclass
+
+import numpy as np
+
+from .services import DEFAULT_PARAMS, Sm2Params, review_matrix
+
+TARGET_RECALL = 0.9
+START_EASE = 2.5
+
+# (low, high) of the searched range per constant; intervals are whole days
+BOUNDS = {
+    "ef_bonus": (0.0, 0.3),
+    "ef_linear": (0.0, 0.2),
+    "ef_quadratic": (0.0, 0.05),
+    "ef_floor": (1.1, 2.0),
+    "first_interval": (1, 3),
+    "second_interval": (2, 10),
+}
+INTEGER_FIELDS = ("first_interval", "second_interval")
+
+
+@dataclass(frozen=True)
+class FitResult:
+    params: Sm2Params
+    observations: int
+    log_likelihood: float
+    default_log_likelihood: float
+
+
+def log_likelihood(candidates: np.ndarray, q, d, mask) -> np.ndarray:
+    """Log-likelihood of the padded history under each row of ``candidates`` (fields in Sm2Params order)."""
+    bonus, linear, quadratic, floor, first, second = (candidates[:, i : i + 1] for i in range(candidates.shape[1]))
+    shape = (len(candidates), q.shape[0])
+    reps = np.zeros(shape, dtype=np.int64)
+    interval = np.zeros(shape, dtype=np.float64)
+    ef = np.full(shape, START_EASE)
+    total = np.zeros(len(candidates))
+
+    for k in range(q.shape[1]):
+        valid = mask[:, k]
+        quality = q[:, k]
+        passed = quality >= 3
+        if k:
+            seen = valid & mask[:, k - 1]
+            elapsed = np.where(seen, d[:, k] - d[:, k - 1], 0).astype(np.float64)
+            p = TARGET_RECALL ** (elapsed / np.maximum(interval, 1.0))
+            p = np.clip(p, 1e-4, 1 - 1e-4)
+            total += np.where(seen, np.where(passed, np.log(p), np.log1p(-p)), 0.0).sum(axis=1)
+
+        # Same update as sm2_calculate, for every candidate at once
+        diff = 5 - quality
+        new_ef = np.maximum(ef + (bonus - diff * (linear + diff * quadratic)), floor)
+        new_reps = np.where(passed, reps + 1, 0)
+        grown = np.where(interval > 0, np.rint(interval * new_ef), second)
+        new_interval = np.select(
+            [~passed | (new_reps == 1), new_reps == 2],
+            [np.broadcast_to(first, shape), np.broadcast_to(second, shape)],
+            grown,
+        )
+        ef = np.where(valid, new_ef, ef)
+        reps = np.where(valid, new_reps, reps)
+        interval = np.where(valid, new_interval, interval)
+    return total
+
+
+def _sample(rng, n, center=None, scale=1.0) -> np.ndarray:
+    columns = []
+    for name, (low, high) in BOUNDS.items():
+        if center is None:
+            values = rng.uniform(low, high, n)
+        else:
+            values = center[len(columns)] + rng.normal(0.0, (high - low) * 0.1 * scale, n)
+        values = np.clip(values, low, high)
+        if name in INTEGER_FIELDS:
+            values = np.rint(values)
+        columns.append(values)
+    return np.column_stack(columns)
+
+
+def fit_params(card_ids, days, qualities, *, candidates: int = 256, rounds: int = 3, seed: int = 0) -> FitResult:
+    """Search the constants that best explain a user's history.
+
+    A random search over BOUNDS is followed by ``rounds`` narrowing searches around the best
+    candidate. The defaults are always a candidate, so the fit never scores below them.
+    """
+    q, d, mask = review_matrix(card_ids, days, qualities)
+    observations = int((mask[:, 1:] & mask[:, :-1]).sum()) if mask.shape[1] > 1 else 0
+    default = np.array([astuple(DEFAULT_PARAMS)], dtype=np.float64)
+    default_ll = float(log_likelihood(default, q, d, mask)[0])
+    if not observations:
+        return FitResult(DEFAULT_PARAMS, 0, default_ll, default_ll)
+
+    rng = np.random.default_rng(seed)
+    best, best_ll = default[0], default_ll
+    pool = _sample(rng, candidates)
+    for r in range(rounds + 1):
+        scores = log_likelihood(pool, q, d, mask)
+        i = int(np.argmax(scores))
+        if scores[i] > best_ll:
+            best, best_ll = pool[i], float(scores[i])
+        pool = _sample(rng, candidates, center=best, scale=0.5**r)
+
+    values = dict(zip(BOUNDS, best.tolist()))
+    for name in INTEGER_FIELDS:
+        values[name] = int(values[name])
+    return FitResult(Sm2Params(**values), observations, best_ll, default_ll)
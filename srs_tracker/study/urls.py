@@ -4,8 +4,9 @@ from django.contrib.auth.views import LoginView, LogoutView
 from .views import (
     HomeView,
     DeckListView, DeckCreateView, DeckUpdateView, DeckDeleteView,
-    CardListView, CardCreateView, CardUpdateView, CardDeleteView,
-    ReviewTodayView, AnalyticsView,RegisterView,
+    CardListView, CardCreateView, CardImportView, CardUpdateView, CardDeleteView, CardSearchView,
+    ReviewTodayView, ReviewBulkView, AnalyticsView, AsyncReviewTodayView, AsyncAnalyticsView,
+    ForecastView, ForecastApiView, ExportView, MetricsView, RegisterView,
 )
 
 urlpatterns = [
@@ -18,10 +19,20 @@ urlpatterns = [
 
     path("decks/<int:deck_id>/cards/", CardListView.as_view(), name="card_list"),
     path("decks/<int:deck_id>/cards/create/", CardCreateView.as_view(), name="card_create"),
+    path("decks/<int:deck_id>/cards/import/", CardImportView.as_view(), name="card_import"),
     path("cards/<int:pk>/edit/", CardUpdateView.as_view(), name="card_edit"),
     path("cards/<int:pk>/delete/", CardDeleteView.as_view(), name="card_delete"),
+    path("cards/search/", CardSearchView.as_view(), name="card_search"),
 
     path("review/today/", ReviewTodayView.as_view(), name="review_today"),
+    path("review/bulk/", ReviewBulkView.as_view(), name="review_bulk"),
     path("analytics/", AnalyticsView.as_view(), name="analytics"),
+    # Async-native variants of the two busiest pages, for ASGI deployments
+    path("async/review/today/", AsyncReviewTodayView.as_view(), name="review_today_async"),
+    path("async/analytics/", AsyncAnalyticsView.as_view(), name="analytics_async"),
+    path("forecast/", ForecastView.as_view(), name="forecast"),
+    path("api/forecast/", ForecastApiView.as_view(), name="forecast_api"),
+    path("export/<str:kind>.<str:fmt>", ExportView.as_view(), name="export"),
+    path("metrics", MetricsView.as_view(), name="metrics"),
     path("accounts/register/", RegisterView.as_view(), name="register"),
 ]
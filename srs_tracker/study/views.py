@@ -1,21 +1,33 @@
-from datetime import timedelta
+import hmac
+import io
+import json
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Avg, Count
-from django.db.models.functions import TruncDate
-from django.http import Http404
+from django.contrib.auth.views import redirect_to_login
+from django.conf import settings
+from django.contrib import messages
+from django.db.models.functions import Substr
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
-from django.views.generic import TemplateView, ListView, CreateView, UpdateView, DeleteView
-
-import plotly.express as px
-
-from .forms import DeckForm, CardForm, ReviewQualityForm
-from .models import Deck, Card, Review
-from .services import sm2_calculate
+from django.views.generic import TemplateView, ListView, CreateView, UpdateView, DeleteView, FormView, View
+
+from .analytics import aget_analytics_context, analytics_cache_stats, get_analytics_context
+from .deck_summary import EMPTY as EMPTY_DECK_SUMMARY, get_deck_summary
+from .exporters import CONTENT_TYPES, FORMATS as EXPORT_FORMATS, KINDS as EXPORT_KINDS, export
+from .forecast import MAX_DAYS as FORECAST_MAX_DAYS, get_forecast
+from .forms import DeckForm, CardForm, CardImportForm, ReviewQualityForm, BulkReviewItemForm
+from .importers import PARSERS, ImportAborted, format_for_filename, import_cards
+from .metrics import registry as metrics_registry, render_prometheus
+from .models import Deck, Card, Tag
+from .pagination import keyset_page
+from .review_queue import ReviewQueue
+from .search import search_cards
+from .services import ReviewSubmission, StaleGrade, apply_reviews, grade_card
 
 
 class HomeView(TemplateView):
@@ -29,6 +41,13 @@ class DeckListView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         return Deck.objects.filter(user=self.request.user)
 
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        summary = get_deck_summary(self.request.user.id)
+        for deck in ctx["decks"]:
+            deck.summary = summary.get(deck.id, EMPTY_DECK_SUMMARY)
+        return ctx
+
 
 class DeckCreateView(LoginRequiredMixin, CreateView):
     template_name = "study/deck_form.html"
@@ -65,12 +84,45 @@ class CardListView(LoginRequiredMixin, ListView):
         self.deck = get_object_or_404(Deck, pk=kwargs["deck_id"], user=request.user)
         return super().dispatch(request, *args, **kwargs)
 
+    def get_filters(self):
+        params = self.request.GET
+        tag = params.get("tag", "")
+        return {
+            "active": params.get("active") == "1",
+            "due": params.get("due") == "1",
+            "tag": int(tag) if tag.isdigit() else None,
+        }
+
     def get_queryset(self):
-        return Card.objects.filter(deck=self.deck).select_related("deck").prefetch_related("tags")
+        filters = self.get_filters()
+        qs = (
+            Card.objects.filter(deck=self.deck)
+            .only("id", "deck_id", "next_review_at", "interval_days", "ease_factor", "is_active")
+            .annotate(front_preview=Substr("front_text", 1, 121))
+        )
+        if filters["active"]:
+            qs = qs.filter(is_active=True)
+        if filters["tag"] is not None:
+            qs = qs.filter(tags__id=filters["tag"])
+
+        page_size = getattr(settings, "SRS_CARD_LIST_PAGE_SIZE", 50)
+        until = timezone.localdate() if filters["due"] else None
+        cards, self.next_cursor = keyset_page(qs, self.request.GET.get("after"), page_size, until=until)
+        return cards
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         ctx["deck"] = self.deck
+        ctx["filters"] = self.get_filters()
+        ctx["tags"] = Tag.objects.filter(user=self.request.user)
+        ctx["is_first_page"] = not self.request.GET.get("after")
+        if self.next_cursor:
+            params = self.request.GET.copy()
+            params["after"] = self.next_cursor
+            ctx["next_page_query"] = params.urlencode()
+        params = self.request.GET.copy()
+        params.pop("after", None)
+        ctx["first_page_query"] = params.urlencode()
         return ctx
 
 
@@ -95,12 +147,50 @@ class CardCreateView(LoginRequiredMixin, CreateView):
         return ctx
 
 
+class CardImportView(LoginRequiredMixin, FormView):
+    template_name = "study/card_import.html"
+    form_class = CardImportForm
+
+    def dispatch(self, request, *args, **kwargs):
+        self.deck = get_object_or_404(Deck, pk=kwargs["deck_id"], user=request.user)
+        return super().dispatch(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        upload = form.cleaned_data["file"]
+        fmt = form.cleaned_data["format"] or format_for_filename(upload.name)
+        if fmt is None:
+            form.add_error("format", "Не удалось определить формат по расширению файла")
+            return self.form_invalid(form)
+
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        try:
+            result = import_cards(self.deck, PARSERS[fmt](stream))
+        except ImportAborted as exc:
+            message = "Файл не удалось разобрать"
+            if exc.result.created:
+                message += f"; до ошибки добавлено карточек: {exc.result.created}"
+            form.add_error("file", message)
+            return self.form_invalid(form)
+
+        messages.success(
+            self.request,
+            f"Добавлено карточек: {result.created}, дубликатов пропущено: {result.duplicates}, "
+            f"некорректных строк: {result.invalid}",
+        )
+        return redirect("card_list", deck_id=self.deck.id)
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["deck"] = self.deck
+        return ctx
+
+
 class CardUpdateView(LoginRequiredMixin, UpdateView):
     template_name = "study/card_form.html"
     form_class = CardForm
 
     def get_queryset(self):
-        return Card.objects.filter(deck__user=self.request.user).select_related("deck")
+        return Card.objects.filter(user=self.request.user).select_related("deck")
 
     def get_success_url(self):
         return reverse("card_list", kwargs={"deck_id": self.object.deck_id})
@@ -115,28 +205,33 @@ class CardDeleteView(LoginRequiredMixin, DeleteView):
     template_name = "study/card_confirm_delete.html"
 
     def get_queryset(self):
-        return Card.objects.filter(deck__user=self.request.user).select_related("deck")
+        return Card.objects.filter(user=self.request.user).select_related("deck")
 
     def get_success_url(self):
         return reverse("card_list", kwargs={"deck_id": self.object.deck_id})
 
 
+class CardSearchView(LoginRequiredMixin, TemplateView):
+    template_name = "study/card_search.html"
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["q"] = self.request.GET.get("q", "")
+        ctx["cards"] = search_cards(self.request.user.id, ctx["q"])
+        return ctx
+
+
+STALE_GRADE_MESSAGE = "Эта карточка уже оценена в другой вкладке, оценка не сохранена."
+
+
 class ReviewTodayView(LoginRequiredMixin, TemplateView):
     template_name = "study/review_today.html"
 
-    def get_due_cards_qs(self):
-        today = timezone.localdate()
-        return (
-            Card.objects.filter(deck__user=self.request.user, is_active=True, next_review_at__lte=today)
-            .select_related("deck")
-            .order_by("next_review_at", "id")
-        )
-
     def get(self, request, *args, **kwargs):
-        due_cards = self.get_due_cards_qs()
-        card = due_cards.first()
-        form = ReviewQualityForm(initial={"card_id": card.id}) if card else None
-        return self.render_to_response({"card": card, "form": form, "due_count": due_cards.count()})
+        queue = ReviewQueue(request)
+        card = queue.current()
+        form = ReviewQualityForm(initial={"card_id": card["id"]}) if card else None
+        return self.render_to_response({"card": card, "form": form, "due_count": queue.remaining})
 
     def post(self, request, *args, **kwargs):
         form = ReviewQualityForm(request.POST)
@@ -144,93 +239,176 @@ class ReviewTodayView(LoginRequiredMixin, TemplateView):
             raise Http404("Invalid form data")
 
         card_id = form.cleaned_data["card_id"]
-        quality = form.cleaned_data["quality"]
+        try:
+            grade_card(request.user, card_id, form.cleaned_data["quality"], form.cleaned_data["version"])
+        except Card.DoesNotExist:
+            raise Http404("No Card matches the given query.")
+        except StaleGrade:
+            messages.info(request, STALE_GRADE_MESSAGE)
+        ReviewQueue(request).discard(card_id)
 
-        card = get_object_or_404(Card, pk=card_id, deck__user=request.user)
-        today = timezone.localdate()
+        return redirect("review_today")
 
-        res = sm2_calculate(
-            quality=quality,
-            repetitions=card.repetitions,
-            interval_days=card.interval_days,
-            ease_factor=card.ease_factor,
-            review_date=today,
-        )
 
-        card.repetitions = res.repetitions
-        card.interval_days = res.interval_days
-        card.ease_factor = res.ease_factor
-        card.next_review_at = res.next_review_at
-        card.save(update_fields=["repetitions", "interval_days", "ease_factor", "next_review_at"])
-
-        Review.objects.create(
-            user=request.user,
-            card=card,
-            quality=quality,
-            repetitions=res.repetitions,
-            interval_days=res.interval_days,
-            ease_factor=res.ease_factor,
-            next_review_at=res.next_review_at,
-        )
+class AsyncLoginRequiredMixin:
+    """LoginRequiredMixin for views with async handlers; loads the user without blocking."""
 
-        return redirect("review_today")
+    async def dispatch(self, request, *args, **kwargs):
+        if not (await request.auser()).is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncReviewTodayView(AsyncLoginRequiredMixin, TemplateView):
+    """ReviewTodayView on the async ORM, for deployments served over ASGI."""
+
+    template_name = "study/review_today.html"
+
+    async def get(self, request, *args, **kwargs):
+        queue = await ReviewQueue.aload(request)
+        card = await queue.acurrent()
+        form = ReviewQualityForm(initial={"card_id": card["id"]}) if card else None
+        return self.render_to_response({"card": card, "form": form, "due_count": queue.remaining})
+
+    async def post(self, request, *args, **kwargs):
+        form = ReviewQualityForm(request.POST)
+        if not form.is_valid():
+            raise Http404("Invalid form data")
+
+        user = await request.auser()
+        card_id = form.cleaned_data["card_id"]
+        try:
+            # The compare-and-swap runs in a transaction, which needs a sync connection
+            await sync_to_async(grade_card)(user, card_id, form.cleaned_data["quality"], form.cleaned_data["version"])
+        except Card.DoesNotExist:
+            raise Http404("No Card matches the given query.")
+        except StaleGrade:
+            await sync_to_async(messages.info)(request, STALE_GRADE_MESSAGE)
+        await (await ReviewQueue.aload(request)).adiscard(card_id)
+
+        return redirect("review_today_async")
+
+
+class ReviewBulkView(LoginRequiredMixin, View):
+    raise_exception = True
+
+    def post(self, request, *args, **kwargs):
+        try:
+            items = json.loads(request.body)["reviews"]
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({"error": "Expected a JSON object with a \"reviews\" list"}, status=400)
+
+        max_items = getattr(settings, "SRS_BULK_REVIEW_MAX_ITEMS", 1000)
+        if not isinstance(items, list) or len(items) > max_items:
+            return JsonResponse({"error": f"\"reviews\" must be a list of at most {max_items} items"}, status=400)
+
+        results = [None] * len(items)
+        submissions, positions = [], []
+        now = timezone.now()
+        for i, item in enumerate(items):
+            form = BulkReviewItemForm(item if isinstance(item, dict) else {})
+            if not form.is_valid():
+                results[i] = {"index": i, "status": "invalid", "errors": form.errors.get_json_data()}
+                continue
+            submissions.append(
+                ReviewSubmission(
+                    card_id=form.cleaned_data["card_id"],
+                    quality=form.cleaned_data["quality"],
+                    reviewed_at=form.cleaned_data["reviewed_at"] or now,
+                )
+            )
+            positions.append(i)
+
+        for i, sub, res in zip(positions, submissions, apply_reviews(request.user, submissions)):
+            if res is None:
+                results[i] = {"index": i, "card_id": sub.card_id, "status": "not_found"}
+            elif isinstance(res, StaleGrade):
+                results[i] = {"index": i, "card_id": sub.card_id, "status": "out_of_order"}
+            else:
+                results[i] = {
+                    "index": i,
+                    "card_id": sub.card_id,
+                    "status": "ok",
+                    "repetitions": res.repetitions,
+                    "interval_days": res.interval_days,
+                    "ease_factor": res.ease_factor,
+                    "next_review_at": res.next_review_at.isoformat(),
+                }
+
+        return JsonResponse({"results": results})
 
 
 class AnalyticsView(LoginRequiredMixin, TemplateView):
     template_name = "study/analytics.html"
 
     def get(self, request, *args, **kwargs):
-        today = timezone.localdate()
-        since = today - timedelta(days=30)
-
-        reviews_qs = Review.objects.filter(user=request.user, reviewed_at__date__gte=since)
-
-        if not reviews_qs.exists():
-            return self.render_to_response(
-                {
-                    "fig_count_html": None,
-                    "fig_avg_html": None,
-                    "hard_cards": [],
-                    "since": since,
-                    "today": today,
-                    "no_data": True,
-                }
-            )
+        return self.render_to_response(get_analytics_context(request.user.id))
 
-        daily = (
-            reviews_qs.annotate(day=TruncDate("reviewed_at"))
-            .values("day")
-            .annotate(reviews_count=Count("id"), avg_quality=Avg("quality"))
-            .order_by("day")
-        )
 
-        daily_days = [row["day"] for row in daily]
-        daily_counts = [row["reviews_count"] for row in daily]
-        daily_avgq = [float(row["avg_quality"]) if row["avg_quality"] is not None else 0.0 for row in daily]
+class AsyncAnalyticsView(AsyncLoginRequiredMixin, TemplateView):
+    template_name = "study/analytics.html"
 
-        fig_count = px.bar(x=daily_days, y=daily_counts, labels={"x": "День", "y": "Повторений"}, title="Повторения по дням (30 дней)")
-        fig_avg = px.line(x=daily_days, y=daily_avgq, markers=True, labels={"x": "День", "y": "Средняя оценка"}, title="Средняя оценка по дням (30 дней)")
+    async def get(self, request, *args, **kwargs):
+        user = await request.auser()
+        return self.render_to_response(await aget_analytics_context(user.id))
 
-        hard_cards = (
-            Review.objects.filter(user=request.user)
-            .values("card_id", "card__front_text", "card__deck__title")
-            .annotate(avg_quality=Avg("quality"), reviews_count=Count("id"))
-            .filter(reviews_count__gte=3)
-            .order_by("avg_quality", "-reviews_count")[:10]
-        )
 
-        return self.render_to_response(
-            {
-                "fig_count_html": fig_count.to_html(full_html=False, include_plotlyjs="cdn"),
-                "fig_avg_html": fig_avg.to_html(full_html=False, include_plotlyjs=False),
-                "hard_cards": hard_cards,
-                "since": since,
-                "today": today,
-                "no_data": False,
-            }
+def _forecast_days(request) -> int:
+    days = request.GET.get("days", "")
+    return min(int(days), FORECAST_MAX_DAYS) if days.isdigit() and int(days) > 0 else 30
+
+
+class ForecastView(LoginRequiredMixin, TemplateView):
+    template_name = "study/forecast.html"
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        forecast = get_forecast(self.request.user.id, _forecast_days(self.request))
+        ctx["forecast"] = forecast
+        ctx["days"] = len(forecast["days"])
+        ctx["total_due"] = sum(day["due"] for day in forecast["days"])
+        return ctx
+
+
+class ForecastApiView(LoginRequiredMixin, View):
+    raise_exception = True
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(get_forecast(request.user.id, _forecast_days(request)))
+
+
+class MetricsView(View):
+    """Prometheus scrape target: staff session or ``Authorization: Bearer <SRS_METRICS_TOKEN>``."""
+
+    def has_access(self, request):
+        if request.user.is_authenticated and request.user.is_staff:
+            return True
+        token = getattr(settings, "SRS_METRICS_TOKEN", "")
+        header = request.headers.get("Authorization", "")
+        return bool(token) and hmac.compare_digest(header, f"Bearer {token}")
+
+    def get(self, request, *args, **kwargs):
+        if not self.has_access(request):
+            return HttpResponseForbidden()
+        cache = analytics_cache_stats()
+        extra = {
+            "srs_analytics_cache_hits_total": ("Analytics context cache hits.", cache["hits"]),
+            "srs_analytics_cache_misses_total": ("Analytics context cache misses.", cache["misses"]),
+        }
+        return HttpResponse(
+            render_prometheus(metrics_registry.snapshot(), extra),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
         )
 
 
+class ExportView(LoginRequiredMixin, View):
+    def get(self, request, kind, fmt, *args, **kwargs):
+        if kind not in EXPORT_KINDS or fmt not in EXPORT_FORMATS:
+            raise Http404("Unknown export")
+        response = StreamingHttpResponse(export(kind, fmt, user_id=request.user.id), content_type=CONTENT_TYPES[fmt])
+        response["Content-Disposition"] = f'attachment; filename="{kind}.{fmt}"'
+        return response
+
 
 class RegisterView(CreateView):
     form_class = UserCreationForm